@@ -113,6 +113,68 @@ def test_events():
     assert len(annot.get_events()) == 0
 
 
+def test_events_in_memory():
+    d = Dataset(ns2_file)
+    create_empty_annotations(annot_file, d)
+
+    annot = Annotations(annot_file)
+    annot.add_rater('test')
+    annot.set_stage_for_epoch(510, 'NREM2')
+
+    annot.add_event('spindle', (520, 521), chan=('FP1', ))
+    annot.add_event('spindle', (10, 11), chan=('FP1', ))
+    annot.add_event('spindle', (515, 516))
+    evts = annot.get_events('spindle')
+    assert [x['start'] for x in evts] == [10, 515, 520]
+
+    evts = annot.get_events('spindle', stage=('NREM2', ))
+    assert [x['start'] for x in evts] == [515, 520]
+    assert evts[0]['stage'] == 'NREM2'
+
+    assert len(annot.get_events(time=(500, 600), chan=('FP1', ))) == 1
+
+    annot.remove_event('spindle', chan=('FP1', ))
+    assert len(annot.get_events('spindle')) == 1
+
+
+def test_get_events_array():
+    d = Dataset(ns2_file)
+    create_empty_annotations(annot_file, d)
+
+    annot = Annotations(annot_file)
+    annot.add_rater('test')
+    annot.add_event('spindle', (100, 101), chan=('FP1', ))
+    annot.add_event('slowwave', (50, 52), chan=('FP1', 'FP2'))
+    annot.add_event('spindle', (20, 500), chan=('FP2', ))
+    annot.add_event('spindle', (300, 301), chan=('FP1', ))
+
+    evts = annot.get_events_array(time=(90, 200))
+    assert list(evts['start']) == [20, 100]
+    assert [evts['event_names'][i] for i in evts['name']] == ['spindle',
+                                                              'spindle']
+    assert [evts['chan_names'][i] for i in evts['chan']] == ['FP2', 'FP1']
+
+    evts = annot.get_events_array()
+    assert list(evts['end']) == [500, 52, 101, 301]
+
+    annot.remove_event('spindle', time=(20, 500))
+    assert len(annot.get_events(time=(90, 200))) == 1
+
+
+def test_annot_autosave():
+    d = Dataset(ns2_file)
+    create_empty_annotations(annot_file, d)
+
+    annot = Annotations(annot_file, autosave=3600)
+    annot.add_rater('test')
+    annot.set_stage_for_epoch(510, 'REM')
+    assert not Annotations(annot_file).raters
+
+    annot.flush()
+    annot = Annotations(annot_file)
+    assert annot.get_stage_for_epoch(510) == 'REM'
+
+
 def test_epochs():
     d = Dataset(ns2_file)
     create_empty_annotations(annot_file, d)
@@ -0,0 +1,60 @@
+from numpy import arange, isnan
+from numpy.testing import assert_array_equal
+
+from wonambi.attr import Hypnogram
+
+
+STAGES = (['Wake', ] * 4 + ['NREM1', 'NREM2', 'NREM2', 'Artefact', 'NREM2',
+                            'NREM3', 'NREM3', 'REM', 'NREM2', 'NREM3'] +
+          ['NREM2', ] * 10 + ['Wake', 'REM', 'Wake', 'Wake'])
+start = arange(len(STAGES)) * 30
+hypno = Hypnogram(start, start + 30, STAGES)
+
+
+def test_hypnogram_runs():
+    values, first, n_epochs = hypno.runs()
+    assert len(values) == 13
+    assert hypno.stage_names[values[0]] == 'Wake'
+    assert_array_equal(first[:3], [0, 4, 5])
+    assert n_epochs[-4] == 10
+
+
+def test_hypnogram_transitions():
+    trans = hypno.transitions(('NREM2', 'NREM3'))
+    assert_array_equal(trans, [[11, 2], [2, 1]])
+
+    assert hypno.switch() == 10
+    assert hypno.slp_frag() == 3
+    assert hypno.select((0, 300)).switch() == 3
+
+
+def test_hypnogram_latency():
+    assert hypno.latency('NREM2', 60) == 1.5
+    assert isnan(hypno.latency('Movement', 60))
+    assert hypno.latency_to_consolidated(0, 5) == 6
+    assert isnan(hypno.latency_to_consolidated(0, 5, stages=('NREM3', )))
+    assert hypno.time_in_stage(['NREM1', 'REM']) == 90
+
+
+def test_hypnogram_sleep_stats():
+    stats = hypno.sleep_stats(0, 840)
+    assert stats['slp_onset'] == 120
+    assert stats['wake_up'] == 750
+    assert stats['duration']['NREM2'] == 7
+    assert stats['waso'] == 0.5
+    assert stats['total_slp_time'] == 10
+
+    assert Hypnogram(start[:4], start[:4] + 30,
+                     STAGES[:4]).sleep_stats(0, 120) is None
+
+
+def test_hypnogram_empty():
+    empty_hypno = Hypnogram([], [], [])
+    assert isnan(empty_hypno.epoch_length)
+    assert isnan(empty_hypno.latency_to_consolidated(0, 5))
+    assert empty_hypno.sleep_stats(0, 840) is None
+
+    no_epochs = hypno.select((1000, 2000))
+    assert len(no_epochs) == 0
+    assert isnan(no_epochs.epoch_length)
+    assert isnan(no_epochs.latency_to_consolidated(0, 5))
@@ -1,6 +1,15 @@
+from numpy.testing import assert_allclose, assert_array_equal
+from pytest import raises
+
 from wonambi import Dataset
+from wonambi.ioeeg import write_edf, write_wonambi
+from wonambi.trans import filter_, frequency, montage
+from wonambi.utils import create_data
+
+from .paths import micromed_file, EXPORTED_PATH
 
-from .paths import micromed_file
+chunks_file = EXPORTED_PATH / 'chunks.won'
+trials_file = EXPORTED_PATH / 'trials.edf'
 
 
 def test_dataset_events():
@@ -12,3 +21,70 @@ def test_dataset_events():
     assert data.time[0].shape[0] == 512
     assert data.time[0].shape[0] == data.data[0].shape[1]
     assert (data.number_of('time') == 512).all()
+
+
+def test_dataset_iter_chunks():
+    write_wonambi(create_data(n_trial=1, time=(0, 10)), chunks_file)
+    d = Dataset(chunks_file)
+    full = d.read_data(chan=['chan01', ])
+
+    chunks = list(d.iter_chunks(chan=['chan01', ], chunk_dur=3, overlap=1,
+                                dtype='float32'))
+    assert len(chunks) == 5
+    assert chunks[-1].number_of('time')[0] == 512
+    assert chunks[1].data[0].dtype == 'float32'
+    assert chunks[1].time[0][0] == 2
+    assert_array_equal(chunks[1].data[0],
+                       full.data[0][:, 512:1280].astype('float32'))
+
+    chunks = list(d.iter_chunks(chunk_dur=20, prefetch=False))
+    assert len(chunks) == 1
+    assert chunks[0].number_of('time')[0] == d.header['n_samples']
+
+    with raises(ValueError):
+        next(d.iter_chunks(chunk_dur=2, overlap=2))
+
+
+def test_dataset_trials_merged():
+    write_edf(create_data(n_trial=1, time=(0, 10)), trials_file)
+    d = Dataset(trials_file)
+
+    # overlapping, adjacent and separate trials (edf has return_dat_many)
+    begtime = [5, 1, 1.5, 3, -1]
+    endtime = [6, 2, 3, 4, 0.5]
+    data = d.read_data(chan=['chan01', '_REF'], begtime=begtime,
+                       endtime=endtime)
+
+    for i, (one_begtime, one_endtime) in enumerate(zip(begtime, endtime)):
+        trial = d.read_data(chan=['chan01', '_REF'], begtime=one_begtime,
+                            endtime=one_endtime)
+        assert_array_equal(data.data[i], trial.data[0])
+        assert_array_equal(data.time[i], trial.time[0])
+        assert_array_equal(data.chan[i], ['chan01', '_REF'])
+
+
+def test_dataset_float32():
+    write_edf(create_data(n_trial=1, time=(0, 10)), trials_file)
+    d = Dataset(trials_file)
+
+    data = d.read_data(begtime=[1, 2], endtime=[3, 4])
+    data32 = d.read_data(begtime=[1, 2], endtime=[3, 4], dtype='float32')
+    assert data32.data[1].dtype == 'float32'
+    assert_allclose(data32.data[1], data.data[1], rtol=1e-6)
+
+    fdata = filter_(data, low_cut=1, high_cut=40)
+    fdata32 = filter_(data32, low_cut=1, high_cut=40)
+    assert fdata32.data[0].dtype == 'float32'
+    assert_allclose(fdata32.data[0], fdata.data[0], rtol=1e-4, atol=1e-4)
+
+    mdata32 = montage(data32, ref_to_avg=True)
+    assert mdata32.data[0].dtype == 'float32'
+
+    freq = frequency(data)
+    freq32 = frequency(data32)
+    assert freq32.data[0].dtype == 'float32'
+    assert_allclose(freq32.data[0], freq.data[0], rtol=1e-3, atol=1e-6)
+
+    freq32 = frequency(data32, output='complex', sides='two')
+    assert freq32.data[0].dtype == 'complex64'
+    assert frequency(data32, dtype='float64').data[0].dtype == 'float64'
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from pickle import load, dump
 from tempfile import NamedTemporaryFile
-from numpy.testing import assert_array_equal
+from numpy import asarray, isnan, shares_memory
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from pytest import raises
 
-from wonambi.trans import math
+from wonambi.trans import filter_, frequency, math
 from wonambi.utils import create_data
 
 
@@ -33,3 +36,102 @@ def test_copy_axis():
 
     output = data._copy(axis=False)
     assert len(data.axis) == len(output.axis)
+
+
+def test_call_copy():
+    data = create_data(n_trial=2)
+
+    x = data(trial=0)
+    assert not shares_memory(x, data.data[0])
+
+    x = data(trial=0, copy=False)
+    assert shares_memory(x, data.data[0])
+
+    # regular range
+    x = data(trial=0, chan=['chan01', 'chan03', 'chan05'], copy=False)
+    assert shares_memory(x, data.data[0])
+    assert_array_equal(x, data.data[0][[1, 3, 5], :])
+
+    # different order
+    x = data(trial=0, chan=['chan03', 'chan01'], copy=False)
+    assert not shares_memory(x, data.data[0])
+    assert_array_equal(x, data.data[0][[3, 1], :])
+
+    # missing value
+    x = data(trial=0, chan=['chan03', 'XXX'], copy=False)
+    assert_array_equal(x[0, :], data.data[0][3, :])
+    assert isnan(x[1, :]).all()
+
+
+def test_dense():
+    data = create_data(n_trial=3)
+    dense = data.to_dense()
+    assert dense.dense
+    assert dense.number_of('trial') == 3
+    assert_array_equal(dense.number_of('time'), data.number_of('time'))
+    assert_array_equal(dense(trial=1, chan='chan02'),
+                       data(trial=1, chan='chan02'))
+
+    output = math(dense, operator_name='mean', axis='time')
+    expected = math(data, operator_name='mean', axis='time')
+    assert_array_almost_equal(output.data[2], expected.data[2])
+
+    output = filter_(dense, low_cut=1, high_cut=40)
+    expected = filter_(data, low_cut=1, high_cut=40)
+    assert_array_almost_equal(output.data[1], expected.data[1])
+
+    output = frequency(dense, duration=1)
+    expected = frequency(data, duration=1)
+    assert_array_almost_equal(output.data[1], expected.data[1])
+    assert_array_equal(output.freq[1], expected.freq[1])
+
+    data.axis['time'][1] = data.axis['time'][1] + 1
+    with raises(ValueError):
+        data.to_dense()
+
+
+def test_select_long_axis():
+    data = create_data(n_trial=1, s_freq=1000, n_chan=1, time=(0, 10000))
+    time = data.axis['time'][0]
+    assert len(time) == 10000000
+
+    x = data(trial=0, time=time[5000000])
+    assert_array_equal(x, data.data[0][:, 5000000])
+
+    selected = time[::1000]
+    x = data(trial=0, time=selected)
+    assert_array_equal(x, data.data[0][:, ::1000])
+
+    x = data(trial=0, time=[time[20], -1, time[10]] * 10)
+    assert_array_equal(x[:, 0], data.data[0][:, 20])
+    assert isnan(x[:, 1]).all()
+    assert_array_equal(x[:, 2], data.data[0][:, 10])
+
+
+def test_select_unsorted_axis():
+    data = create_data(n_trial=1, n_chan=5)
+    data.axis['chan'][0] = asarray(['c', 'a', 'e', 'a', 'b'], dtype='U')
+
+    x = data(trial=0, chan=['a', 'z', 'c', 'b', 'e'])
+    assert_array_equal(x[0], data.data[0][1])
+    assert isnan(x[1]).all()
+    assert_array_equal(x[2], data.data[0][0])
+    assert_array_equal(x[3], data.data[0][4])
+    assert_array_equal(x[4], data.data[0][2])
+
+    data.axis['chan'][0] = asarray(['e', 'd', 'c', 'b', 'a'], dtype='U')
+    x = data(trial=0, chan='a')
+    assert_array_equal(x, data.data[0][4])
+
+
+def test_select_threads():
+    data = create_data(n_trial=1, n_chan=20)
+    chan = data.axis['chan'][0]
+    selected = [list(chan[i::-1]) for i in range(len(chan))] * 10
+
+    def select(one_selected):
+        x = data(trial=0, chan=one_selected)
+        assert_array_equal(x, data.data[0][len(one_selected) - 1::-1])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(select, selected))
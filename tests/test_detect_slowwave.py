@@ -27,6 +27,15 @@ def test_detect_slowwave_AASM_Massimini2004():
     assert len(sw.events) == 15
 
 
+def test_detect_slowwave_n_jobs():
+    detsw = DetectSlowWave(method='AASM/Massimini2004')
+    detsw.invert = True
+
+    sw = detsw(data, n_jobs=2)
+    assert len(sw.events) == 15
+    assert sw.events == detsw(data).events
+
+
 def test_detect_slowwave_to_data():
     detsw = DetectSlowWave()
     detsw.invert = True
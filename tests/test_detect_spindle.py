@@ -82,6 +82,15 @@ def test_detect_spindle_Concordia():
     sp = detsp(data)
     assert (len(sp.events)) == 3
 
+def test_detect_spindle_n_jobs():
+    detsp = DetectSpindle(method='Lacourse2018')
+
+    sp = detsp(data)
+    sp_parallel = detsp(data, n_jobs=2)
+    assert sp_parallel.events == sp.events
+    assert (sp_parallel.density == sp.density).all()
+
+
 def test_detect_spindle_unknownmethod():
     with raises(ValueError):
         detsp = DetectSpindle(method='xxx')
@@ -0,0 +1,54 @@
+from numpy import mean, std
+from numpy.random import seed, randn
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from wonambi.detect.spindle import transform_signal
+from wonambi.detect.window import window_bounds, moving_covar, moving_sd
+
+s_freq = 256
+
+
+def test_window_bounds():
+    beg, end, len_out = window_bounds(2560, s_freq, .5, step=.1)
+    assert len_out == 100
+    assert len(beg) == 99
+    assert beg[0] == 0
+    assert end[0] == 64
+    assert_array_equal(end[10:20] - beg[10:20], 128)
+
+
+def test_moving_values():
+    seed(0)
+    x = randn(2560) + 10
+    y = randn(2560)
+
+    beg, end, _ = window_bounds(len(x), s_freq, .3)
+    i = 300
+    win_x = x[beg[i]:end[i]]
+    win_y = y[beg[i]:end[i]]
+
+    assert_array_almost_equal(moving_sd(x, beg, end)[i], std(win_x))
+    assert_array_almost_equal(
+        moving_covar(x, y, beg, end)[i],
+        mean((win_x - mean(win_x)) * (win_y - mean(win_y))))
+
+    mask = x > 10
+    assert_array_almost_equal(moving_sd(x, beg, end, mask=mask)[i],
+                              std(win_x[mask[beg[i]:end[i]]]))
+
+
+def test_transform_signal_moving():
+    seed(0)
+    x = randn(2560)
+
+    ms = transform_signal(x, s_freq, 'moving_ms', {'dur': .3, 'step': .1})
+    assert ms.shape == (100, )
+    assert_array_almost_equal(ms[50], mean(x[1241:1318] ** 2))
+    assert ms[-1] == 0
+
+    ratio = transform_signal(x, s_freq, 'moving_power_ratio',
+                             {'dur': .3, 'step': None, 'fft_dur': 2,
+                              'freq_narrow': (11, 16),
+                              'freq_broad': (4.5, 30)})
+    assert ratio.shape == x.shape
+    assert (ratio[:-1] > 0).all()
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from numpy import isnan
+from numpy.testing import assert_array_almost_equal
+
+from wonambi.ioeeg import Wonambi, write_wonambi
+from wonambi.ioeeg.cache import CachedReader, CHUNK_SIZE
+from wonambi.utils import create_data
+
+from .paths import EXPORTED_PATH
+
+cached_file = EXPORTED_PATH / 'cached.won'
+
+gen_data = create_data(n_trial=1, time=(0, 2 * CHUNK_SIZE / 256 + 10))
+write_wonambi(gen_data, cached_file)
+
+
+def _cached_reader(cache_dir, cache_size=1e9):
+    reader = Wonambi(cached_file)
+    hdr = reader.return_hdr()
+    return reader, CachedReader(reader, len(hdr[3]), hdr[4], cache_dir,
+                                cache_size)
+
+
+def test_cache_read():
+    reader, cached = _cached_reader(EXPORTED_PATH / 'cache')
+    chan = [3, 1]
+    begsam = CHUNK_SIZE - 100
+    endsam = 2 * CHUNK_SIZE + 100
+
+    dat = cached.return_dat(chan, begsam, endsam)  # fill up the cache
+    assert len(list(cached.chunk_dir.glob('*.dat'))) == 3
+
+    dat = cached.return_dat(chan, begsam, endsam)  # read from the cache
+    assert_array_almost_equal(dat, reader.return_dat(chan, begsam, endsam),
+                              decimal=5)
+
+    assert cached.filename == reader.filename
+
+
+def test_cache_outside():
+    reader, cached = _cached_reader(EXPORTED_PATH / 'cache')
+    dat = cached.return_dat([0, ], -10, 10)
+    assert isnan(dat[0, :10]).all()
+    assert not isnan(dat[0, 10:]).any()
+
+
+def test_cache_size():
+    cache_dir = EXPORTED_PATH / 'cache_small'
+    for chunk_file in cache_dir.glob('*/*.dat'):
+        chunk_file.unlink()
+
+    reader, cached = _cached_reader(cache_dir, cache_size=CHUNK_SIZE * 8 * 4)
+    cached.return_dat([0, ], 0, CHUNK_SIZE + 10)
+    assert len(list(cache_dir.glob('*/*.dat'))) == 1
+
+
+def test_cache_threads():
+    cache_dir = EXPORTED_PATH / 'cache_threads'
+    for chunk_file in cache_dir.glob('*/*'):
+        chunk_file.unlink()
+
+    all_cached = [_cached_reader(cache_dir)[1] for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        all_dat = list(executor.map(
+            lambda cached: cached.return_dat([0, 2], 0, CHUNK_SIZE),
+            all_cached))
+
+    for dat in all_dat[1:]:
+        assert_array_almost_equal(dat, all_dat[0])
+    assert len(list(cache_dir.glob('*/*.dat'))) == 1
+    assert len(list(cache_dir.glob('*/*.tmp'))) == 0
+
+
+def test_cache_total_size(monkeypatch):
+    cache_dir = EXPORTED_PATH / 'cache_total'
+    for chunk_file in cache_dir.glob('*/*.dat'):
+        chunk_file.unlink()
+
+    n_glob = []
+    glob = type(cache_dir).glob
+    monkeypatch.setattr(type(cache_dir), 'glob',
+                        lambda self, pattern: n_glob.append(pattern) or
+                        glob(self, pattern))
+
+    reader, cached = _cached_reader(cache_dir)
+    cached.return_dat([0, ], 0, 2 * CHUNK_SIZE + 10)
+    assert len(n_glob) == 1  # the cache directory is listed only once
+    assert cached.total_size == sum(x.stat().st_size
+                                    for x in cached.chunk_dir.glob('*.dat'))
@@ -47,3 +47,18 @@ def test_edf_annot():
 def test_edf_write():
     data = create_data()
     write_edf(data, EXPORTED_PATH / 'export.edf')
+
+
+def test_edf_write_read():
+    data = create_data(s_freq=256)
+    edf_file = EXPORTED_PATH / 'export_read.edf'
+    write_edf(data, edf_file, physical_max=10)
+
+    d = Dataset(edf_file)
+    n_smp = d.header['n_samples']
+    dat = d.read_data(begsam=-10, endsam=n_smp + 10)
+    assert isnan(dat.data[0][0, :10]).all()
+    assert isnan(dat.data[0][0, -10:]).all()
+
+    diff = dat.data[0][:, 10:-10] - data.data[0][:, :n_smp]
+    assert abs(diff).max() < 10 / 32767 * 2
@@ -1,11 +1,17 @@
-from numpy import isnan
+from datetime import datetime
+
+from numpy import arange, array, empty, isnan
+from numpy.testing import assert_array_equal
+from scipy.io import savemat
 
 from wonambi import Dataset
+from wonambi.ioeeg import eeglab
 
 from .paths import (eeglab_1_file,
                     eeglab_2_file,
                     eeglab_hdf5_1_file,
                     eeglab_hdf5_2_file,
+                    EXPORTED_PATH,
                     )
 
 
@@ -40,3 +46,59 @@ def test_ioeeg_eeglab_hdf5():
     assert data1.data[0][0, 0] == data2.data[0][0, 0]
 
     assert len(d1.read_markers()) == 2
+
+
+
+def _write_synthetic_eeglab(filename, compression):
+    chanlocs = empty(3, dtype=[('labels', 'O'), ('X', 'O')])
+    chanlocs['labels'] = ['Fz', 'Cz', 'Pz']
+    chanlocs['X'] = [array([]), 1., 2.]
+    event = empty(2, dtype=[('type', 'O'), ('latency', 'O')])
+    event['type'] = ['start', 'stop']
+    event['latency'] = [11., 101.]
+
+    EEG = {'srate': 100.,
+           'pnts': 200.,
+           'nbchan': 3.,
+           'subject': 'S01',
+           'chanlocs': chanlocs,
+           'event': event,
+           'etc': {'T0': [2020, 1, 2, 3, 4, 5]},
+           'datfile': array([]),
+           'data': arange(600, dtype='float32').reshape(3, 200),
+           }
+    savemat(filename, {'EEG': EEG}, do_compression=compression)
+    return EEG['data']
+
+
+def test_ioeeg_eeglab_without_loading(monkeypatch):
+    set_file = EXPORTED_PATH / 'eeglab_synthetic.set'
+    dat = _write_synthetic_eeglab(set_file, False)
+
+    def no_loadmat(*args, **kwargs):
+        raise AssertionError('the whole file should not be loaded')
+
+    monkeypatch.setattr(eeglab, 'loadmat', no_loadmat)
+    d = Dataset(set_file)
+    assert d.header['s_freq'] == 100
+    assert d.header['n_samples'] == 200
+    assert d.header['chan_name'] == ['Fz', 'Cz', 'Pz']
+    assert d.header['subj_id'] == 'S01'
+    assert d.header['start_time'] == datetime(2020, 1, 2, 3, 4, 5)
+    assert_array_equal(d.read_data(begsam=10, endsam=20).data[0],
+                       dat[:, 10:20])
+
+    markers = d.read_markers()
+    assert [x['name'] for x in markers] == ['start', 'stop']
+    assert markers[1]['start'] == 1
+
+
+def test_ioeeg_eeglab_compressed():
+    set_file = EXPORTED_PATH / 'eeglab_synthetic_compressed.set'
+    dat = _write_synthetic_eeglab(set_file, True)
+
+    d = Dataset(set_file)
+    assert d.header['chan_name'] == ['Fz', 'Cz', 'Pz']
+    assert_array_equal(d.read_data(begsam=10, endsam=20).data[0],
+                       dat[:, 10:20])
+    assert [x['name'] for x in d.read_markers()] == ['start', 'stop']
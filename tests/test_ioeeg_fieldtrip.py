@@ -1,3 +1,5 @@
+from h5py import File, ref_dtype
+from numpy import array, empty
 from numpy.testing import assert_array_equal
 from pytest import raises
 
@@ -7,6 +9,7 @@ from wonambi.utils import create_data
 
 from .paths import (fieldtrip_file,
                     hdf5_file,
+                    EXPORTED_PATH,
                     )
 
 
@@ -21,11 +24,67 @@ def test_write_read_fieldtrip():
     assert len(d.read_markers()) == 0
 
 
+def test_read_fieldtrip_without_loading(monkeypatch):
+    data = create_data(n_trial=1, n_chan=2)
+    data.export(fieldtrip_file, export_format='fieldtrip')
+
+    def no_loadmat(*args, **kwargs):
+        raise AssertionError('the whole file should not be loaded')
+
+    monkeypatch.setattr(fieldtrip, 'loadmat', no_loadmat)
+    d = Dataset(fieldtrip_file)
+    assert d.header['s_freq'] == data.s_freq
+    assert d.header['chan_name'] == list(data.axis['chan'][0])
+    assert_array_equal(data.data[0], d.read_data().data[0])
+
+
 def test_write_read_fieldtrip_hdf5():
     d = Dataset(hdf5_file)
     d.read_data()
 
 
+def _write_synthetic_hdf5(filename, data):
+    """Write data like MATLAB does with '-v7.3' (hdf5 with a MAT-file header).
+    """
+    chan = data.axis['chan'][0]
+    with File(filename, 'w', userblock_size=512) as f:
+        label = f.create_dataset('data/label', (len(chan), 1), dtype=ref_dtype)
+        for i, one_chan in enumerate(chan):
+            x = f.create_dataset('#refs#/label' + str(i),
+                                 data=array([ord(c) for c in one_chan],
+                                            dtype='u2')[:, None])
+            label[i, 0] = x.ref
+        f['data/fsample'] = [[data.s_freq]]
+        trial = f.create_dataset('data/trial', (1, 1), dtype=ref_dtype)
+        x = f.create_dataset('#refs#/trial0', data=data.data[0].T)
+        trial[0, 0] = x.ref
+
+    header = empty(128, dtype='u1')
+    header[:] = ord(' ')
+    header[:19] = list(b'MATLAB 7.3 MAT-file')
+    header[124:128] = [0, 2, ord('I'), ord('M')]
+    with open(filename, 'r+b') as f:
+        f.write(header.tobytes())
+
+
+def test_read_fieldtrip_hdf5_close():
+    data = create_data(n_trial=1, n_chan=2)
+    h5_file = EXPORTED_PATH / 'fieldtrip_synthetic_hdf5.mat'
+    _write_synthetic_hdf5(h5_file, data)
+
+    d = Dataset(h5_file)
+    assert d.header['chan_name'] == list(data.axis['chan'][0])
+    assert d.header['s_freq'] == data.s_freq
+    assert_array_equal(d.read_data(begsam=10, endsam=20).data[0],
+                       data.data[0][:, 10:20])
+
+    h5 = d.dataset.h5_file
+    assert h5.id.valid
+    d.close()
+    assert not h5.id.valid
+    assert d.dataset.h5_file is None
+
+
 def test_wrong_variable_name():
     fieldtrip.VAR = 'unknown'
     with raises(KeyError):
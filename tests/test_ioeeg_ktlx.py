@@ -1,7 +1,10 @@
-from numpy.testing import assert_array_almost_equal
+from struct import pack
+
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 from pytest import raises
 
 from wonambi import Dataset
+from wonambi.ioeeg.ktlx import _read_packet
 
 from .paths import ktlx_file
 
@@ -29,3 +32,33 @@ def test_xltek_videos():
     assert len(videos) == 2
     assert v_beg == 58.410209
     assert v_end == 37.177808
+
+
+def test_xltek_packet():
+    # two channels: absolute values, 8-bit deltas, one 16-bit delta
+    packet = (b'\x00\x03' + b'\xff\xff\xff\xff' + pack('<ii', 1000, -5) +
+              b'\x00\x00' + pack('<bb', 3, -2) +
+              b'\x01\x02' + pack('<bh', 1, 300))
+
+    dat = _read_packet(packet, 3, 2, b'\xff\xff')
+    assert_array_equal(dat, [[1000, 1003, 1004], [-5, -7, 293]])
+
+    dat = _read_packet(packet, 2, 2, b'\xff\xff', chan=[1, ])
+    assert_array_equal(dat, [[-5, -7]])
+
+
+def test_xltek_packet_deltamask():
+    # nine channels: two bytes of delta mask, two narrow deltas of -1 which
+    # look like an absolute delta, and absolute values after 16-bit deltas
+    narrow = pack('<bbbbbbb', -1, -1, 0, 1, 2, 3, 4)
+    packet = (b'\x00\x01\x01' + b'\xff\xff' + narrow + b'\xff\xff' +
+              pack('<ii', 70000, -70000) +
+              b'\x01\x00\x01' + pack('<bbbbbbbb', *[-1] * 8) +
+              pack('<h', 300))
+
+    dat = _read_packet(packet, 2, 9, b'\xff\xff')
+    assert_array_equal(dat[:, 0], [70000, -1, -1, 0, 1, 2, 3, 4, -70000])
+    assert_array_equal(dat[:, 1] - dat[:, 0], [-1] * 8 + [300, ])
+
+    with raises(Exception):
+        _read_packet(packet[:-2] + b'\x05', 3, 9, b'\xff\xff')
@@ -1,6 +1,8 @@
 from numpy import isnan
+from numpy.testing import assert_array_equal
 
 from wonambi import Dataset
+from wonambi.ioeeg.moberg import _read_dat
 
 from .paths import moberg_file
 
@@ -22,3 +24,10 @@ def test_ioeeg_mobert_end():
     assert isnan(data(trial=0, chan='Fp1')[1])
 
     assert len(d.read_markers()) == 0
+
+
+def test_ioeeg_moberg_int24():
+    values = [0, 1, -1, 8388607, -8388608, -1678]
+    x = b''.join(v.to_bytes(3, byteorder='little', signed=True)
+                 for v in values)
+    assert_array_equal(_read_dat(x), values)
@@ -1,11 +1,24 @@
-from numpy import isnan
+from datetime import datetime
+from struct import unpack
+
+from numpy import array, empty, isnan, NaN, zeros
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
 
 from wonambi import Dataset
 from wonambi.dataset import _count_openephys_sessions
 from wonambi.ioeeg import openephys
-from wonambi.ioeeg.openephys import OpenEphys
-
-from .paths import openephys_dir as filename
+from wonambi.ioeeg.openephys import (OpenEphys,
+                                     BLK_DTYPE,
+                                     BLK_LENGTH,
+                                     BLK_SIZE,
+                                     DAT_FMT,
+                                     DAT_FMT_SIZE,
+                                     HDR_LENGTH,
+                                     _select_blocks,
+                                     )
+
+from .paths import EXPORTED_PATH, openephys_dir as filename
 
 openephys.IGNORE_EVENTS = []
 
@@ -76,3 +89,103 @@ def test_openephys_read():
     # after end
     dat = self.return_dat([0, ], n_samples, n_samples + 10)
     assert isnan(dat[0, :]).all()
+
+
+synthetic_dir = EXPORTED_PATH / 'openephys_synthetic'
+N_CHAN = 4
+SEG_BLOCKS = (3, 4)  # number of blocks in each segment
+SEG_START = (1000, 1000 + 3 * BLK_LENGTH + 2500)  # gap between segments
+
+
+def _write_synthetic_openephys():
+    synthetic_dir.mkdir(exist_ok=True)
+    rng = default_rng(0)
+
+    rec_xml = ''
+    position = HDR_LENGTH
+    for i_seg, n_blocks in enumerate(SEG_BLOCKS):
+        rec_xml += (f'<RECORDING samplerate="30000" number="{i_seg}">'
+                    '<PROCESSOR>')
+        rec_xml += ''.join(f'<CHANNEL name="CH{i}" filename="100_CH{i}'
+                           f'.continuous" position="{position}"/>'
+                           for i in range(N_CHAN))
+        rec_xml += '</PROCESSOR></RECORDING>'
+        position += n_blocks * BLK_SIZE
+    (synthetic_dir / 'Continuous_Data.openephys').write_text(
+        f'<EXPERIMENT>{rec_xml}</EXPERIMENT>')
+    (synthetic_dir / 'messages.events').write_text(''.join(
+        f'{x} start time: {x}@30000Hz\n' for x in SEG_START))
+    (synthetic_dir / 'all_channels.events').write_bytes(b' ' * HDR_LENGTH)
+
+    hdr = ("header.format = 'Open Ephys Data Format';\n"
+           "header.header_bytes = 1024;\n"
+           "header.blockLength = 1024;\n"
+           "header.sampleRate = 30000;\n"
+           f"header.bitVolts = {0.195 * 2:f};\n")
+    for i in range(N_CHAN):
+        blocks = zeros(sum(SEG_BLOCKS), dtype=BLK_DTYPE)
+        blocks['timestamp'] = [x + i_blk * BLK_LENGTH
+                               for x, n_blocks in zip(SEG_START, SEG_BLOCKS)
+                               for i_blk in range(n_blocks)]
+        blocks['n_samples'] = BLK_LENGTH
+        blocks['data'] = rng.integers(-32768, 32767,
+                                      (len(blocks), BLK_LENGTH))
+        with (synthetic_dir / f'100_CH{i}.continuous').open('wb') as f:
+            f.write(hdr.encode().ljust(HDR_LENGTH))
+            blocks.tofile(f)
+
+
+def _return_dat_unpack(self, chan, begsam, endsam):
+    """Read the data one block at the time, with struct.unpack."""
+    data_length = endsam - begsam
+    dat = empty((len(chan), data_length))
+    dat.fill(NaN)
+
+    all_blocks = _select_blocks(self.blocks_dat, begsam, endsam)
+    for i_chan, sel_chan in enumerate(chan):
+        with self.channels[sel_chan].open('rb') as f:
+            for i_block in all_blocks:
+                i_dat = self.blocks_dat[i_block, :] - begsam
+                f.seek(self.blocks_offset[i_block].item())
+                x = array(unpack(DAT_FMT, f.read(DAT_FMT_SIZE)))
+                beg_dat = max(i_dat[0], 0)
+                end_dat = min(i_dat[1], data_length)
+                beg_x = max(0, - i_dat[0])
+                end_x = min(len(x), min(i_dat[1], data_length) - i_dat[0])
+                dat[i_chan, beg_dat:end_dat] = x[beg_x:end_x]
+
+    return dat * self.gain[chan, None]
+
+
+def test_openephys_read_blocks(monkeypatch):
+    # the date does not depend on the locale
+    monkeypatch.setattr(openephys, '_read_date',
+                        lambda settings_file: datetime(2020, 1, 10))
+    _write_synthetic_openephys()
+
+    self = OpenEphys(synthetic_dir)
+    n_samples = self.return_hdr()[4]
+    assert n_samples == 7 * BLK_LENGTH + 2500
+    end_seg = 3 * BLK_LENGTH
+
+    for chan, begsam, endsam in (
+            ([0, 2, 3], -100, 2000),  # before the start
+            ([1, ], 500, 1500),  # across two blocks
+            ([3, 1], end_seg - 10, end_seg + 3000),  # across segments
+            (list(range(N_CHAN)), 0, n_samples),  # whole recording
+            ([2, ], n_samples - 5, n_samples + 5),  # after the end
+            ([0, ], end_seg + 100, end_seg + 200),  # only in the gap
+            ):
+        dat = self.return_dat(chan, begsam, endsam)
+        assert_array_equal(dat, _return_dat_unpack(self, chan, begsam,
+                                                   endsam))
+
+    dat = self.return_dat([0, 1], end_seg - 10, end_seg + 3000)
+    assert not isnan(dat[:, :10]).any()
+    assert isnan(dat[:, 10:2510]).all()
+    assert not isnan(dat[:, 2510:]).any()
+
+    dat = self.return_dat([2, ], n_samples - 5, n_samples + 5,
+                          dtype='float32')
+    assert dat.dtype == 'float32'
+    assert isnan(dat[0, 5:]).all()
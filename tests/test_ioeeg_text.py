@@ -0,0 +1,45 @@
+from numpy import arange, isnan
+from numpy.testing import assert_array_almost_equal
+
+from wonambi import Dataset
+
+from .paths import EXPORTED_PATH
+
+text_dir = EXPORTED_PATH / 'text_rec'
+cache_dir = EXPORTED_PATH / 'text_cache'
+
+
+def _write_text_rec(n_samples):
+    text_dir.mkdir(exist_ok=True)
+    for one_file in text_dir.iterdir():
+        one_file.unlink()
+
+    for chan in ('C3', 'C4'):
+        values = '\n'.join(f'{x:.6e}' for x in arange(n_samples) * 1e-7)
+        (text_dir / f'subj_{chan}.txt').write_text(
+            'Sampling Rate: 256Hz\n' + values + '\n')
+
+
+def test_ioeeg_text():
+    n_samples = 10000
+    _write_text_rec(n_samples)
+    for one_file in cache_dir.glob('*.idx'):
+        one_file.unlink()
+
+    for i in range(3):  # then with the index in cache_dir, and reusing it
+        if i == 0:
+            d = Dataset(text_dir)
+        else:
+            d = Dataset(text_dir, cache_dir=cache_dir)
+        assert d.header['n_samples'] == n_samples
+        assert all(x.suffix == '.txt' for x in text_dir.iterdir())
+
+        data = d.read_data(begsam=5000, endsam=5010)
+        gain = 1600 / 0.001024
+        assert_array_almost_equal(data.data[0][0] / gain,
+                                  arange(5000, 5010) * 1e-7)
+
+    data = d.read_data(begsam=n_samples - 1, endsam=n_samples + 1)
+    assert not isnan(data.data[0][0, 0])
+    assert isnan(data.data[0][0, 1])
+    assert len(list(cache_dir.glob('*.idx'))) == 2
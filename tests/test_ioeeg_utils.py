@@ -8,8 +8,15 @@ from numpy import (append,
                    )
 from numpy.testing import assert_array_equal
 from pytest import raises
+from scipy.io import savemat
 
-from wonambi.ioeeg.utils import _select_blocks
+from wonambi.ioeeg.utils import (_select_blocks,
+                                 read_memmap,
+                                 read_mat5_memmap,
+                                 read_mat5_value,
+                                 )
+
+from .paths import EXPORTED_PATH
 
 
 BLOCKS = array([5, 11, 6, 7, 12])
@@ -73,6 +80,68 @@ def _assert_begsam_endsam(begsam, endsam):
     assert_array_equal(expected_dat, dat)
 
 
+def test_read_memmap():
+    memmap_file = EXPORTED_PATH / 'read_memmap.bin'
+    x = arange(5 * 100, dtype='<i2').reshape(5, 100)
+    offset = 10
+
+    for order in ('F', 'C'):
+        with memmap_file.open('wb') as f:
+            f.write(bytes(offset))
+            f.write(x.tobytes(order=order))
+
+        dat = read_memmap(memmap_file, [4, 1], -3, 10, x.shape, '<i2',
+                          offset=offset, order=order, dtype_out='float32')
+        assert dat.dtype == 'float32'
+        assert isnan(dat[:, :3]).all()
+        assert_array_equal(dat[:, 3:], x[[4, 1], :10])
+
+        dat = read_memmap(memmap_file, [2], 95, 105, x.shape, '<i2',
+                          offset=offset, order=order)
+        assert_array_equal(dat[0, :5], x[2, 95:])
+        assert isnan(dat[0, 5:]).all()
+
+
+def test_read_mat5_memmap():
+    mat_file = EXPORTED_PATH / 'read_mat5_memmap.mat'
+    x = arange(3 * 50, dtype='float32').reshape(3, 50)
+    trial = empty(2, dtype='O')
+    trial[0] = x * 2
+    trial[1] = x
+
+    for compression in (False, True):
+        savemat(mat_file, {'data': {'label': 'abc', 'trial': trial}},
+                do_compression=compression)
+        dat = read_mat5_memmap(mat_file, ['data', 'trial', 1])
+        if compression:
+            assert dat is None
+        else:
+            assert_array_equal(dat, x)
+            assert read_mat5_memmap(mat_file, ['data', 'label']) is None
+            assert read_mat5_memmap(mat_file, ['data', 'time', 0]) is None
+
+
+def test_read_mat5_value():
+    mat_file = EXPORTED_PATH / 'read_mat5_value.mat'
+    label = empty(2, dtype='O')
+    label[:] = ['abc', 'dé']
+
+    for compression in (False, True):
+        savemat(mat_file, {'data': {'label': label, 'fsample': 256.,
+                                    'trial': arange(6).reshape(2, 3)}},
+                do_compression=compression)
+        s_freq = read_mat5_value(mat_file, ['data', 'fsample'])
+        if compression:
+            assert s_freq is None
+        else:
+            assert s_freq.shape == (1, 1)
+            assert s_freq.item() == 256
+            assert read_mat5_value(mat_file, ['data', 'label']) == ['abc', 'dé']
+            assert_array_equal(read_mat5_value(mat_file, ['data', 'trial']),
+                               arange(6).reshape(2, 3))
+            assert read_mat5_value(mat_file, ['data', 'time']) is None
+
+
 def _generate_dat_on_disk():
     intervals = cumsum(append(0, BLOCKS))
 
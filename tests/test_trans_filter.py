@@ -1,8 +1,11 @@
 from numpy.random import seed
+from numpy.testing import assert_array_almost_equal
 from pytest import raises
+from scipy.signal import butter, filtfilt
 
 from wonambi.utils import create_data
 from wonambi.trans import filter_, frequency, convolve
+from wonambi.trans.filter import design_filter, _design_sos
 
 
 seed(0)
@@ -38,6 +41,26 @@ def test_filter_notch():
     assert (freq_data(trial=0, freq=50) > freq_filt(trial=0, freq=50)).all()
 
 
+def test_filter_sos():
+    filt = filter_(data, low_cut=10, high_cut=100)
+
+    b, a = butter(4, (10 / 128, 100 / 128), btype='bandpass')
+    assert_array_almost_equal(filt.data[0],
+                              filtfilt(b, a, data.data[0], axis=1))
+
+
+def test_design_filter_cache():
+    _design_sos.cache_clear()
+    sos = design_filter('butter', 4, (10, 100), 500)
+    sos[:] = 0  # only the copy is modified
+    design_filter('butter', 4, [10., 100.], 500.)
+
+    info = _design_sos.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert design_filter('butter', 4, (10, 100), 500).any()
+
+
 # =============================================================================
 # def test_convolve():
 #     convolve(data, 'hann')
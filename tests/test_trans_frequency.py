@@ -1,10 +1,11 @@
 from wonambi.utils import create_data
 from numpy import arange, pi, sqrt, cos, sum
+from scipy.signal import fftconvolve
 from scipy.signal.spectral import _spectral_helper
 from numpy.random import seed
 from numpy.testing import assert_array_equal, assert_array_almost_equal, assert_almost_equal
 
-from wonambi.trans.frequency import _fft
+from wonambi.trans.frequency import _fft, _tapers, morlet
 from wonambi.trans import frequency, math, timefrequency
 
 
@@ -80,6 +81,26 @@ def test_trans_timefrequency_stft():
     assert timefreq.data[0].shape == (data.number_of('chan')[0], 3, s_freq, NW * 2 - 1)
 
 
+def test_trans_timefrequency_morlet():
+    seed(0)
+    data = create_data(n_trial=2, n_chan=3, s_freq=s_freq, time=(0, dur))
+    foi = (8, 10, 30)
+    timefreq = timefrequency(data, method='morlet', foi=foi, n_jobs=1)
+    assert timefreq.list_of_axes == ('chan', 'time', 'freq')
+    assert timefreq.data[1].shape == (3, dur * s_freq, len(foi))
+
+    # same as the convolution in the time domain
+    wavelet = morlet(10, s_freq, normalization='area')
+    tf = fftconvolve(data.data[1][2, :], wavelet, 'same')
+    assert_array_almost_equal(timefreq.data[1][2, :, 1], tf)
+
+    timefreq_pool = timefrequency(data, method='morlet', foi=foi, n_jobs=2,
+                                  dtype='float32')
+    assert timefreq_pool.data[0].dtype == 'complex64'
+    assert_array_almost_equal(timefreq_pool.data[0], timefreq.data[0],
+                              decimal=4)
+
+
 seed(0)
 data = create_data(n_trial=1, n_chan=2, s_freq=s_freq, time=(0, dur), amplitude=10)
 x = data(trial=0, chan='chan00')
@@ -305,6 +326,25 @@ def test_fft_multiple_chan():
     assert_array_equal(Sxx, Sxx_chan[0, ...])
 
 
+def test_fft_taper_cache():
+    tapers = _tapers('dpss', 512, s_freq, 'power', 4.)
+    assert _tapers('dpss', 512, s_freq, 'power', 4.) is tapers
+    assert not tapers.flags.writeable
+    assert tapers.shape == (7, 512)
+
+    f, Sxx = _fft(x, s_freq, taper='dpss', halfbandwidth=2)
+    f_workers, Sxx_workers = _fft(x, s_freq, taper='dpss', halfbandwidth=2,
+                                  workers=2)
+    assert_array_equal(f, f_workers)
+    assert_array_almost_equal(Sxx, Sxx_workers)
+
+
+def test_frequency_axis_writeable():
+    freq = frequency(data)
+    freq.axis['freq'][0] += 1  # the cached frequencies are not modified
+    assert frequency(data).axis['freq'][0][0] == 0
+
+
 def test_frequency_attr():
     data.attr['xxx'] = True
     freq = frequency(data)
@@ -64,6 +64,21 @@ def test_math_twice_on_same_axis():
         math(data, operator_name=('mean', 'std'), axis='time')
 
 
+def test_math_unknown_axis():
+
+    with raises(ValueError):
+        math(data, operator_name='mean', axis='xxx')
+
+
+def test_math_error_in_operator():
+
+    def wrong_index(x):
+        return x[x.shape[0]]
+
+    with raises(IndexError):
+        math(data, operator=(wrong_index, ))
+
+
 def test_math_lambda():
 
     p3 = lambda x: power(x, 3)
@@ -0,0 +1,41 @@
+from numpy import arange, hstack
+from numpy.testing import assert_array_almost_equal
+
+from wonambi.detect.spindle import _detect_all_chan
+from wonambi.utils import create_data
+from wonambi.utils.pool import get_shared, shared_pool, SharedArray
+
+
+def _sum_row(i):
+    shared = get_shared()
+    return shared['x'].array(shared['shape'])[i].sum() * shared['factor']
+
+
+def _detect_sum(dat_orig, s_freq, time, opts):
+    return dat_orig.sum(), len(time), s_freq
+
+
+def test_shared_pool():
+    shape = (4, 5)
+    x = SharedArray(shape[0] * shape[1], 'float32')
+    x.array(shape)[:] = arange(20).reshape(shape)
+
+    with shared_pool(2, x=x, shape=shape, factor=2) as p:
+        assert p.map(_sum_row, range(4)) == [20, 70, 120, 170]
+
+
+def test_detect_all_chan_trials():
+    data = create_data(n_trial=3, n_chan=3)
+    dat = hstack(data.data)
+    n_smp = dat.shape[1]
+
+    for n_jobs in (1, 2):
+        output = list(_detect_all_chan(_detect_sum, data, None, n_jobs))
+        assert_array_almost_equal([x[0] for x in output], dat.sum(axis=1))
+        assert all(x[1] == n_smp for x in output)
+        assert all(x[2] == data.s_freq for x in output)
+
+    data = create_data(n_trial=1, n_chan=3)
+    output = list(_detect_all_chan(_detect_sum, data, None))
+    assert_array_almost_equal([x[0] for x in output],
+                              data.data[0].sum(axis=1))
@@ -0,0 +1,193 @@
+from threading import Event
+
+from numpy import arange, isnan, NaN, zeros
+from numpy.testing import assert_array_equal
+
+from wonambi.utils import create_data
+from wonambi.widgets.pages import (PageCache,
+                                   decimate_minmax,
+                                   _create_envelope,
+                                   _nbytes,
+                                   )
+
+
+class PageReader:
+    """Read fake pages and keep track of the pages which were read."""
+    def __init__(self, n_bytes=None):
+        self.read = []
+        self.wait = None
+        self.n_bytes = n_bytes
+
+    def __call__(self, window_start, window_length):
+        if self.wait is not None:
+            self.wait.wait(5)
+        self.read.append(window_start)
+        if self.n_bytes is not None:  # page with a size in memory
+            return zeros(self.n_bytes, dtype='u1')
+        return (window_start, window_length)
+
+
+def _wait_prefetch(cache):
+    for page in list(cache.pages.values()):
+        if not page.cancelled():
+            page.result()
+
+
+def test_pages_key():
+    cache = PageCache()
+    read_page = PageReader()
+
+    assert cache.read(read_page, 'x', 30, 30, 300) == (30, 30)
+    _wait_prefetch(cache)
+    assert sorted(read_page.read) == [0, 30, 60]
+    assert set(cache.pages) == {(0, 30), (30, 30), (60, 30)}
+
+    # scroll forward, previous page is in memory
+    assert cache.read(read_page, 'x', 60, 30, 300) == (60, 30)
+    _wait_prefetch(cache)
+    assert sorted(read_page.read) == [0, 30, 60, 90]
+
+    # different window length
+    assert cache.read(read_page, 'x', 60, 10, 300) == (60, 10)
+    _wait_prefetch(cache)
+    assert (60, 10) in cache.pages
+
+
+def test_pages_direction():
+    cache = PageCache()
+    read_page = PageReader()
+
+    cache.read(read_page, 'x', 100, 30, 300)
+    cache.read(read_page, 'x', 110, 30, 300)  # scroll by 10 s
+    _wait_prefetch(cache)
+    assert (120, 30) in cache.pages
+    assert (100, 30) in cache.pages
+
+
+def test_pages_limits():
+    cache = PageCache()
+    read_page = PageReader()
+
+    cache.read(read_page, 'x', 0, 30, 50)
+    _wait_prefetch(cache)
+    assert set(cache.pages) == {(0, 30), (30, 30)}  # no page before start
+
+    cache.read(read_page, 'x', 30, 30, 50)
+    _wait_prefetch(cache)
+    assert set(cache.pages) == {(0, 30), (30, 30)}  # no page after end
+
+
+def test_pages_eviction():
+    cache = PageCache(cache_size=3000)
+    read_page = PageReader(n_bytes=1000)
+
+    for window_start in range(0, 300, 30):
+        cache.read(read_page, 'x', window_start, 30, 1000)
+        _wait_prefetch(cache)
+        assert len(cache.pages) <= 3
+
+    assert (270, 30) in cache.pages
+    n_read = len(read_page.read)
+
+    cache.read(read_page, 'x', 0, 30, 1000)  # removed from memory
+    assert len(read_page.read) == n_read + 1
+
+
+def test_pages_large():
+    cache = PageCache(cache_size=1500)
+    read_page = PageReader(n_bytes=1000)
+
+    # the current page is kept, but there is no space for other pages
+    cache.read(read_page, 'x', 30, 30, 300)
+    _wait_prefetch(cache)
+    assert read_page.read == [30, ]
+    assert set(cache.pages) == {(30, 30)}
+
+    cache.read(read_page, 'x', 60, 30, 300)
+    _wait_prefetch(cache)
+    assert read_page.read == [30, 60]
+    assert set(cache.pages) == {(60, 30)}
+
+
+def test_pages_nbytes():
+    data = create_data(n_chan=2, s_freq=100, time=(0, 1))
+    assert _nbytes(data) == (data.data[0].nbytes +
+                             data.axis['chan'][0].nbytes +
+                             data.axis['time'][0].nbytes)
+    assert _nbytes((0, 30)) == 0
+
+
+def test_pages_settings():
+    cache = PageCache()
+    read_page = PageReader()
+
+    cache.read(read_page, 'x', 30, 30, 300)
+    _wait_prefetch(cache)
+    n_read = len(read_page.read)
+
+    cache.read(read_page, 'x', 30, 30, 300)
+    assert len(read_page.read) == n_read  # in memory
+
+    cache.read(read_page, 'y', 30, 30, 300)
+    assert len(read_page.read) == n_read + 1  # read again
+    assert cache.settings == 'y'
+
+
+def test_pages_cancel():
+    cache = PageCache()
+    read_page = PageReader()
+    cache.read(read_page, 'x', 0, 30, 300)
+    _wait_prefetch(cache)
+
+    # the next pages wait, until the settings change
+    read_page.wait = Event()
+    cache.read(read_page, 'x', 30, 30, 300)  # page 60 is being read
+    cache.prefetch_page(read_page, 120, 30, 300)  # page 120 is waiting
+    waiting = cache.pages[(120, 30)]
+
+    cache.read(PageReader(), 'y', 30, 30, 300)
+    assert waiting.cancelled()
+    assert (120, 30) not in cache.pages
+
+    read_page.wait.set()
+    cache.prefetch.shutdown()
+    assert 120 not in read_page.read
+    assert (60, 30) in cache.pages  # read again with the new settings
+
+
+def test_pages_clear():
+    cache = PageCache()
+    read_page = PageReader()
+    cache.read(read_page, 'x', 30, 30, 300)
+    cache.clear()
+    assert len(cache.pages) == 0
+    assert cache.settings is None
+    assert cache.last_start is None
+
+
+def test_decimate_minmax():
+    x = arange(10)
+    y = zeros((2, 10))
+    y[0, 3] = 100
+    y[1, 7] = -100
+    y[1, :2] = NaN
+
+    x_out, y_out = decimate_minmax(x, y, 5)
+    assert_array_equal(x_out, [0, 0, 2, 2, 4, 4, 6, 6, 8, 8])
+    assert_array_equal(y_out[0], [0, 0, 0, 100, 0, 0, 0, 0, 0, 0])
+    assert isnan(y_out[1, :2]).all()
+    assert_array_equal(y_out[1, 2:], [0, 0, 0, 0, -100, 0, 0, 0])
+
+
+def test_envelope_spike():
+    data = create_data(s_freq=5000, n_chan=2, time=(0, 30), amplitude=0)
+    data.data[0][1, 12345] = 100  # one-sample spike
+
+    envelope = _create_envelope(data, 800)
+    assert envelope.number_of('time')[0] == 1600
+    assert envelope.data[0][1].max() == 100
+    assert envelope.data[0][0].max() == 0
+    assert_array_equal(envelope.axis['chan'][0], data.axis['chan'][0])
+
+    # few samples per pixel
+    assert _create_envelope(data, 100000) is data
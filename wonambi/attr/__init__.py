@@ -5,6 +5,8 @@
         - Surf
     - annotations and sleep scores (module "annotations") with class:
         - Annotations
+    - sleep statistics (module "hypnogram") with class:
+        - Hypnogram
 
 Possibly include forward and inverse models.
 
@@ -24,3 +26,4 @@ dataset and the classes below.
 from .chan import Channels
 from .anat import Brain, Surf, Freesurfer
 from .annotations import Annotations, create_empty_annotations
+from .hypnogram import Hypnogram
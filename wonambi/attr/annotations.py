@@ -1,18 +1,20 @@
 """Module to keep track of the user-made annotations and sleep scoring.
 """
 from logging import getLogger
-from bisect import bisect_left
-from itertools import groupby
 from csv import reader, writer
 from json import dump
 from datetime import datetime, timedelta
-from numpy import (allclose, arange, around, asarray, clip, diff, isnan,
-                   logical_and, modf, nan)
+from numpy import (arange, argsort, around, asarray, concatenate,
+                   delete, diff, empty, flatnonzero, floor, full, insert,
+                   isclose, isin, isnan, log2, maximum, modf, nan, ones,
+                   searchsorted, sort, unique, where)
 from math import ceil, inf
+from os import replace
 from os.path import basename, splitext
 from pathlib import Path
 from re import search, sub
 from scipy.io import loadmat
+from time import monotonic
 from xml.etree.ElementTree import Element, SubElement, tostring, parse
 from xml.dom.minidom import parseString
 
@@ -25,10 +27,14 @@ except ImportError:
 
 from .. import __version__
 from ..utils.exceptions import UnrecognizedFormat
+from .hypnogram import DURATION_STAGES, Hypnogram, SLEEP_STAGES
 
 
 lg = getLogger(__name__)
 VERSION = '5'
+MIN_EVENT_DURATION = 1e-3  # in s, shorter events are grouped together
+EPOCH_DTYPE = [('start', 'i8'), ('end', 'i8'), ('stage', 'O'),
+               ('quality', 'O')]
 DOMINO_STAGE_KEY = {'N1': 'NREM1',
                     'N2': 'NREM2',
                     'N3': 'NREM3',
@@ -238,10 +244,27 @@ class Annotations():
     ----------
     xml_file : path to xml file
         Annotation xml file
+    rater_name : str, optional
+        name of the rater to select (otherwise, the first rater)
+    autosave : float
+        minimum interval (in s) between two writes to file. If 0, the file is
+        written every time the annotations change.
+
+    Notes
+    -----
+    The xml tree is the reference, but the epochs (as a structured array) and
+    the events (one table per event type, sorted by start time) of the current
+    rater are kept in memory, so that queries do not need to parse the xml.
+
+    Changes are written to file by save() only if the last write is older than
+    autosave. Call flush() to write the pending changes (f.e. when closing).
     """
-    def __init__(self, xml_file, rater_name=None):
+    def __init__(self, xml_file, rater_name=None, autosave=0):
 
         self.xml_file = xml_file
+        self.autosave = autosave
+        self._dirty = False
+        self._last_flush = monotonic()
         self.root = self.load()
         if rater_name is None:
             self.rater = self.root.find('rater')
@@ -252,18 +275,41 @@ class Annotations():
         """Load xml from file."""
         lg.info('Loading ' + str(self.xml_file))
         update_annotation_version(self.xml_file)
+        self._reset_index()
 
         xml = parse(self.xml_file)
         return xml.getroot()
 
     def save(self):
-        """Save xml to file."""
+        """Mark the annotations as modified, and write them to file if the last
+        write is older than autosave."""
         if self.rater is not None:
             self.rater.set('modified', datetime.now().isoformat())
 
-        xml = parseString(tostring(self.root))
-        with open(self.xml_file, 'w') as f:
-            f.write(xml.toxml())
+        self._dirty = True
+        if monotonic() - self._last_flush >= self.autosave:
+            self.flush()
+
+    def flush(self):
+        """Write the annotations to file, if they were modified.
+
+        Notes
+        -----
+        The xml is written to a temporary file, which then replaces the
+        annotation file, so that the file is never left half-written.
+        """
+        if not self._dirty:
+            return
+
+        xml_file = Path(self.xml_file)
+        tmp_file = xml_file.with_name(xml_file.name + '.tmp')
+        with tmp_file.open('w') as f:
+            f.write('<?xml version="1.0" ?>')
+            f.write(tostring(self.root, encoding='unicode'))
+        replace(str(tmp_file), str(xml_file))
+
+        self._dirty = False
+        self._last_flush = monotonic()
 
     @property
     def dataset(self):
@@ -670,6 +716,7 @@ class Annotations():
 
                 idx_epoch += 1
 
+        self._reset_index()
         self.save()
 
     def add_bookmark(self, name, time, chan=''):
@@ -826,6 +873,7 @@ class Annotations():
         for e in list(events):
             if e.get('type') == name:
                 events.remove(e)
+                self._events.pop(e, None)
 
         self.save()
 
@@ -879,6 +927,9 @@ class Annotations():
         event_qual = SubElement(new_event, 'event_qual')
         event_qual.text = 'Good'
 
+        if event_type in self._events:
+            self._events[event_type].insert(new_event)
+
         self.save()
 
     def add_events(self, event_list, name=None, chan=None, parent=None):
@@ -912,6 +963,7 @@ class Annotations():
                     self.add_event_type(evt_name)
             pattern = "event_type[@type='" + evt_name + "']"
             event_type = events.find(pattern)
+            self._events.pop(event_type, None)  # rebuild it when needed
             new_event = SubElement(event_type, 'event')
             event_start = SubElement(new_event, 'event_start')
             event_start.text = str(evt['start'])
@@ -952,26 +1004,16 @@ class Annotations():
                 chan = ', '.join(chan)
 
         for e_type in list(events.iterfind(pattern)):
+            table = self._event_table(e_type)
 
-            for e in e_type:
-
-                event_start = float(e.find('event_start').text)
-                event_end = float(e.find('event_end').text)
-                event_chan = e.find('event_chan').text
+            to_remove = ones(len(table), dtype=bool)
+            if time is not None:
+                to_remove &= (isclose(time[0], table.start) &
+                              isclose(time[1], table.end))
+            if chan is not None:
+                to_remove &= table.chan == chan
 
-                if time is None:
-                    time_cond = True
-                else:
-                    time_cond = allclose(time[0], event_start) and allclose(
-                            time[1], event_end)
-
-                if chan is None:
-                    chan_cond = True
-                else:
-                    chan_cond = event_chan == chan
-
-                if time_cond and chan_cond:
-                    e_type.remove(e)
+            table.remove(flatnonzero(to_remove))
 
         self.save()
 
@@ -996,90 +1038,103 @@ class Annotations():
         list of dict
             where each dict has 'name' (name of the event), 'start' (start
             time), 'end' (end time), 'chan' (channels of interest, can be
-            empty), 'stage', 'quality' (signal quality)
+            empty), 'stage', 'quality' (signal quality). Events of the same
+            type are sorted by start time.
 
         Raises
         ------
         IndexError
             When there is no rater / epochs at all
         """
-        # get events inside window
-        events = self.rater.find('events')
-        if name is not None:
-            pattern = "event_type[@type='" + name + "']"
-        else:
-            pattern = "event_type"
-
-        if chan is not None:
-            if isinstance(chan, (tuple, list)):
-                if chan[0] is not None:
-                    chan = ', '.join(chan)
-                else:
-                    chan = None
-
-        if stage or qual:
-            ep_starts = [x['start'] for x in self.epochs]
-            if stage:
-                ep_stages = [x['stage'] for x in self.epochs]
-            if qual:
-                ep_quality = [x['quality'] for x in self.epochs]
-
         ev = []
-        for e_type in events.iterfind(pattern):
-
-            event_name = e_type.get('type')
-
-            for e in e_type:
-
-                event_start = float(e.find('event_start').text)
-                event_end = float(e.find('event_end').text)
-                event_chan = e.find('event_chan').text
-                event_qual = e.find('event_qual').text
-                if event_chan is None:  # xml doesn't store empty string
-                    event_chan = ''
-
-                if stage or qual:
-                    pos = bisect_left(ep_starts, event_start)
-                    if pos == len(ep_starts):
-                        pos -= 1
-                    elif event_start != ep_starts[pos]:
-                        pos -= 1
+        for event_name, table, idx, ev_stage in self._find_events(
+                name, time, chan, stage, qual):
+
+            for i, i_evt in enumerate(idx):
+                one_ev = {'name': event_name,
+                          'start': float(table.start[i_evt]),
+                          'end': float(table.end[i_evt]),
+                          'chan': table.chan[i_evt].split(', '),  # always a list
+                          'stage': '',
+                          'quality': table.qual[i_evt],
+                          }
+                if stage is not None:
+                    one_ev['stage'] = ev_stage[i]
+                ev.append(one_ev)
 
-                if stage is None:
-                    stage_cond = True
-                else:
-                    ev_stage = ep_stages[pos]
-                    stage_cond = ev_stage in stage
+        return ev
 
-                if qual is None:
-                    qual_cond = True
-                else:
-                    ev_qual = ep_quality[pos]
-                    qual_cond = ev_qual == qual
+    def get_events_array(self, name=None, time=None, chan=None, stage=None,
+                         qual=None):
+        """Get the events as arrays, for vectorized analysis.
 
-                if time is None:
-                    time_cond = True
-                else:
-                    time_cond = time[0] <= event_end and time[1] >= event_start
-
-                if chan is None:
-                    chan_cond = True
-                else:
-                    chan_cond = event_chan == chan
+        Parameters
+        ----------
+        name : str, optional
+            name of the event of interest
+        time : tuple of two float, optional
+            start and end time of the period of interest
+        chan : tuple of str, optional
+            list of channels of interests
+        stage : tuple of str, optional
+            list of stages of interest
+        qual : str, optional
+            epoch signal qualifier (Good or Poor)
 
-                if time_cond and chan_cond and stage_cond and qual_cond:
-                    one_ev = {'name': event_name,
-                              'start': event_start,
-                              'end': event_end,
-                              'chan': event_chan.split(', '),  # always a list
-                              'stage': '',
-                              'quality': event_qual
-                              }
-                    if stage is not None:
-                        one_ev['stage'] = ev_stage
-                    ev.append(one_ev)
+        Returns
+        -------
+        dict
+            'start' and 'end' (ndarray of float) of each event, 'name' and
+            'chan' (ndarray of int) with the index of the event type in
+            'event_names' and of the channels in 'chan_names' (list of str,
+            where multiple channels are joined by ', '). Events are sorted by
+            start time.
 
-        return ev
+        Raises
+        ------
+        IndexError
+            When there is no rater / epochs at all
+        """
+        event_names = []
+        chan_names = []
+        start = []
+        end = []
+        name_code = []
+        chan_code = []
+        for event_name, table, idx, _ in self._find_events(name, time, chan,
+                                                          stage, qual):
+            evt_chan, codes = unique(table.chan[idx], return_inverse=True)
+            code_of = {}
+            for one_chan in evt_chan.tolist():
+                if one_chan not in chan_names:
+                    chan_names.append(one_chan)
+                code_of[one_chan] = chan_names.index(one_chan)
+
+            start.append(table.start[idx])
+            end.append(table.end[idx])
+            name_code.append(full(len(idx), len(event_names), dtype=int))
+            chan_code.append(asarray([code_of[x] for x in evt_chan.tolist()],
+                                     dtype=int)[codes])
+            event_names.append(event_name)
+
+        if start:
+            start = concatenate(start)
+            order = argsort(start, kind='mergesort')
+            start = start[order]
+            end = concatenate(end)[order]
+            name_code = concatenate(name_code)[order]
+            chan_code = concatenate(chan_code)[order]
+        else:
+            start = end = empty(0)
+            name_code = chan_code = empty(0, dtype=int)
+
+        return {'start': start,
+                'end': end,
+                'name': name_code,
+                'chan': chan_code,
+                'event_names': event_names,
+                'chan_names': chan_names,
+                }
 
     def create_epochs(self, epoch_length=30, first_second=None):
         """Create epochs in annotation file.
@@ -1112,6 +1167,8 @@ class Annotations():
             quality = SubElement(epoch, 'quality')
             quality.text = 'Good'
 
+        self._reset_index()
+
     @property
     def epochs(self):
         """Get epochs as generator
@@ -1130,14 +1187,11 @@ class Annotations():
         IndexError
             When there is no rater / epochs at all
         """
-        if self.rater is None:
-            raise IndexError('You need to have at least one rater')
-
-        for one_epoch in self.rater.iterfind('stages/epoch'):
-            epoch = {'start': int(one_epoch.find('epoch_start').text),
-                     'end': int(one_epoch.find('epoch_end').text),
-                     'stage': one_epoch.find('stage').text,
-                     'quality': one_epoch.find('quality').text
+        for start, end, stage, quality in self._epoch_array().tolist():
+            epoch = {'start': start,
+                     'end': end,
+                     'stage': stage,
+                     'quality': quality,
                      }
             yield epoch
 
@@ -1163,22 +1217,18 @@ class Annotations():
             where each dict has 'start' (start time), 'end' (end time),
             'stage', 'qual' (signal quality)
         """
-        time_cond = True
-        stage_cond = True
-        qual_cond = True
-        valid = []
-
-        for ep in self.epochs:
-            if stage:
-                stage_cond = ep['stage'] in stage
-            if qual:
-                qual_cond = ep['quality'] == qual
-            if time:
-                time_cond = time[0] <= ep['start'] and time[1] >= ep['end']
-            if stage_cond and qual_cond and time_cond:
-                valid.append(ep)
-
-        return valid
+        epochs = self._epoch_array()
+        valid = ones(len(epochs), dtype=bool)
+
+        if stage:
+            valid &= isin(epochs['stage'], list(stage))
+        if qual:
+            valid &= epochs['quality'] == qual
+        if time:
+            valid &= (time[0] <= epochs['start']) & (time[1] >= epochs['end'])
+
+        return [{'start': start, 'end': end, 'stage': stage, 'quality': quality}
+                for start, end, stage, quality in epochs[valid].tolist()]
 
     def get_epoch_start(self, window_start):
         """ Get the position (seconds) of the nearest epoch.
@@ -1193,10 +1243,10 @@ class Annotations():
         float
             Position (seconds) of the nearest epoch.
         """
-        epoch_starts = [x['start'] for x in self.epochs]
-        idx = asarray([abs(window_start - x) for x in epoch_starts]).argmin()
+        epoch_starts = self._epoch_array()['start']
+        idx = abs(window_start - epoch_starts).argmin()
 
-        return epoch_starts[idx]
+        return int(epoch_starts[idx])
 
     def get_stage_for_epoch(self, epoch_start, window_length=None,
                             attr='stage'):
@@ -1214,16 +1264,18 @@ class Annotations():
         stage : str
             description of the stage.
         """
-        for epoch in self.epochs:
-            if epoch['start'] == epoch_start:
-                return epoch[attr]
+        epochs = self._epoch_array()
+
+        found = epochs['start'] == epoch_start
+        if window_length is not None:
+            epoch_length = epochs['end'] - epochs['start']
+            delay = epoch_start - epochs['start']
+            found |= ((window_length < epoch_length) & (0 <= delay) &
+                      (delay < epoch_length))
 
-            if window_length is not None:
-                epoch_length = epoch['end'] - epoch['start']
-                if logical_and(window_length < epoch_length,
-                               0 <= \
-                               (epoch_start - epoch['start']) < epoch_length):
-                    return epoch[attr]
+        idx = flatnonzero(found)
+        if len(idx) > 0:
+            return epochs[attr][idx[0]]
 
     def time_in_stage(self, name, attr='stage'):
         """Return time (in seconds) in the selected stage.
@@ -1241,8 +1293,10 @@ class Annotations():
             time spent in one stage/qualifier, in seconds.
 
         """
-        return sum(x['end'] - x['start'] for x in self.epochs
-                   if x[attr] == name)
+        epochs = self._epoch_array()
+        selected = epochs[attr] == name
+        return int((epochs['end'][selected] -
+                    epochs['start'][selected]).sum())
 
     def set_stage_for_epoch(self, epoch_start, name, attr='stage', save=True):
         """Change the stage for one specific epoch.
@@ -1271,17 +1325,18 @@ class Annotations():
         down the program, but it's the safer option. But if you're converting
         a dataset, you want to save at the end. Do not forget to save!
         """
-        if self.rater is None:
-            raise IndexError('You need to have at least one rater')
+        epochs = self._epoch_array()
 
-        for one_epoch in self.rater.iterfind('stages/epoch'):
-            if int(one_epoch.find('epoch_start').text) == epoch_start:
-                one_epoch.find(attr).text = name
-                if save:
-                    self.save()
-                return
+        try:
+            idx = self._epoch_pos[epoch_start]
+        except KeyError:
+            raise KeyError('epoch starting at ' + str(epoch_start) +
+                           ' not found')
 
-        raise KeyError('epoch starting at ' + str(epoch_start) + ' not found')
+        self._epoch_elems[idx].find(attr).text = name
+        epochs[attr][idx] = name
+        if save:
+            self.save()
 
     def set_cycle_mrkr(self, epoch_start, end=False):
         """Mark epoch start as cycle start or end.
@@ -1300,16 +1355,16 @@ class Annotations():
         if end:
             bound = 'end'
 
-        for one_epoch in self.rater.iterfind('stages/epoch'):
-            if int(one_epoch.find('epoch_start').text) == epoch_start:
-                cycles = self.rater.find('cycles')
-                name = 'cyc_' + bound
-                new_bound = SubElement(cycles, name)
-                new_bound.text = str(int(epoch_start))
-                self.save()
-                return
+        self._epoch_array()
+        if epoch_start not in self._epoch_pos:
+            raise KeyError('epoch starting at ' + str(epoch_start) +
+                           ' not found')
 
-        raise KeyError('epoch starting at ' + str(epoch_start) + ' not found')
+        cycles = self.rater.find('cycles')
+        name = 'cyc_' + bound
+        new_bound = SubElement(cycles, name)
+        new_bound.text = str(int(epoch_start))
+        self.save()
 
     def remove_cycle_mrkr(self, epoch_start):
         """Remove cycle marker at epoch_start.
@@ -1400,34 +1455,32 @@ class Annotations():
 
         return output
 
+    def hypnogram(self, time=None):
+        """Get the sleep stages of the current rater.
+
+        Parameters
+        ----------
+        time : tuple of two float, optional
+            start and end time of the period of interest
+
+        Returns
+        -------
+        instance of Hypnogram
+            sleep stages of the epochs (only those completely inside the
+            period of interest, if specified)
+        """
+        epochs = self._epoch_array()
+        hypno = Hypnogram(epochs['start'], epochs['end'], epochs['stage'])
+        return hypno.select(time)
+
     def switch(self, time=None):
         """Obtain switch parameter, ie number of times the stage shifts."""
-        stag_to_int = {'NREM1': 1, 'NREM2': 2, 'NREM3': 3, 'REM': 5, 'Wake': 0}
-        hypno = [stag_to_int[x['stage']] for x in self.get_epochs(time=time) \
-                 if x['stage'] in stag_to_int.keys()]
-
-        return sum(asarray(diff(hypno), dtype=bool))
+        return self.hypnogram(time).switch()
 
     def slp_frag(self, time=None):
         """Obtain sleep fragmentation parameter, ie number of stage shifts to
         a lighter stage."""
-        epochs = self.get_epochs(time=time)
-        stage_int = {'Wake': 0, 'NREM1': 1, 'NREM2': 2, 'NREM3': 3, 'REM': 2}
-
-        hypno_str = [x['stage'] for x in epochs \
-                     if x['stage'] in stage_int.keys()]
-        hypno_int = [stage_int[x] for x in hypno_str]
-        frag = sum(asarray(clip(diff(hypno_int), a_min=None, a_max=0),
-                           dtype=bool))
-
-        # N3 to REM doesn't count
-        n3_to_rem = 0
-        for i, j in enumerate(hypno_str[:-1]):
-            if j == 'NREM3':
-                if hypno_str[i + 1] == 'REM':
-                    n3_to_rem += 1
-
-        return frag - n3_to_rem
+        return self.hypnogram(time).slp_frag()
 
     def latency_to_consolidated(self, lights_off, duration=5,
                                 stage=['NREM2', 'NREM3']):
@@ -1447,30 +1500,8 @@ class Annotations():
         float
             latency to the start of the consolidated period, in minutes
         """
-        epochs = self.get_epochs()
-
-        if len(stage) > 1:
-            for ep in epochs:
-                if ep['stage'] in stage:
-                    ep['stage'] = 'target'
-            stage = ['target']
-
-        hypno = [x['stage'] for x in epochs]
-        groups = groupby(hypno)
-        runs = [(stag, sum(1 for _ in group)) for stag, group in groups]
-
-        idx_start = 0
-        for one_stage, n in runs:
-            if (one_stage in stage) and n >= duration * 60 / self.epoch_length:
-                break
-            idx_start += n
-
-        if idx_start < len(hypno):
-            latency = (epochs[idx_start]['start'] - lights_off) / 60
-        else:
-            latency = nan
-
-        return latency
+        return self.hypnogram().latency_to_consolidated(lights_off, duration,
+                                                        stage)
 
     def export(self, file_to_export, xformat='csv'):
         """Export epochwise annotations to csv file.
@@ -1558,49 +1589,28 @@ class Annotations():
         Total dark time and sleep efficiency does NOT subtract epochs marked as
         Undefined or Unknown.
         """
-        epochs = self.get_epochs()
-        ep_starts = [i['start'] for i in epochs]
-        hypno = [i['stage'] for i in epochs]
-        n_ep_per_min = 60 / self.epoch_length
-
-        first = {}
-        latency = {}
-        for stage in ['NREM1', 'NREM2', 'NREM3', 'REM']:
-            first[stage] = next(((i, j) for i, j in enumerate(epochs) if \
-                                j['stage'] == stage), None)
-            if first[stage] is not None:
-                latency[stage] = (first[stage][1]['start'] -
-                       lights_off) / 60
-            else:
-                first[stage] = nan
-                latency[stage] = nan
-
-        idx_loff = asarray([abs(x - lights_off) for x in ep_starts]).argmin()
-        idx_lon = asarray([abs(x - lights_on) for x in ep_starts]).argmin()
-        duration = {}
-        for stage in ['NREM1', 'NREM2', 'NREM3', 'REM', 'Wake', 'Movement',
-                      'Artefact']:
-            duration[stage] = hypno[idx_loff:idx_lon].count(
-                    stage) / n_ep_per_min
-
-        slp_onset = sorted(first.values(), 
-                    key=lambda x: x[1]['start'] if x is not nan else inf)[0]
-        wake_up = next((len(epochs) - i, j) for i, j in enumerate(
-                epochs[::-1]) if j['stage'] in ['NREM1', 'NREM2', 'NREM3',
-                                                'REM'])
-        total_dark_time = (lights_on - lights_off) / 60
-        #slp_period_time = (wake_up[1]['start'] - slp_onset[1]['start']) / 60
-        slp_onset_lat = (slp_onset[1]['start'] - lights_off) / 60
-        waso = hypno[slp_onset[0]:wake_up[0]].count('Wake') / n_ep_per_min
-        wake_mor = (lights_on - wake_up[1]['start']) / 60
-            #APwake = waso + slp_onset_lat
-        waso_total = sum((waso, wake_mor))
-        total_slp_period = sum((waso, duration['NREM1'], duration['NREM2'],
-                                  duration['NREM3'], duration['REM']))
-        total_slp_time = total_slp_period - waso
-        slp_eff = total_slp_time / total_dark_time
-        switch = self.switch()
-        slp_frag = self.slp_frag()
+        hypno = self.hypnogram()
+        stats = hypno.sleep_stats(lights_off, lights_on)
+        if stats is None:
+            return None
+
+        n_ep_per_min = stats['n_ep_per_min']
+        latency = stats['latency']
+        duration = stats['duration']
+        total_dark_time = stats['total_dark_time']
+        slp_onset_lat = stats['slp_onset_lat']
+        waso = stats['waso']
+        wake_mor = stats['wake_mor']
+        waso_total = stats['waso_total']
+        total_slp_period = stats['total_slp_period']
+        total_slp_time = stats['total_slp_time']
+        slp_eff = stats['slp_eff']
+        switch = stats['switch']
+        slp_frag = stats['slp_frag']
+        slcnrem5 = stats['slcnrem5']
+        slcnrem10 = stats['slcnrem10']
+        slcn35 = stats['slcn35']
+        slcn310 = stats['slcn310']
 
         dt_format = '%d/%m/%Y %H:%M:%S'
         loff_str = (self.start_time + timedelta(seconds=lights_off)).strftime(
@@ -1608,41 +1618,27 @@ class Annotations():
         lon_str = (self.start_time + timedelta(seconds=lights_on)).strftime(
                 dt_format)
         slp_onset_str = (self.start_time + timedelta(
-                seconds=slp_onset[1]['start'])).strftime(dt_format)
+                seconds=stats['slp_onset'])).strftime(dt_format)
         wake_up_str = (self.start_time + timedelta(
-                seconds=wake_up[1]['start'])).strftime(dt_format)
-
-        slcnrem5 = self.latency_to_consolidated(lights_off, duration=5,
-                                                stage=['NREM2', 'NREM3'])
-        slcnrem10 = self.latency_to_consolidated(lights_off, duration=10,
-                                                 stage=['NREM2', 'NREM3'])
-        slcn35 = self.latency_to_consolidated(lights_off, duration=5,
-                                              stage=['NREM3'])
-        slcn310 = self.latency_to_consolidated(lights_off, duration=10,
-                                               stage=['NREM3'])
-
-        cycles = self.get_cycles() if self.get_cycles() else []
+                seconds=stats['wake_up'])).strftime(dt_format)
+
+        cycles = self.get_cycles() or []
         cyc_stats = []
 
         for i, cyc in enumerate(cycles):
+            cyc_hypno = hypno.select(time=cyc)
             one_cyc = {}
-            cyc_hypno = [x['stage'] for x in self.get_epochs(time=cyc)]
-            one_cyc['duration'] = {}
-
-            for stage in ['NREM1', 'NREM2', 'NREM3', 'REM', 'Wake', 'Movement',
-                      'Artefact']:
-                one_cyc['duration'][stage] = cyc_hypno.count(stage) # in epochs
+            one_cyc['duration'] = cyc_hypno.count(DURATION_STAGES) # in epochs
 
-            one_cyc['tst'] = sum([one_cyc['duration'][stage] for stage in [
-                    'NREM1', 'NREM2', 'NREM3', 'REM']])
+            one_cyc['tst'] = sum([one_cyc['duration'][stage] for stage in
+                                  SLEEP_STAGES])
             one_cyc['tsp'] = one_cyc['tst'] + one_cyc['duration']['Wake']
             one_cyc['slp_eff'] = one_cyc['tst'] / one_cyc['tsp']
-            one_cyc['switch'] = self.switch(time=cyc)
-            one_cyc['slp_frag'] = self.slp_frag(time=cyc)
+            one_cyc['switch'] = cyc_hypno.switch()
+            one_cyc['slp_frag'] = cyc_hypno.slp_frag()
 
             cyc_stats.append(one_cyc)
 
-
         with open(filename, 'w', newline='') as f:
             lg.info('Writing to ' + str(filename))
             cf = writer(f)
@@ -1661,11 +1657,11 @@ class Annotations():
                          'marker'])
             cf.writerow(['Sleep onset', 'SO',
                          'dd/mm/yyyy HH:MM:SS', slp_onset_str,
-                         'seconds from recording start', slp_onset[1]['start'],
+                         'seconds from recording start', stats['slp_onset'],
                          'first sleep epoch (N1 or N2) - LOFF'])
             cf.writerow(['Time of last awakening', '',
                          'dd/mm/yyyy HH:MM:SS', wake_up_str,
-                         'seconds from recording start', wake_up[1]['start'],
+                         'seconds from recording start', stats['wake_up'],
                          'end time of last epoch of N1, N2, N3 or REM'])
             cf.writerow(['Total dark time (Time in bed)', 'TDT (TIB)',
                          'Epochs', total_dark_time * n_ep_per_min,
@@ -2121,6 +2117,317 @@ class Annotations():
                     f.write('\t'.join([e, '0', 'cycle_end', 'n/a',
                                        _abs_time_str(e, abst), 'n/a']) + '\n')
 
+    def _reset_index(self):
+        """Remove the epochs and events kept in memory (they are read again
+        from the xml when needed)."""
+        self._index_rater = None
+        self._epochs = None
+        self._epoch_elems = None
+        self._epoch_pos = None
+        self._events = {}
+
+    def _check_index(self):
+        """Reset the epochs and events in memory if the rater has changed."""
+        if self.rater is None:
+            raise IndexError('You need to have at least one rater')
+
+        if self._index_rater is not self.rater:
+            self._reset_index()
+            self._index_rater = self.rater
+
+    def _epoch_array(self):
+        """Epochs of the current rater.
+
+        Returns
+        -------
+        ndarray
+            structured array (EPOCH_DTYPE) with 'start', 'end', 'stage' and
+            'quality' of each epoch
+
+        Raises
+        ------
+        IndexError
+            When there is no rater
+        """
+        self._check_index()
+
+        if self._epochs is None:
+            elems = self.rater.findall('stages/epoch')
+            epochs = empty(len(elems), dtype=EPOCH_DTYPE)
+            for i, one_epoch in enumerate(elems):
+                epochs[i] = (int(one_epoch.find('epoch_start').text),
+                             int(one_epoch.find('epoch_end').text),
+                             one_epoch.find('stage').text,
+                             one_epoch.find('quality').text)
+
+            self._epoch_pos = {}
+            for i, start in enumerate(epochs['start'].tolist()):
+                self._epoch_pos.setdefault(start, i)  # first epoch, like xml
+            self._epoch_elems = elems
+            self._epochs = epochs
+
+        return self._epochs
+
+    def _find_events(self, name=None, time=None, chan=None, stage=None,
+                     qual=None):
+        """Find the events of interest (see get_events for the parameters).
+
+        Yields
+        ------
+        str
+            name of the event type
+        instance of _EventTable
+            all the events of that type
+        ndarray of int
+            index of the events of interest in the table (sorted by start time)
+        ndarray of str or None
+            stage of the epoch of each event of interest (only if stage is not
+            None)
+        """
+        events = self.rater.find('events')
+        if name is not None:
+            pattern = "event_type[@type='" + name + "']"
+        else:
+            pattern = "event_type"
+
+        if chan is not None:
+            if isinstance(chan, (tuple, list)):
+                if chan[0] is not None:
+                    chan = ', '.join(chan)
+                else:
+                    chan = None
+
+        ranges = None
+        if stage is not None or qual is not None:
+            epochs = self._epoch_array()
+            in_epochs = ones(len(epochs), dtype=bool)
+            if stage is not None:
+                in_epochs &= isin(epochs['stage'], list(stage))
+            if qual is not None:
+                in_epochs &= epochs['quality'] == qual
+
+            # without time window or channel, look only at the periods of the
+            # selected epochs
+            if time is None and chan is None:
+                ranges = _epoch_ranges(epochs['start'], in_epochs)
+
+        for e_type in events.iterfind(pattern):
+            table = self._event_table(e_type)
+
+            if ranges is None:
+                idx = table.find(time, chan)
+            else:
+                idx = table.starting_in(*ranges)
+
+            ev_stage = None
+            if stage is not None or qual is not None:
+                pos = _epoch_position(epochs['start'], table.start[idx])
+                idx = idx[in_epochs[pos]]
+                if stage is not None:
+                    ev_stage = epochs['stage'][pos[in_epochs[pos]]]
+
+            yield e_type.get('type'), table, idx, ev_stage
+
+    def _event_table(self, event_type):
+        """Events of one type of the current rater.
+
+        Parameters
+        ----------
+        event_type : instance of Element
+            'event_type' element in the xml
+
+        Returns
+        -------
+        instance of _EventTable
+            events of that type, sorted by start time
+        """
+        self._check_index()
+
+        if event_type not in self._events:
+            self._events[event_type] = _EventTable(event_type)
+
+        return self._events[event_type]
+
+
+class _EventTable:
+    """Events of one type, sorted by start time.
+
+    Parameters
+    ----------
+    event_type : instance of Element
+        'event_type' element in the xml, which contains the events
+
+    Attributes
+    ----------
+    start : ndarray of float
+        start time of each event
+    end : ndarray of float
+        end time of each event
+    chan : ndarray of str
+        channels of each event (joined by ', ', as in the xml)
+    qual : ndarray of str
+        signal quality of each event
+    elems : list of instances of Element
+        'event' elements in the xml
+
+    Notes
+    -----
+    Events with the same start time are in the same order as in the xml.
+
+    The interval indices (one for all the events and one for each channel) are
+    created when needed and they are removed when events are added or removed.
+    """
+    def __init__(self, event_type):
+        self.event_type = event_type
+        self._index = {}
+
+        elems = list(event_type)
+        n_evt = len(elems)
+        start = empty(n_evt)
+        end = empty(n_evt)
+        chan = empty(n_evt, dtype='O')
+        qual = empty(n_evt, dtype='O')
+        for i, e in enumerate(elems):
+            start[i], end[i], chan[i], qual[i] = _read_event(e)
+
+        idx = argsort(start, kind='mergesort')
+        self.start = start[idx]
+        self.end = end[idx]
+        self.chan = chan[idx]
+        self.qual = qual[idx]
+        self.elems = [elems[i] for i in idx]
+
+    def __len__(self):
+        return len(self.start)
+
+    def find(self, time=None, chan=None):
+        """Find the events in a time window and/or on some channels.
+
+        Parameters
+        ----------
+        time : tuple of two float, optional
+            start and end time of the period of interest
+        chan : str, optional
+            channels of interest (joined by ', ', as in the xml)
+
+        Returns
+        -------
+        ndarray of int
+            index of the events (sorted by start time)
+        """
+        if chan not in self._index:
+            if chan is None:
+                idx = arange(len(self))
+            else:
+                idx = flatnonzero(self.chan == chan)
+            self._index[chan] = _IntervalIndex(self.start, self.end, idx)
+
+        index = self._index[chan]
+        if time is None:
+            return index.idx
+        return index.find(*time)
+
+    def starting_in(self, beg, end):
+        """Find the events which start in some periods.
+
+        Parameters
+        ----------
+        beg : ndarray
+            start time of each period
+        end : ndarray
+            end time of each period (events starting at end are not included)
+
+        Returns
+        -------
+        ndarray of int
+            index of the events (sorted by start time)
+        """
+        i_beg = searchsorted(self.start, beg, side='left')
+        i_end = searchsorted(self.start, end, side='left')
+        idx = [arange(b, e) for b, e in zip(i_beg, i_end) if e > b]
+        if not idx:
+            return empty(0, dtype=int)
+        return unique(concatenate(idx))
+
+    def insert(self, elem):
+        """Add one event (already added to the xml)."""
+        start, end, chan, qual = _read_event(elem)
+        i = int(searchsorted(self.start, start, side='right'))
+        self.start = insert(self.start, i, start)
+        self.end = insert(self.end, i, end)
+        self.chan = insert(self.chan, i, chan)
+        self.qual = insert(self.qual, i, qual)
+        self.elems.insert(i, elem)
+        self._index = {}
+
+    def remove(self, idx):
+        """Remove events from the table and from the xml.
+
+        Parameters
+        ----------
+        idx : ndarray of int
+            indices of the events to remove
+        """
+        if len(idx) == 0:
+            return
+
+        for i in idx:
+            self.event_type.remove(self.elems[i])
+
+        to_remove = set(idx.tolist())
+        self.elems = [e for i, e in enumerate(self.elems)
+                      if i not in to_remove]
+        self.start = delete(self.start, idx)
+        self.end = delete(self.end, idx)
+        self.chan = delete(self.chan, idx)
+        self.qual = delete(self.qual, idx)
+        self._index = {}
+
+
+class _IntervalIndex:
+    """Index to find the events overlapping a time window.
+
+    Parameters
+    ----------
+    start : ndarray
+        start time of all the events (sorted)
+    end : ndarray
+        end time of all the events
+    idx : ndarray of int
+        index of the events to include in the index (sorted)
+
+    Notes
+    -----
+    The events are divided into groups, so that the durations in each group
+    differ by less than a factor of two. In each group, the events overlapping
+    a window are those ending after the beginning of the window among those
+    which start between (beginning of the window - longest duration in the
+    group) and the end of the window. Because of the similar durations, most
+    of these events overlap with the window, so a query takes O(log n + k)
+    for each group, where k is the number of events in the window.
+    """
+    def __init__(self, start, end, idx):
+        self.idx = idx
+
+        dur = end[idx] - start[idx]
+        group = floor(log2(maximum(dur, MIN_EVENT_DURATION)))
+        self.groups = []
+        for one_group in unique(group):
+            i_group = idx[group == one_group]
+            self.groups.append((start[i_group], end[i_group], i_group,
+                                dur[group == one_group].max()))
+
+    def find(self, t0, t1):
+        """Index of the events overlapping with the window from t0 to t1."""
+        found = []
+        for g_start, g_end, g_idx, max_dur in self.groups:
+            lo = searchsorted(g_start, t0 - max_dur, side='left')
+            hi = searchsorted(g_start, t1, side='right')
+            found.append(g_idx[lo:hi][g_end[lo:hi] >= t0])
+
+        if not found:
+            return empty(0, dtype=int)
+        return sort(concatenate(found))
 
 
 def update_annotation_version(xml_file):
@@ -2157,6 +2464,76 @@ def update_annotation_version(xml_file):
         with open(xml_file, 'w') as f:
             f.write(s)
 
+def _read_event(e):
+    """Read start, end, channels and quality of one event from the xml."""
+    event_chan = e.find('event_chan').text
+    if event_chan is None:  # xml doesn't store empty string
+        event_chan = ''
+
+    return (float(e.find('event_start').text), float(e.find('event_end').text),
+            event_chan, e.find('event_qual').text)
+
+
+def _epoch_position(ep_starts, starts):
+    """Index of the epoch of each event.
+
+    Parameters
+    ----------
+    ep_starts : ndarray
+        start time of the epochs (sorted)
+    starts : ndarray
+        start time of the events
+
+    Returns
+    -------
+    ndarray of int
+        index of the epoch starting exactly at the start of the event, or of
+        the previous epoch.
+    """
+    pos = searchsorted(ep_starts, starts, side='left')
+    exact = pos < len(ep_starts)
+    exact[exact] = ep_starts[pos[exact]] == starts[exact]
+    return where(exact, pos, pos - 1)
+
+
+def _epoch_ranges(ep_starts, selected):
+    """Periods of the events which belong to the selected epochs.
+
+    Parameters
+    ----------
+    ep_starts : ndarray
+        start time of the epochs
+    selected : ndarray of bool
+        epochs of interest
+
+    Returns
+    -------
+    ndarray
+        start time of each period
+    ndarray
+        end time of each period
+
+    Notes
+    -----
+    It follows _epoch_position, so the events starting before the first epoch
+    belong to the last epoch. If the epochs are not sorted, the periods cover
+    the whole recording.
+    """
+    if len(ep_starts) == 0 or (diff(ep_starts) < 0).any():
+        return asarray([-inf]), asarray([inf])
+
+    bounds = concatenate((ep_starts, [inf]))
+    change = diff(concatenate(([0], selected.astype(int), [0])))
+    beg = bounds[flatnonzero(change == 1)]
+    end = bounds[flatnonzero(change == -1)]
+
+    if selected[-1]:
+        beg = concatenate(([-inf], beg))
+        end = concatenate((ep_starts[:1], end))
+
+    return beg, end
+
+
 def _abs_time_str(delay, abs_start, time_str='%Y-%m-%dT%H:%M:%S'):
     return (abs_start + timedelta(seconds=float(delay))).strftime(time_str)
 
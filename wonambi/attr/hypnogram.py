@@ -0,0 +1,320 @@
+"""Module to compute sleep statistics from the sleep stages.
+
+The stages of consecutive epochs are stored as integer codes, so that counts,
+runs, transitions and latencies are computed on numpy arrays.
+"""
+from copy import copy
+from logging import getLogger
+
+from numpy import (around, asarray, bincount, concatenate, diff,
+                   flatnonzero, isin, nan, unique, zeros)
+
+lg = getLogger(__name__)
+
+SLEEP_STAGES = ('NREM1', 'NREM2', 'NREM3', 'REM')
+SWITCH_STAGES = ('Wake', 'NREM1', 'NREM2', 'NREM3', 'REM')
+# depth of sleep, to compute fragmentation (shifts to a lighter stage)
+STAGE_DEPTH = {'Wake': 0, 'NREM1': 1, 'NREM2': 2, 'NREM3': 3, 'REM': 2}
+DURATION_STAGES = ('NREM1', 'NREM2', 'NREM3', 'REM', 'Wake', 'Movement',
+                   'Artefact')
+
+
+class Hypnogram:
+    """Sleep stages of consecutive epochs.
+
+    Parameters
+    ----------
+    start : ndarray
+        start time of each epoch, in s from the start of the recording
+    end : ndarray
+        end time of each epoch, in s from the start of the recording
+    stage : ndarray of str
+        sleep stage of each epoch
+
+    Attributes
+    ----------
+    code : ndarray of int
+        sleep stage of each epoch, as index of stage_names
+    stage_names : list of str
+        name of the sleep stages
+    """
+    def __init__(self, start, end, stage):
+        self.start = asarray(start)
+        self.end = asarray(end)
+
+        stage_names, code = unique(asarray(stage, dtype='U'),
+                                   return_inverse=True)
+        self.stage_names = stage_names.tolist()
+        self.code = code.astype(int)
+
+    def __len__(self):
+        return len(self.code)
+
+    @property
+    def epoch_length(self):
+        """Duration of the epochs (in s), or NaN if there are no epochs."""
+        if len(self.start) == 0:
+            return nan
+        return around(self.end[0] - self.start[0])
+
+    @property
+    def stage(self):
+        """Name of the sleep stage of each epoch."""
+        return asarray(self.stage_names, dtype='O')[self.code]
+
+    def select(self, time=None):
+        """Select the epochs inside a time window.
+
+        Parameters
+        ----------
+        time : tuple of two float, optional
+            start and end time of the period of interest. Only the epochs
+            completely inside the period are kept.
+
+        Returns
+        -------
+        instance of Hypnogram
+            hypnogram with only the epochs of interest
+        """
+        if not time:
+            return self
+
+        selected = (time[0] <= self.start) & (time[1] >= self.end)
+        out = copy(self)
+        out.start = self.start[selected]
+        out.end = self.end[selected]
+        out.code = self.code[selected]
+        return out
+
+    def is_stage(self, stages):
+        """Check if each epoch is in one of the stages.
+
+        Parameters
+        ----------
+        stages : str or list of str
+            name of the stage(s)
+
+        Returns
+        -------
+        ndarray of bool
+            for each epoch, whether it's in one of the stages
+        """
+        return isin(self.code, self._codes(stages))
+
+    def count(self, stages=None, beg=None, end=None):
+        """Count the epochs in each stage.
+
+        Parameters
+        ----------
+        stages : list of str, optional
+            name of the stages (if None, all the stages in the hypnogram)
+        beg : int, optional
+            index of the first epoch to include
+        end : int, optional
+            index of the first epoch not to include
+
+        Returns
+        -------
+        dict
+            number of epochs for each stage
+        """
+        if stages is None:
+            stages = self.stage_names
+
+        n_epochs = bincount(self.code[beg:end],
+                            minlength=len(self.stage_names))
+        return {one_stage: int(n_epochs[self._code(one_stage)])
+                if one_stage in self.stage_names else 0
+                for one_stage in stages}
+
+    def time_in_stage(self, stages):
+        """Time (in s) spent in the stage(s)."""
+        selected = self.is_stage(stages)
+        return (self.end[selected] - self.start[selected]).sum()
+
+    def runs(self, values=None):
+        """Run-length encoding of the stages.
+
+        Parameters
+        ----------
+        values : ndarray, optional
+            one value for each epoch (if None, the stage codes)
+
+        Returns
+        -------
+        ndarray
+            value of each run
+        ndarray of int
+            index of the first epoch of each run
+        ndarray of int
+            number of epochs in each run
+        """
+        if values is None:
+            values = self.code
+
+        if len(values) == 0:
+            return values, zeros(0, dtype=int), zeros(0, dtype=int)
+
+        first = concatenate(([0], flatnonzero(values[1:] != values[:-1]) + 1))
+        n_epochs = diff(concatenate((first, [len(values)])))
+        return values[first], first, n_epochs
+
+    def first(self, stages):
+        """Index of the first epoch in the stage(s) (None if not found)."""
+        idx = flatnonzero(self.is_stage(stages))
+        if len(idx) == 0:
+            return None
+        return int(idx[0])
+
+    def last(self, stages):
+        """Index of the last epoch in the stage(s) (None if not found)."""
+        idx = flatnonzero(self.is_stage(stages))
+        if len(idx) == 0:
+            return None
+        return int(idx[-1])
+
+    def latency(self, stages, lights_off):
+        """Latency (in minutes) from lights off to the first epoch in the
+        stage(s), or NaN if there are no epochs in the stage(s)."""
+        idx = self.first(stages)
+        if idx is None:
+            return nan
+        return (self.start[idx].item() - lights_off) / 60
+
+    def latency_to_consolidated(self, lights_off, duration=5,
+                                stages=('NREM2', 'NREM3')):
+        """Latency to the first period of uninterrupted stage(s).
+
+        Parameters
+        ----------
+        lights_off : float
+            lights off time, in seconds form recording start
+        duration : float
+            duration of uninterrupted period, in minutes
+        stages : list of str
+            target stage(s)
+
+        Returns
+        -------
+        float
+            latency to the start of the consolidated period, in minutes
+        """
+        in_stage, first, n_epochs = self.runs(self.is_stage(stages))
+        found = in_stage & (n_epochs >= duration * 60 / self.epoch_length)
+        if not found.any():
+            return nan
+
+        return (self.start[first[found.argmax()]].item() - lights_off) / 60
+
+    def transitions(self, stages=SWITCH_STAGES):
+        """Count the transitions between stages.
+
+        Parameters
+        ----------
+        stages : list of str
+            stages of interest (epochs in the other stages are ignored, so
+            that a transition can span those epochs)
+
+        Returns
+        -------
+        ndarray of int
+            n_stages X n_stages matrix, with the number of transitions from
+            the stage in the row to the stage in the column
+        """
+        n_stages = len(stages)
+        lookup = zeros(len(self.stage_names), dtype=int) - 1
+        for i, one_stage in enumerate(stages):
+            if one_stage in self.stage_names:
+                lookup[self._code(one_stage)] = i
+
+        idx = lookup[self.code]
+        idx = idx[idx >= 0]
+        pairs = idx[:-1] * n_stages + idx[1:]
+        return bincount(pairs, minlength=n_stages ** 2).reshape(n_stages,
+                                                               n_stages)
+
+    def switch(self):
+        """Number of times the stage shifts (among Wake, N1, N2, N3, REM)."""
+        trans = self.transitions(SWITCH_STAGES)
+        return int(trans.sum() - trans.trace())
+
+    def slp_frag(self):
+        """Number of stage shifts to a lighter stage (N3 to REM doesn't
+        count)."""
+        depth = asarray([STAGE_DEPTH[x] for x in SWITCH_STAGES])
+        lighter = depth[None, :] < depth[:, None]
+        lighter[SWITCH_STAGES.index('NREM3'), SWITCH_STAGES.index('REM')] = False
+        return int(self.transitions(SWITCH_STAGES)[lighter].sum())
+
+    def sleep_stats(self, lights_off, lights_on):
+        """Compute the main sleep statistics.
+
+        Parameters
+        ----------
+        lights_off: float
+            Initial time when sleeper turns off the light (or their phone) to
+            go to sleep, in seconds from recording start
+        lights_on: float
+            Final time when sleeper rises from bed after sleep, in seconds from
+            recording start
+
+        Returns
+        -------
+        dict or None
+            sleep statistics (durations and latencies in minutes), see
+            Annotations.export_sleep_stats. None if there are no epochs scored
+            as sleep.
+
+        Notes
+        -----
+        Durations are computed on the epochs between lights off and lights on,
+        the other values on all the epochs.
+        """
+        slp_onset = self.first(SLEEP_STAGES)
+        if slp_onset is None:
+            return None
+        last_sleep = self.last(SLEEP_STAGES)
+
+        n_ep_per_min = 60 / self.epoch_length
+        idx_loff = int(abs(self.start - lights_off).argmin())
+        idx_lon = int(abs(self.start - lights_on).argmin())
+
+        stats = {'n_ep_per_min': n_ep_per_min,
+                 'slp_onset': self.start[slp_onset].item(),
+                 'wake_up': self.start[last_sleep].item(),
+                 }
+        stats['latency'] = {one_stage: self.latency(one_stage, lights_off)
+                            for one_stage in SLEEP_STAGES}
+        stats['duration'] = {k: v / n_ep_per_min for k, v in self.count(
+                DURATION_STAGES, idx_loff, idx_lon).items()}
+
+        stats['total_dark_time'] = (lights_on - lights_off) / 60
+        stats['slp_onset_lat'] = (stats['slp_onset'] - lights_off) / 60
+        stats['waso'] = self.count(['Wake', ], slp_onset,
+                                   last_sleep + 1)['Wake'] / n_ep_per_min
+        stats['wake_mor'] = (lights_on - stats['wake_up']) / 60
+        stats['waso_total'] = stats['waso'] + stats['wake_mor']
+        stats['total_slp_period'] = stats['waso'] + sum(
+                stats['duration'][x] for x in SLEEP_STAGES)
+        stats['total_slp_time'] = stats['total_slp_period'] - stats['waso']
+        stats['slp_eff'] = stats['total_slp_time'] / stats['total_dark_time']
+        stats['switch'] = self.switch()
+        stats['slp_frag'] = self.slp_frag()
+
+        for name, duration, stages in (('slcnrem5', 5, ('NREM2', 'NREM3')),
+                                       ('slcnrem10', 10, ('NREM2', 'NREM3')),
+                                       ('slcn35', 5, ('NREM3', )),
+                                       ('slcn310', 10, ('NREM3', ))):
+            stats[name] = self.latency_to_consolidated(lights_off, duration,
+                                                       stages)
+
+        return stats
+
+    def _code(self, stage):
+        return self.stage_names.index(stage)
+
+    def _codes(self, stages):
+        """Codes of the stages which are in the hypnogram."""
+        if isinstance(stages, str):
+            stages = (stages, )
+        return [self._code(x) for x in stages if x in self.stage_names]
@@ -242,6 +242,8 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """save the name of the last open dataset."""
+        self.notes.flush_annot()
+
         max_dataset_history = self.value('max_dataset_history')
         keep_recent_datasets(max_dataset_history, self.info)
 
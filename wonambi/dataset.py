@@ -1,10 +1,13 @@
 """Module has information about the datasets, not data.
 
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
+from inspect import signature
 from math import ceil
 from logging import getLogger
 from pathlib import Path
+from threading import RLock
 
 from numpy import arange, asarray, concatenate, empty, int64, zeros
 
@@ -26,12 +29,16 @@ from .ioeeg import (Abf,
                     LyonRRI,
                     )
 from .ioeeg.bci2000 import _read_header_length
+from .ioeeg.cache import CachedReader, CACHE_SIZE
 from .datatype import ChanTime
 from .utils import UnrecognizedFormat
 
 
 lg = getLogger('wonambi')
 
+# formats which decode each sample, so it's worth caching the decoded data
+CACHED_FORMATS = (Ktlx, Text)
+
 
 def _convert_time_to_sample(abs_time, dataset):
     """Convert absolute time into samples.
@@ -158,6 +165,13 @@ class Dataset:
     bids : bool
         whether you give precedence to the information stored in the accompanying
         files which are in the BIDS format
+    cache_dir : str or Path, optional
+        directory where to store the decoded data, for formats which are slow
+        to decode (KTLX, Text). The following reads of the same dataset will
+        use the decoded data. For Text, the index of the lines of each file is
+        also stored there.
+    cache_size : int
+        maximum size of cache_dir (in bytes)
 
     Attributes
     ----------
@@ -184,6 +198,9 @@ class Dataset:
           - filename
           - return_hdr
           - return_dat
+    lock : instance of RLock
+        lock held while reading the data, so that the data can be read from
+        multiple threads (f.e. in the background)
 
     Notes
     -----
@@ -193,8 +210,10 @@ class Dataset:
     differences, for example, if the argument points to a file within a
     directory, or if the file is mapped to memory.
     """
-    def __init__(self, filename, IOClass=None, session=None, bids=False):
+    def __init__(self, filename, IOClass=None, session=None, bids=False,
+                 cache_dir=None, cache_size=CACHE_SIZE):
         self.filename = Path(filename)
+        self.lock = RLock()
 
         if bids:
             IOClass = BIDS
@@ -213,6 +232,10 @@ class Dataset:
             lg.debug(f'Reading session {session}')
             self.dataset = self.IOClass(self.filename, session=session)
 
+        elif self.IOClass is Text:
+            # the index of the lines is stored with the decoded data
+            self.dataset = self.IOClass(self.filename, index_dir=cache_dir)
+
         else:
             self.dataset = self.IOClass(self.filename)
 
@@ -228,6 +251,22 @@ class Dataset:
         hdr['orig'] = output[5]
         self.header = hdr
 
+        if cache_dir is not None:
+            if self.IOClass in CACHED_FORMATS:
+                self.dataset = CachedReader(self.dataset, len(hdr['chan_name']),
+                                            hdr['n_samples'], cache_dir,
+                                            cache_size)
+            else:
+                lg.debug(f'No need to cache {self.IOClass.__name__} format')
+
+    def close(self):
+        """Close the files which the reader keeps open (f.e. hdf5 files for
+        FieldTrip and EEGLAB). They are also closed when the reader is deleted.
+        """
+        close = getattr(self.dataset, 'close', None)
+        if close is not None:
+            close()
+
     def read_markers(self, **kwargs):
         """Return the markers. You can add optional arguments that will be
         passed to the method specific for each datafile.
@@ -290,7 +329,8 @@ class Dataset:
         return videos
 
     def read_data(self, chan=None, begtime=None, endtime=None, begsam=None,
-                  endsam=None, events=None, pre=1, post=1, s_freq=None):
+                  endsam=None, events=None, pre=1, post=1, s_freq=None,
+                  dtype='float64'):
         """Read the data and creates a ChanTime instance
 
         Parameters
@@ -325,6 +365,8 @@ class Dataset:
             event to be included (in s).
         s_freq : int
             sampling frequency of the data
+        dtype : str or numpy.dtype
+            data type of the data (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -345,6 +387,12 @@ class Dataset:
         The time axis will indicate the time in seconds from data.start_time,
         unless you specify "events". In that case, time will run from -"pre" to
         +"post".
+
+        With dtype='float32', the values have about 7 significant digits
+        (f.e. a precision of 0.001 uV for values up to 10 mV), which is more
+        than the resolution of most amplifiers. Readers which accept the
+        dtype argument in return_dat create the data directly in that type,
+        without an intermediate copy in double precision.
         """
         data = ChanTime()
         data.start_time = self.header['start_time']
@@ -357,7 +405,7 @@ class Dataset:
         add_ref = False
         if '_REF' in chan:
             add_ref = True
-            chan[:] = [x for x in chan if x != '_REF']
+            chan = [x for x in chan if x != '_REF']
         idx_chan = [self.header['chan_name'].index(x) for x in chan]
 
         if begtime is None and begsam is None:
@@ -386,27 +434,114 @@ class Dataset:
         data.axis['time'] = empty(n_trl, dtype='O')
         data.data = empty(n_trl, dtype='O')
 
-        for i, one_begsam, one_endsam in zip(range(n_trl), begsam, endsam):
+        if add_ref:
+            chan.append('_REF')
+
+        with self.lock:  # the reader cannot be used by two threads at once
             dataset = self.dataset
-            lg.debug('begsam {0: 6}, endsam {1: 6}'.format(one_begsam,
-                     one_endsam))
-            dat = dataset.return_dat(idx_chan, one_begsam, one_endsam)
-            chan_in_dat = chan
-
-            if add_ref:
-                zero_ref = zeros((1, one_endsam - one_begsam))
-                dat = concatenate((dat, zero_ref), axis=0)
-                chan_in_dat.append('_REF')
-
-            data.data[i] = dat
-            data.axis['chan'][i] = asarray(chan_in_dat, dtype='U')
-            if events is not None:
-                data.axis['time'][i] = event_t
+            if n_trl > 1 and hasattr(dataset, 'return_dat_many'):
+                all_dat = _read_dat_many(dataset, idx_chan, begsam, endsam,
+                                         dtype)
             else:
-                data.axis['time'][i] = arange(one_begsam, one_endsam) / s_freq
+                kwargs = _dtype_kwargs(dataset.return_dat, dtype)
+                all_dat = (dataset.return_dat(idx_chan, one_begsam, one_endsam,
+                                              **kwargs)
+                           for one_begsam, one_endsam in zip(begsam, endsam))
+
+            for i, one_begsam, one_endsam, dat in zip(range(n_trl), begsam,
+                                                      endsam, all_dat):
+                lg.debug('begsam {0: 6}, endsam {1: 6}'.format(one_begsam,
+                         one_endsam))
+
+                dat = dat.astype(dtype, copy=False)
+                if add_ref:
+                    zero_ref = zeros((1, one_endsam - one_begsam), dtype=dtype)
+                    dat = concatenate((dat, zero_ref), axis=0)
+
+                data.data[i] = dat
+                data.axis['chan'][i] = asarray(chan, dtype='U')
+                if events is not None:
+                    data.axis['time'][i] = event_t
+                else:
+                    data.axis['time'][i] = (arange(one_begsam, one_endsam) /
+                                            s_freq)
 
         return data
 
+    def iter_chunks(self, chan=None, chunk_dur=60, overlap=0, dtype=None,
+                    prefetch=True):
+        """Read the whole recording in consecutive chunks, so that you can
+        process long recordings without keeping all the data in memory.
+
+        Parameters
+        ----------
+        chan : list of strings
+            names of the channels to read
+        chunk_dur : float
+            duration of each chunk (in s)
+        overlap : float
+            duration of the data shared by consecutive chunks (in s). It should
+            be shorter than chunk_dur.
+        dtype : str or numpy.dtype, optional
+            data type of the data in each chunk (f.e. 'float32'). By default,
+            the data type is the one returned by read_data.
+        prefetch : bool
+            read the next chunk in the background, while the current chunk is
+            being processed
+
+        Yields
+        ------
+        instance of ChanTime
+            one chunk of data, with one trial. The time axis indicates the
+            time in seconds from the start of the recording. The last chunk
+            might be shorter than chunk_dur.
+
+        Raises
+        ------
+        ValueError
+            if chunk_dur is too short or overlap is not shorter than chunk_dur
+        """
+        s_freq = self.header['s_freq']
+        chunk_smp = int(chunk_dur * s_freq)
+        overlap_smp = int(overlap * s_freq)
+        if chunk_smp <= 0:
+            raise ValueError('chunk_dur should be longer than one sample')
+        if not 0 <= overlap_smp < chunk_smp:
+            raise ValueError('overlap should be shorter than chunk_dur')
+
+        if chan is None:
+            chan = self.header['chan_name']
+        n_samples = self.header['n_samples']
+
+        # a new chunk is needed only if the previous one did not reach the end
+        all_begsam = list(range(0, n_samples - overlap_smp,
+                                chunk_smp - overlap_smp))
+        if not all_begsam and n_samples > 0:
+            all_begsam = [0, ]
+
+        def _read_chunk(begsam):
+            kwargs = {} if dtype is None else {'dtype': dtype}
+            return self.read_data(chan=list(chan), begsam=begsam,
+                                  endsam=min(begsam + chunk_smp, n_samples),
+                                  **kwargs)
+
+        if not prefetch:
+            for begsam in all_begsam:
+                yield _read_chunk(begsam)
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_chunk = None
+            for i, begsam in enumerate(all_begsam):
+                if next_chunk is None:
+                    next_chunk = executor.submit(_read_chunk, begsam)
+                chunk = next_chunk.result()
+
+                if i + 1 < len(all_begsam):
+                    next_chunk = executor.submit(_read_chunk,
+                                                 all_begsam[i + 1])
+                yield chunk
+
     def _convert_to_list_with_samples(self, times=None, samples=None):
         """Convenience function to convert the input into a list of samples"""
         if times is not None:
@@ -422,6 +557,76 @@ class Dataset:
         return samples
 
 
+def _read_dat_many(dataset, chan, begsam, endsam, dtype='float64'):
+    """Read multiple trials at once, merging overlapping or adjacent trials.
+
+    Parameters
+    ----------
+    dataset : instance of a class which depends on format
+        it should have the method return_dat_many
+    chan : list of int
+        indices of the channels to read
+    begsam : list of int
+        first sample of each trial
+    endsam : list of int
+        last sample of each trial (not included)
+    dtype : str or numpy.dtype
+        data type of the data (only if return_dat_many accepts it)
+
+    Returns
+    -------
+    list of numpy.ndarray
+        data for each trial, in the same order as begsam and endsam
+    """
+    spans = []  # begsam, endsam, and trials in each span
+    for i in sorted(range(len(begsam)), key=lambda i: begsam[i]):
+        if spans and begsam[i] <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], endsam[i])
+            spans[-1][2].append(i)
+        else:
+            spans.append([begsam[i], endsam[i], [i, ]])
+
+    lg.debug(f'Reading {len(begsam)} trials in {len(spans)} spans')
+    all_dat = dataset.return_dat_many(chan, [x[0] for x in spans],
+                                      [x[1] for x in spans],
+                                      **_dtype_kwargs(dataset.return_dat_many,
+                                                      dtype))
+
+    output = [None] * len(begsam)
+    for (span_begsam, _, trials), dat in zip(spans, all_dat):
+        for i in trials:
+            x = dat[:, begsam[i] - span_begsam:endsam[i] - span_begsam]
+            # trials should not share memory
+            output[i] = x.copy() if len(trials) > 1 else x
+
+    return output
+
+
+def _dtype_kwargs(method, dtype):
+    """Pass dtype to the method of the reader, only if the reader accepts it.
+
+    Parameters
+    ----------
+    method : method
+        return_dat or return_dat_many of the reader
+    dtype : str or numpy.dtype
+        data type of the data
+
+    Returns
+    -------
+    dict
+        keyword arguments for the method (empty if the method does not accept
+        dtype, the data will then be converted by read_data)
+    """
+    try:
+        args = signature(method).parameters
+    except (TypeError, ValueError):
+        return {}
+    if 'dtype' in args:
+        return {'dtype': dtype}
+    return {}
+
+
 def _count_openephys_sessions(filename):
     """Open-ephys can have multiple sessions. We count how many files are in
     the format:
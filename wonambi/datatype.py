@@ -10,7 +10,9 @@ from copy import deepcopy
 from logging import getLogger
 from pathlib import Path
 
-from numpy import arange, array, empty, ix_, NaN, squeeze, where
+from numpy import (arange, argsort, array, array_equal, asarray, empty,
+                   flatnonzero, ix_, minimum, NaN, ndarray, searchsorted,
+                   squeeze, stack, where)
 
 lg = getLogger()
 
@@ -51,6 +53,12 @@ class Data:
     Something which is not immediately clear for chan. dtype='U' (meaning
     Unicode) actually creates string of type str\_, while if you use dtype='S'
     (meaning String) it creates strings of type bytes\_.
+
+    If all the trials have the same axes, data can be stored as one ndarray,
+    with trial as first dimension (see to_dense). data[i] still returns the
+    data of one trial, so the rest of the code does not need to know how the
+    data are stored, but some functions (math, frequency, filter_) run only
+    one operation on all the trials at once.
     """
     def __init__(self, data=None, s_freq=None, **kwargs):
 
@@ -92,7 +100,7 @@ class Data:
                      'scores': None,
                      }
 
-    def __call__(self, trial=None, tolerance=None, **axes):
+    def __call__(self, trial=None, tolerance=None, copy=True, **axes):
         """Return the recordings and their time stamps.
 
         Parameters
@@ -107,6 +115,12 @@ class Data:
             if one of the axiss is a number, it specifies the tolerance to
             consider one value as chosen (take into account floating-precision
             errors).
+        copy : bool
+            if False, it returns a view of the data (without copying it) when
+            all the selected values are in the data and they form a regular
+            range (f.e. when you don't select any value). Use it only if you
+            don't modify the output, because the changes are applied to the
+            data as well.
 
         Returns
         -------
@@ -124,6 +138,8 @@ class Data:
         -----
         You cannot specify intervals here, you can do it in Select.
 
+        If some of the selected values are not in the data, the output always
+        contains a copy of the data (and NaN for the missing values).
         """
         if trial is None:
             trial = range(self.number_of('trial'))
@@ -165,18 +181,31 @@ class Data:
                     idx_output.append(idx[1])
                 else:
                     n_values = len(values[i])
-                    idx_data.append(arange(n_values))
-                    idx_output.append(arange(n_values))
+                    idx_data.append(slice(None))
+                    idx_output.append(slice(None))
 
                 output_shape.append(n_values)
 
-            output[cnt] = empty(output_shape, dtype=self.data[i].dtype)
-            output[cnt].fill(NaN)
+            slice_data = [_as_slice(x, n) for x, n in zip(idx_data,
+                                                          output_shape)]
+
+            if all([x is not None for x in slice_data]):
+                output[cnt] = self.data[i][tuple(slice_data)]
+                if copy:
+                    output[cnt] = output[cnt].copy()
+
+            else:
+                output[cnt] = empty(output_shape, dtype=self.data[i].dtype)
+                output[cnt].fill(NaN)
 
-            if all([len(x) > 0 for x in idx_data]):
-                ix_output = ix_(*idx_output)
-                ix_data = ix_(*idx_data)
-                output[cnt][ix_output] = self.data[i][ix_data]
+                idx_data = [arange(n) if isinstance(x, slice) else x
+                            for x, n in zip(idx_data, output_shape)]
+                idx_output = [arange(n) if isinstance(x, slice) else x
+                              for x, n in zip(idx_output, output_shape)]
+                if all([len(x) > 0 for x in idx_data]):
+                    ix_output = ix_(*idx_output)
+                    ix_data = ix_(*idx_data)
+                    output[cnt][ix_output] = self.data[i][ix_data]
 
             if len(squeeze_axis) > 0:
                 output[cnt] = squeeze(output[cnt],
@@ -187,6 +216,41 @@ class Data:
 
         return output
 
+    @property
+    def dense(self):
+        """Whether all the trials are stored in one ndarray (with trial as the
+        first dimension), instead of an ndarray (dtype='O') of trials."""
+        return self.data.dtype != 'O'
+
+    def to_dense(self):
+        """Store all the trials in one ndarray.
+
+        Returns
+        -------
+        instance of Data (or ChanTime, ChanFreq, ChanTimeFreq)
+            data with all the trials in one ndarray, with trial as the first
+            dimension. Each axis contains the same array for all the trials.
+
+        Raises
+        ------
+        ValueError
+            if the trials do not have the same values on every axis.
+        """
+        n_trial = self.number_of('trial')
+
+        output = self._copy(axis=False)
+        for axis_name, values in self.axis.items():
+            for i in range(1, n_trial):
+                if not array_equal(values[i], values[0]):
+                    raise ValueError('Trials have different values on axis '
+                                     + axis_name)
+            output.axis[axis_name] = empty(n_trial, dtype='O')
+            output.axis[axis_name].fill(values[0])
+
+        output.data = stack(list(self.data))
+
+        return output
+
     @property
     def list_of_axes(self):
         """Return the name of all the axes in the data."""
@@ -487,8 +551,9 @@ def _get_indices(values, selected, tolerance):
 
     Notes
     -----
-    This function is probably not very fast, but it's pretty robust. It keeps
-    the order, which is extremely important.
+    It keeps the order, which is extremely important. Without tolerance, the
+    selected values are looked up at once in the sorted axis (axes which are
+    already sorted, like time and freq, are not sorted again).
 
     If you use values in the self.axis, you don't need to specify tolerance.
     However, if you specify arbitrary points, floating point errors might
@@ -499,15 +564,141 @@ def _get_indices(values, selected, tolerance):
     """
     idx_data = []
     idx_output = []
+
+    if tolerance is None or values.dtype.kind == 'U':
+        return _search_sorted(values, selected)
+
     for idx_of_selected, one_selected in enumerate(selected):
+        idx_of_data = where(abs(values - one_selected) <= tolerance)[0] # actual use min
+
+        if len(idx_of_data) > 0:
+            idx_data.append(idx_of_data[0])
+            idx_output.append(idx_of_selected)
+
+    return idx_data, idx_output
+
+
+def _search_sorted(values, selected):
+    """Indices of the first values equal to the selected values.
+
+    Parameters
+    ----------
+    values : ndarray (any dtype)
+        values present in the axis.
+    selected : ndarray (any dtype) or tuple or list
+        values selected by the user
+
+    Returns
+    -------
+    idx_data : list of int
+        indices of row/column to select the data
+    idx_output : list of int
+        indices of row/column to copy into output
+    """
+    order, sorted_values = _sort_axis(values)
+    if sorted_values is None or len(values) == 0:
+        return _scan(values, selected)
 
-        if tolerance is None or values.dtype.kind == 'U':
-            idx_of_data = where(values == one_selected)[0]
+    try:
+        if values.dtype.kind == 'O':
+            selected = asarray(selected, dtype='O')
         else:
-            idx_of_data = where(abs(values - one_selected) <= tolerance)[0] # actual use min
+            selected = asarray(selected)
+        pos = minimum(searchsorted(sorted_values, selected), len(values) - 1)
+        is_found = sorted_values[pos] == selected
+    except (TypeError, ValueError):  # values that cannot be compared
+        return _scan(values, selected)
 
+    if not isinstance(is_found, ndarray):
+        return _scan(values, selected)
+
+    if order is not None:
+        pos = order[pos]
+
+    return pos[is_found].tolist(), flatnonzero(is_found).tolist()
+
+
+def _sort_axis(values):
+    """Sort order of the values of one axis.
+
+    Parameters
+    ----------
+    values : ndarray (any dtype)
+        values present in the axis.
+
+    Returns
+    -------
+    order : ndarray or None
+        indices that sort the values (None if the values are already sorted)
+    sorted_values : ndarray or None
+        the values in sorted order (None if the values cannot be sorted)
+    """
+    try:
+        if (values[1:] >= values[:-1]).all():
+            return None, values
+        order = argsort(values, kind='stable')
+        return order, values[order]
+    except (TypeError, ValueError, AttributeError):  # values that cannot be sorted
+        return None, None
+
+
+def _scan(values, selected):
+    """Indices of the first values equal to the selected values, comparing
+    each selected value with the whole axis.
+
+    Parameters
+    ----------
+    values : ndarray (any dtype)
+        values present in the axis.
+    selected : ndarray (any dtype) or tuple or list
+        values selected by the user
+
+    Returns
+    -------
+    idx_data : list of int
+        indices of row/column to select the data
+    idx_output : list of int
+        indices of row/column to copy into output
+    """
+    idx_data = []
+    idx_output = []
+    for idx_of_selected, one_selected in enumerate(selected):
+        is_equal = values == one_selected
+        if not isinstance(is_equal, ndarray):  # comparison between types
+            continue
+
+        idx_of_data = flatnonzero(is_equal)
         if len(idx_of_data) > 0:
-            idx_data.append(idx_of_data[0])
+            idx_data.append(int(idx_of_data[0]))
             idx_output.append(idx_of_selected)
 
     return idx_data, idx_output
+
+
+def _as_slice(idx, n_values):
+    """Convert indices into a slice, if possible.
+
+    Parameters
+    ----------
+    idx : list of int or slice
+        indices of the data to select (all the values if it's a slice)
+    n_values : int
+        number of values that should be selected
+
+    Returns
+    -------
+    slice or None
+        slice selecting the same values as idx, or None if the indices are not
+        a regular range or if some values were not found.
+    """
+    if isinstance(idx, slice):
+        return idx
+    if len(idx) != n_values or n_values == 0:
+        return None
+    if n_values == 1:
+        return slice(idx[0], idx[0] + 1)
+
+    step = idx[1] - idx[0]
+    if step <= 0 or any(b - a != step for a, b in zip(idx[:-1], idx[1:])):
+        return None
+    return slice(idx[0], idx[-1] + 1, step)
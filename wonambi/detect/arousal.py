@@ -95,7 +95,7 @@ class DetectArousal:
             
             lg.info('Detecting arousals on chan %s', chan)
             time = hstack(data.axis['time'])
-            dat_orig = hstack(data(chan=chan))
+            dat_orig = hstack(data(chan=chan, copy=False))
 
             if 'HouseDetector' in self.method:
                 arou_in_chan = detect_HouseDetector(dat_orig, data.s_freq, time,
@@ -2,7 +2,7 @@
 
 """
 from logging import getLogger
-from numpy import argmin, concatenate, diff, hstack, sign, sum, where, zeros
+from numpy import argmin, concatenate, diff, sign, sum, where, zeros
 
 try:
     from PyQt5.QtCore import Qt
@@ -11,7 +11,7 @@ except ImportError:
     pass
 
 from .spindle import (detect_events, transform_signal, within_duration, 
-                      remove_straddlers)
+                      remove_straddlers, _detect_all_chan)
 from ..graphoelement import SlowWaves
 
 lg = getLogger(__name__)
@@ -67,7 +67,7 @@ class DetectSlowWave:
         return ('detsw_{0}_{1:04.2f}-{2:04.2f}Hz'
                 ''.format(self.method, *self.det_filt['freq']))
 
-    def __call__(self, data, parent=None):
+    def __call__(self, data, parent=None, n_jobs=1):
         """Detect slow waves on the data.
 
         Parameters
@@ -76,6 +76,10 @@ class DetectSlowWave:
             data used for detection
         parent : QWidget
             for use with GUI, as parent widget for the progress bar
+        n_jobs : int
+            number of processes which detect the slow waves on the channels in
+            parallel. If None, it uses all the CPUs. If 1, it does not start
+            any process.
         
         Returns
         -------
@@ -91,18 +95,10 @@ class DetectSlowWave:
         slowwave.chan_name = data.axis['chan'][0]
 
         all_slowwaves = []
-        for i, chan in enumerate(data.axis['chan'][0]):
-            
-            lg.info('Detecting slow waves on chan %s', chan)
-            time = hstack(data.axis['time'])
-            dat_orig = hstack(data(chan=chan))
-
-            if 'Massimini2004' in self.method:
-                sw_in_chan = detect_Massimini2004(dat_orig, data.s_freq, time,
-                                                  self)
-
-            else:
-                raise ValueError('Unknown method')
+        for i, (chan, sw_in_chan) in enumerate(zip(
+                data.axis['chan'][0],
+                _detect_all_chan(_detect_one_chan, data, self, n_jobs,
+                                 'slow waves'))):
 
             for sw in sw_in_chan:
                 sw.update({'chan': chan})
@@ -121,6 +117,7 @@ class DetectSlowWave:
 
         return slowwave
 
+
 def detect_Massimini2004(dat_orig, s_freq, time, opts):
     """Slow wave detection based on Massimini et al., 2004.
 
@@ -307,3 +304,12 @@ def _add_halfwave(data, events, s_freq, opts):
         #lg.info('SW checks out, accepted! ptp is ' + str(abs(data[ev[1]] - data[ev[3]])))
 
     return events[selected, :]
+
+
+def _detect_one_chan(dat_orig, s_freq, time, opts):
+    """Detect slow waves on one channel, with the method in opts.method."""
+    if 'Massimini2004' in opts.method:
+        return detect_Massimini2004(dat_orig, s_freq, time, opts)
+
+    else:
+        raise ValueError('Unknown method')
@@ -1,5 +1,6 @@
 """Module to detect spindles.
 """
+from functools import lru_cache
 from logging import getLogger
 from numpy import (absolute, arange, argmax, argmin, around, asarray, 
                    concatenate, cos, diff, exp, empty, histogram, 
@@ -7,9 +8,8 @@ from numpy import (absolute, arange, argmax, argmin, around, asarray,
                    nan, ones, percentile, pi, ptp, real, sqrt, square, std, 
                    sum, vstack, where, zeros)
 from scipy.ndimage.filters import gaussian_filter
-from scipy.signal import (argrelmax, butter, cheby2, filtfilt, 
-                          fftconvolve, hilbert, periodogram, remez, 
-                          sosfiltfilt, spectrogram, tukey)
+from scipy.signal import (argrelmax, filtfilt, fftconvolve, hilbert, 
+                          periodogram, remez, sosfiltfilt, spectrogram, tukey)
 from scipy.fftpack import next_fast_len
 try:
     from PyQt5.QtCore import Qt
@@ -17,7 +17,11 @@ try:
 except ImportError:
     pass
 
+from .window import (moving_covar, moving_mean, moving_ms,
+                     moving_power_ratio, moving_sd, window_bounds)
 from ..graphoelement import Spindles
+from ..trans.filter import FILTER_CACHE, design_filter
+from ..utils.pool import get_shared, shared_pool, SharedArray
 
 lg = getLogger(__name__)
 MAX_FREQUENCY_OF_INTEREST = 50
@@ -226,7 +230,7 @@ class DetectSpindle:
                 ''.format(self.method, self.frequency[0], self.frequency[1],
                           self.duration[0], self.duration[1]))
 
-    def __call__(self, data, parent=None):
+    def __call__(self, data, parent=None, n_jobs=1):
         """Detect spindles on the data.
 
         Parameters
@@ -235,6 +239,10 @@ class DetectSpindle:
             data used for detection
         parent : QWidget
             for use with GUI, as parent widget for the progress bar
+        n_jobs : int
+            number of processes which detect the spindles on the channels in
+            parallel. If None, it uses all the CPUs. If 1, it does not start
+            any process.
 
         Returns
         -------
@@ -256,70 +264,11 @@ class DetectSpindle:
 
         all_spindles = []
         i = 0
-        for i, chan in enumerate(data.axis['chan'][0]):
-                
-            lg.info('Detecting spindles on channel %s', chan)
-            time = hstack(data.axis['time'])
-            dat_orig = hstack(data(chan=chan))
-
-            if self.method == 'Ferrarelli2007':
-                sp_in_chan, values, density = detect_Ferrarelli2007(dat_orig,
-                                                                    data.s_freq,
-                                                                    time,
-                                                                    self)
-
-            elif self.method == 'Nir2011':
-                sp_in_chan, values, density = detect_Nir2011(dat_orig,
-                                                             data.s_freq,
-                                                             time, self)
-            
-            elif self.method == 'Wamsley2012':
-                sp_in_chan, values, density = detect_Wamsley2012(dat_orig,
-                                                                 data.s_freq,
-                                                                 time, self)
-
-            elif self.method == 'UCSD':
-                sp_in_chan, values, density = detect_UCSD(dat_orig,
-                                                          data.s_freq, time,
-                                                          self)
-            elif self.method == 'Moelle2011':
-                sp_in_chan, values, density = detect_Moelle2011(dat_orig,
-                                                                data.s_freq,
-                                                                time, self)
-                
-            elif self.method == 'Martin2013':
-                sp_in_chan, values, density = detect_Martin2013(dat_orig,
-                                                                data.s_freq,
-                                                                time, self)
-            
-            elif self.method == 'Ray2015':
-                sp_in_chan, values, density = detect_Ray2015(dat_orig,
-                                                            data.s_freq,
-                                                            time, self)
-                
-            elif self.method == 'Lacourse2018':
-                sp_in_chan, values, density = detect_Lacourse2018(dat_orig,
-                                                                  data.s_freq,
-                                                                  time, self)    
-            
-            elif self.method == 'FASST':
-                sp_in_chan, values, density = detect_FASST(dat_orig,
-                                                           data.s_freq,
-                                                           time, self,
-                                                           submethod='abs')
-                
-            elif self.method == 'FASST2':
-                sp_in_chan, values, density = detect_FASST(dat_orig,
-                                                           data.s_freq,
-                                                           time, self,
-                                                           submethod='rms')
-                
-            elif self.method == 'Concordia':
-                sp_in_chan, values, density = detect_Concordia(dat_orig,
-                                                               data.s_freq,
-                                                               time, self)
-            else:
-                raise ValueError('Unknown method')
+        for i, (chan, result) in enumerate(zip(
+                data.axis['chan'][0],
+                _detect_all_chan(_detect_one_chan, data, self, n_jobs,
+                                 'spindles'))):
+            sp_in_chan, values, density = result
 
             spindle.det_values[i] = values
             spindle.density[i] = density
@@ -1242,10 +1191,8 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
         freq = method_opt['freq']
         N = method_opt['order']
 
-        nyquist = s_freq / 2
-        Wn = asarray(freq) / nyquist
-        b, a = butter(N, Wn, btype='bandpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('butter', N, freq, s_freq, btype='bandpass')
+        dat = sosfiltfilt(sos, dat)
         
     if 'cdemod' == method:
         carr_freq = method_opt['freq']
@@ -1258,39 +1205,32 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
         N = method_opt['order']
 
         Rs = 40
-        nyquist = s_freq / 2
-        Wn = asarray(freq) / nyquist
-        b, a = cheby2(N, Rs, Wn, btype='bandpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('cheby2', N, freq, s_freq, btype='bandpass',
+                            rs=Rs)
+        dat = sosfiltfilt(sos, dat)
 
     if 'double_butter' == method:
         freq = method_opt['freq']
         N = method_opt['order']
-        nyquist = s_freq / 2
         
         # Highpass
-        Wn = freq[0] / nyquist
-        b, a = butter(N, Wn, btype='highpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('butter', N, freq[0], s_freq, btype='highpass')
+        dat = sosfiltfilt(sos, dat)
         
         # Lowpass
-        Wn = freq[1] / nyquist
-        b, a = butter(N, Wn, btype='lowpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('butter', N, freq[1], s_freq, btype='lowpass')
+        dat = sosfiltfilt(sos, dat)
 
     if 'double_sosbutter' == method:
         freq = method_opt['freq']
         N = method_opt['order']
-        nyquist = s_freq / 2
         
         # Highpass
-        Wn = freq[0] / nyquist
-        sos = butter(N, Wn, btype='highpass', output='sos')
+        sos = design_filter('butter', N, freq[0], s_freq, btype='highpass')
         dat = sosfiltfilt(sos, dat)
         
         # Lowpass
-        Wn = freq[1] / nyquist
-        sos = butter(N, Wn, btype='lowpass', output='sos')
+        sos = design_filter('butter', N, freq[1], s_freq, btype='lowpass')
         dat = sosfiltfilt(sos, dat)
     
     if 'gaussian' == method:
@@ -1306,20 +1246,16 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
     if 'low_butter' == method:
         freq = method_opt['freq']
         N = method_opt['order']
-        nyquist = s_freq / 2
         
-        Wn = freq / nyquist
-        b, a = butter(N, Wn, btype='lowpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('butter', N, freq, s_freq, btype='lowpass')
+        dat = sosfiltfilt(sos, dat)
     
     if 'high_butter' == method:
         freq = method_opt['freq']
         N = method_opt['order']
-        nyquist = s_freq / 2
         
-        Wn = freq / nyquist
-        b, a = butter(N, Wn, btype='highpass')
-        dat = filtfilt(b, a, dat)
+        sos = design_filter('butter', N, freq, s_freq, btype='highpass')
+        dat = sosfiltfilt(sos, dat)
     
     if 'morlet' == method:
         f0 = method_opt['f0']
@@ -1333,27 +1269,13 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
             dat = absolute(dat)            
 
     if 'moving' in method:
-        dur = method_opt['dur']
-        halfdur = dur / 2
-        total_dur = len(dat) / s_freq
-        last = len(dat) - 1
-        
-        if method_opt['step']:
-            step = method_opt['step']
-            len_out = int(len(dat) / (step * s_freq))
-        else:
-            step = 1 / s_freq
-            len_out = len(dat)
-            
+        beg, end, len_out = window_bounds(len(dat), s_freq, method_opt['dur'],
+                                          method_opt['step'])
         out = zeros((len_out))
+        n_win = len(beg)
         
         if 'moving_covar' == method:            
-            for i, j in enumerate(arange(0, total_dur, step)[:-1]):
-                beg = max(0, int((j - halfdur) * s_freq))
-                end = min(last, int((j + halfdur) * s_freq))
-                win1 = dat[beg:end]
-                win2 = dat2[beg:end]
-                out[i] = mean((win1 - mean(win1)) * (win2 - mean(win2)))
+            out[:n_win] = moving_covar(dat, dat2, beg, end)
             dat = out
     
         if 'moving_power_ratio' == method:
@@ -1362,54 +1284,28 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
             fft_dur = method_opt['fft_dur']
             nfft = int(s_freq * fft_dur)
             
-            for i, j in enumerate(arange(0, total_dur, step)[:-1]):
-                beg = max(0, int((j - halfdur) * s_freq))
-                end = min(last, int((j + halfdur) * s_freq))
-                windat = dat[beg:end]
-                
-                sf, psd = periodogram(windat, s_freq, 'hann', nfft=nfft,
-                                       detrend='constant')
-                f0 = asarray([abs(x - freq1[0]) for x in sf]).argmin()
-                f1 = asarray([abs(x - freq1[1]) for x in sf]).argmin()
-                pow1 = sum(psd[f0:f1])
-                
-                f0 = asarray([abs(x - freq2[0]) for x in sf]).argmin()
-                f1 = asarray([abs(x - freq2[1]) for x in sf]).argmin()
-                pow2 = sum(psd[f0:f1])
-                
-                out[i] = pow1 / pow2
-                
+            out[:n_win] = moving_power_ratio(dat, s_freq, beg, end, freq1,
+                                             freq2, nfft)
             dat = out
         
         if 'moving_sd' == method:
-            for i, j in enumerate(arange(0, total_dur, step)[:-1]):
-                beg = max(0, int((j - halfdur) * s_freq))
-                end = min(last, int((j + halfdur) * s_freq))
-                win = dat[beg:end]
-                out[i] = std(win)
+            out[:n_win] = moving_sd(dat, beg, end)
             dat = out
         
         if 'moving_zscore' == method:        
             pcl_range = method_opt['pcl_range']
+            mask = None
             if pcl_range is not None:
                 lo = percentile(dat, pcl_range[0])
                 hi = percentile(dat, pcl_range[1])
+                mask = logical_and(dat > lo, dat < hi)
             
-            for i, j in enumerate(arange(0, total_dur, step)[:-1]):
-                beg = max(0, int((j - halfdur) * s_freq))
-                end = min(last, int((j + halfdur) * s_freq))
-                windat = stddat = dat[beg:end]
-                
-                if pcl_range is not None:
-                    stddat = windat[logical_and(windat > lo, windat < hi)]
-                out[i] = (dat[i] - mean(windat)) / std(stddat)
+            out[:n_win] = ((dat[:n_win] - moving_mean(dat, beg, end)) /
+                           moving_sd(dat, beg, end, mask=mask))
             dat = out
         
         if method in ['moving_rms', 'moving_ms']:
-            for i, j in enumerate(arange(0, total_dur, step)[:-1]):
-                beg = max(0, int((j - halfdur) * s_freq))
-                end = min(last, int((j + halfdur) * s_freq))
-                out[i] = mean(square(dat[beg:end]))   
+            out[:n_win] = moving_ms(dat, beg, end)
             if method == 'moving_rms':
                 out = sqrt(out)
             dat = out
@@ -1420,12 +1316,8 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
         dur = method_opt['dur']
         
         N = int(s_freq * dur)
-        nyquist = s_freq / 2
-        Fs1, Fs2 = Fp1 - rolloff, Fp2 + rolloff
-        dens = 20
         
-        bpass = remez(N, [0, Fs1, Fp1, Fp2, Fs2, nyquist], [0, 1, 0], 
-                      grid_density=dens, fs=s_freq)
+        bpass = _design_remez(N, Fp1, Fp2, rolloff, s_freq)
         dat = filtfilt(bpass, 1, dat)
 
     if 'smooth' == method:   
@@ -1454,9 +1346,7 @@ def transform_signal(dat, s_freq, method, method_opt=None, dat2=None):
         freq = method_opt['freq']
         N = method_opt['order']
 
-        nyquist = s_freq / 2
-        Wn = asarray(freq) / nyquist
-        sos = butter(N, Wn, btype='bandpass', output='sos')
+        sos = design_filter('butter', N, freq, s_freq, btype='bandpass')
         dat = sosfiltfilt(sos, dat)
         
     if 'spectrogram' == method:
@@ -2164,3 +2054,170 @@ def _realwavelets(s_freq, freqs, dur, width):
         wavelets[i, :] = y * g
 
     return wavelets
+
+
+@lru_cache(maxsize=FILTER_CACHE)
+def _design_remez(N, Fp1, Fp2, rolloff, s_freq):
+    """Design the FIR bandpass filter for 'remez' (designs are cached).
+
+    Parameters
+    ----------
+    N : int
+        number of taps
+    Fp1, Fp2 : float
+        low and high values of the pass band, in Hz
+    rolloff : float
+        bandwidth, in Hz, between stop and pass frequencies
+    s_freq : float
+        sampling frequency
+
+    Returns
+    -------
+    ndarray
+        filter taps (read-only)
+    """
+    nyquist = s_freq / 2
+    Fs1, Fs2 = Fp1 - rolloff, Fp2 + rolloff
+    dens = 20
+
+    bpass = remez(N, [0, Fs1, Fp1, Fp2, Fs2, nyquist], [0, 1, 0],
+                  grid_density=dens, fs=s_freq)
+    bpass.flags.writeable = False
+    return bpass
+
+
+def _detect_one_chan(dat_orig, s_freq, time, opts):
+    """Detect spindles on one channel, with the method in opts.method.
+
+    Parameters
+    ----------
+    dat_orig : ndarray (dtype='float')
+        vector with the data for one channel
+    s_freq : float
+        sampling frequency
+    time : ndarray (dtype='float')
+        vector with the time points for each sample
+    opts : instance of 'DetectSpindle'
+        detection options
+
+    Returns
+    -------
+    list of dict
+        list of detected spindles
+    dict
+        values used for detection
+    float
+        spindle density
+    """
+    if opts.method == 'Ferrarelli2007':
+        return detect_Ferrarelli2007(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Nir2011':
+        return detect_Nir2011(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Wamsley2012':
+        return detect_Wamsley2012(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'UCSD':
+        return detect_UCSD(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Moelle2011':
+        return detect_Moelle2011(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Martin2013':
+        return detect_Martin2013(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Ray2015':
+        return detect_Ray2015(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'Lacourse2018':
+        return detect_Lacourse2018(dat_orig, s_freq, time, opts)
+
+    elif opts.method == 'FASST':
+        return detect_FASST(dat_orig, s_freq, time, opts, submethod='abs')
+
+    elif opts.method == 'FASST2':
+        return detect_FASST(dat_orig, s_freq, time, opts, submethod='rms')
+
+    elif opts.method == 'Concordia':
+        return detect_Concordia(dat_orig, s_freq, time, opts)
+
+    else:
+        raise ValueError('Unknown method')
+
+
+def _detect_all_chan(detect_func, data, opts, n_jobs=1,
+                     events_name='events'):
+    """Run the detection on each channel, in parallel if n_jobs is not 1.
+
+    Parameters
+    ----------
+    detect_func : function
+        function (at the module level) which detects the events on one
+        channel, with arguments dat_orig, s_freq, time, opts
+    data : instance of Data
+        data used for detection (the trials are concatenated)
+    opts : instance of 'DetectSpindle' or 'DetectSlowWave'
+        detection options
+    n_jobs : int
+        number of processes (if None, all the CPUs). If 1, the channels are
+        computed one after the other in this process.
+    events_name : str
+        name of the events, for logging
+
+    Yields
+    ------
+    output of detect_func
+        for each channel, in the same order as the channels in data
+
+    Notes
+    -----
+    The trials are concatenated only once (if there is only one trial and
+    n_jobs is 1, the data are not copied at all). If n_jobs is not 1, the data
+    are copied to shared memory, so that each process reads the channels it
+    needs without receiving the data. The results are returned in the order
+    of the channels, so the output does not depend on the number of processes.
+    """
+    chan = list(data.axis['chan'][0])
+    time = hstack(data.axis['time'])
+    shape = (len(chan), len(time))
+
+    if n_jobs == 1 or len(chan) == 1:
+        if data.number_of('trial') == 1:
+            dat = data(trial=0, chan=chan, copy=False)
+        else:
+            dat = _concatenate_trials(data, chan, empty(shape,
+                                                        data.data[0].dtype))
+
+        for i_chan, one_chan in enumerate(chan):
+            lg.info('Detecting %s on channel %s', events_name, one_chan)
+            yield detect_func(dat[i_chan], data.s_freq, time, opts)
+        return
+
+    shared_dat = SharedArray(shape[0] * shape[1], data.data[0].dtype)
+    _concatenate_trials(data, chan, shared_dat.array(shape))
+
+    with shared_pool(n_jobs, detect_func=detect_func, dat=shared_dat,
+                     shape=shape, s_freq=data.s_freq, time=time, opts=opts,
+                     chan=chan, events_name=events_name) as p:
+        yield from p.imap(_detect_chan_shared, range(shape[0]))
+
+
+def _concatenate_trials(data, chan, dat):
+    """Copy the trials one after the other into dat (chan X time)."""
+    endsam = 0
+    for i in range(data.number_of('trial')):
+        x = data(trial=i, chan=chan, copy=False)
+        dat[:, endsam:endsam + x.shape[1]] = x
+        endsam += x.shape[1]
+    return dat
+
+
+def _detect_chan_shared(i_chan):
+    """Run the detection on one channel, reading the data in shared memory."""
+    shared = get_shared()
+    lg.info('Detecting %s on channel %s', shared['events_name'],
+            shared['chan'][i_chan])
+    dat = shared['dat'].array(shared['shape'])
+    return shared['detect_func'](dat[i_chan], shared['s_freq'],
+                                 shared['time'], shared['opts'])
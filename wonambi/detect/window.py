@@ -0,0 +1,190 @@
+"""Module to compute descriptive values over sliding windows, in O(n).
+
+The windows are the same as in transform_signal (one window every "step" s,
+centered on that time point, and truncated at the edges of the signal). Mean,
+mean square, standard deviation and covariance are computed from cumulative
+sums, so the cost does not depend on the duration of the window.
+"""
+from logging import getLogger
+
+from numpy import (arange, asarray, concatenate, cumsum, empty, flatnonzero,
+                   float64, maximum, mean, minimum, NaN, sqrt, unique, zeros)
+from numpy.lib.stride_tricks import as_strided
+from scipy.signal import periodogram
+
+lg = getLogger(__name__)
+
+POWER_RATIO_BATCH = 4096  # max number of windows in one call to periodogram
+
+
+def window_bounds(n_smp, s_freq, dur, step=None):
+    """Compute the first and last sample of each sliding window.
+
+    Parameters
+    ----------
+    n_smp : int
+        number of samples in the signal
+    s_freq : float
+        sampling frequency
+    dur : float
+        duration of each window (in s)
+    step : float, optional
+        distance between the centers of consecutive windows (in s). If None,
+        there is one window for each sample.
+
+    Returns
+    -------
+    ndarray of int
+        first sample of each window
+    ndarray of int
+        last sample of each window (not included)
+    int
+        number of values in the output (the output values after the last
+        window are zero)
+    """
+    halfdur = dur / 2
+    total_dur = n_smp / s_freq
+    last = n_smp - 1
+
+    if step:
+        len_out = int(n_smp / (step * s_freq))
+    else:
+        step = 1 / s_freq
+        len_out = n_smp
+
+    centers = arange(0, total_dur, step)[:-1][:len_out]
+    # astype(int) truncates toward zero, like int()
+    beg = maximum(0, ((centers - halfdur) * s_freq).astype(int))
+    end = minimum(last, ((centers + halfdur) * s_freq).astype(int))
+
+    return beg, end, len_out
+
+
+def moving_mean(x, beg, end):
+    """Mean of x in each window."""
+    x = asarray(x, dtype=float64)
+    avg = mean(x)
+    return avg + _window_sum(x - avg, beg, end) / (end - beg)
+
+
+def moving_ms(x, beg, end):
+    """Mean square of x in each window."""
+    x = asarray(x, dtype=float64)
+    return maximum(_window_sum(x * x, beg, end) / (end - beg), 0)
+
+
+def moving_covar(x, y, beg, end):
+    """Covariance between x and y in each window (normalized by N).
+
+    Notes
+    -----
+    The mean of the whole signal is subtracted first, so that the difference
+    between the mean of products and the product of means does not lose
+    precision.
+    """
+    x = asarray(x, dtype=float64)
+    y = asarray(y, dtype=float64)
+    x = x - mean(x)
+    y = y - mean(y)
+    n = end - beg
+    return (_window_sum(x * y, beg, end) / n -
+            _window_sum(x, beg, end) / n * _window_sum(y, beg, end) / n)
+
+
+def moving_sd(x, beg, end, mask=None):
+    """Standard deviation of x in each window (normalized by N).
+
+    Parameters
+    ----------
+    x : ndarray
+        vector with the signal
+    beg : ndarray of int
+        first sample of each window
+    end : ndarray of int
+        last sample of each window (not included)
+    mask : ndarray of bool, optional
+        if specified, only the samples where mask is True are used
+
+    Returns
+    -------
+    ndarray
+        standard deviation in each window
+    """
+    x = asarray(x, dtype=float64)
+    if mask is None:
+        x = x - mean(x)
+        n = end - beg
+    else:
+        x = (x - mean(x[mask])) * mask
+        n = _window_sum(mask.astype(float64), beg, end)
+
+    avg = _window_sum(x, beg, end) / n
+    return sqrt(maximum(_window_sum(x * x, beg, end) / n - avg * avg, 0))
+
+
+def moving_power_ratio(x, s_freq, beg, end, freq_narrow, freq_broad, nfft):
+    """Ratio of the power in two frequency bands in each window.
+
+    Parameters
+    ----------
+    x : ndarray
+        vector with the signal
+    s_freq : float
+        sampling frequency
+    beg : ndarray of int
+        first sample of each window
+    end : ndarray of int
+        last sample of each window (not included)
+    freq_narrow : tuple of float
+        frequency band at the numerator
+    freq_broad : tuple of float
+        frequency band at the denominator
+    nfft : int
+        length of the FFT
+
+    Returns
+    -------
+    ndarray
+        power ratio in each window
+
+    Notes
+    -----
+    Windows with the same length are read as rows of a strided view of x and
+    their periodogram (hann taper, constant detrending) is computed at once, in
+    batches of POWER_RATIO_BATCH windows.
+    """
+    x = asarray(x, dtype=float64)
+    out = empty(len(beg))
+    out.fill(NaN)
+    n_smp = end - beg
+
+    for n in unique(n_smp):
+        if n <= 0:
+            continue
+        idx = flatnonzero(n_smp == n)
+        windows = as_strided(x, shape=(len(x) - n + 1, n),
+                             strides=(x.strides[0], x.strides[0]),
+                             writeable=False)
+
+        for i0 in range(0, len(idx), POWER_RATIO_BATCH):
+            one_idx = idx[i0:i0 + POWER_RATIO_BATCH]
+            sf, psd = periodogram(windows[beg[one_idx]], s_freq, 'hann',
+                                  nfft=nfft, detrend='constant', axis=-1)
+            out[one_idx] = (_band_sum(sf, psd, freq_narrow) /
+                            _band_sum(sf, psd, freq_broad))
+
+    return out
+
+
+def _band_sum(sf, psd, freq):
+    """Sum the PSD between the frequencies closest to the limits of the band
+    (the last frequency is not included)."""
+    f0 = abs(sf - freq[0]).argmin()
+    f1 = abs(sf - freq[1]).argmin()
+    return psd[:, f0:f1].sum(axis=1)
+
+
+def _window_sum(x, beg, end):
+    """Sum of x in each window, from the cumulative sum."""
+    cs = concatenate((zeros(1), cumsum(x, dtype=float64)))
+    return cs[end] - cs[beg]
@@ -2,11 +2,11 @@
 Adapted from axonrawio.py in python-neo. Strongly simplified.
 """
 from datetime import datetime, timedelta
-from numpy import c_, empty, float64, NaN, memmap, dtype, newaxis, array
+from numpy import float64, dtype, newaxis, array
 from os import SEEK_SET
 from struct import unpack, calcsize
 
-from .utils import DEFAULT_DATETIME
+from .utils import DEFAULT_DATETIME, read_memmap
 
 BLOCKSIZE = 512
 
@@ -91,7 +91,7 @@ class Abf:
 
         return subj_id, start_time, s_freq, chan_name, self.n_samples, orig
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype=float64):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -102,6 +102,8 @@ class Abf:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -114,23 +116,14 @@ class Abf:
         When asking for an interval outside the data boundaries, it returns NaN
         for those values.
         """
-        data = memmap(self.filename, dtype=self.dtype, mode='r', order='F',
-                      shape=(self.n_chan, self.n_samples), offset=self.head)
-
-        dat = data[chan, max((begsam, 0)):min((endsam, self.n_samples))].astype(float64)
-        dat = (dat + self.offset[chan, :]) * self.gain[chan, :]
-
-        if begsam < 0:
-
-            pad = empty((dat.shape[0], 0 - begsam))
-            pad.fill(NaN)
-            dat = c_[pad, dat]
-
-        if endsam >= self.n_samples:
-
-            pad = empty((dat.shape[0], endsam - self.n_samples))
-            pad.fill(NaN)
-            dat = c_[dat, pad]
+        if isinstance(chan, int):
+            chan = [chan, ]
+
+        dat = read_memmap(self.filename, chan, begsam, endsam,
+                          (self.n_chan, self.n_samples), self.dtype,
+                          offset=self.head, order='F', dtype_out=dtype)
+        dat += self.offset[chan, :]
+        dat *= self.gain[chan, :]
 
         return dat
 
@@ -4,14 +4,11 @@ from textwrap import dedent
 from numpy import (dtype,
                    memmap,
                    array,
-                   c_,
-                   empty,
-                   NaN,
                    float64,
                    )
 import wonambi
 
-from .utils import DEFAULT_DATETIME
+from .utils import DEFAULT_DATETIME, read_memmap
 
 
 BV_ORIENTATION = {
@@ -94,7 +91,7 @@ class BrainVision:
 
         return subj_id, start_time, self.s_freq, chan_name, n_samples, orig
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype=float64):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -105,16 +102,22 @@ class BrainVision:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
         numpy.ndarray
             A 2d matrix, with dimension chan X samples
         """
-        dat = _read_memmap(self.eeg_file, self.dshape, begsam, endsam,
-                           self.data_type, self.data_order)
+        if isinstance(chan, int):
+            chan = [chan, ]
 
-        return dat[chan, :] * self.gain[chan, None]
+        dat = read_memmap(self.eeg_file, chan, begsam, endsam, self.dshape,
+                          self.data_type, order=self.data_order,
+                          dtype_out=dtype)
+        dat *= self.gain[chan, None]
+        return dat
 
     def return_markers(self):
         """Return all the markers (also called triggers or events).
@@ -192,30 +195,6 @@ def _parse_ini(brainvision_file):
     return ini
 
 
-def _read_memmap(filename, dat_shape, begsam, endsam, datatype='double',
-                 data_order='F'):
-
-    n_samples = dat_shape[1]
-
-    data = memmap(str(filename), dtype=datatype, mode='c',
-                  shape=dat_shape, order=data_order)
-    dat = data[:, max((begsam, 0)):min((endsam, n_samples))].astype(float64)
-
-    if begsam < 0:
-
-        pad = empty((dat.shape[0], 0 - begsam))
-        pad.fill(NaN)
-        dat = c_[pad, dat]
-
-    if endsam >= n_samples:
-
-        pad = empty((dat.shape[0], endsam - n_samples))
-        pad.fill(NaN)
-        dat = c_[dat, pad]
-
-    return dat
-
-
 def _read_datetime(mrk):
     for v in mrk['Marker Infos'].values():
         if v[0] == 'New Segment':
@@ -0,0 +1,252 @@
+"""Module to keep the decoded data of slow formats on disk.
+
+Some formats (KTLX, Text) need to decode every sample when reading the data.
+The decoded data are stored in a cache directory in chunks of fixed size, so
+that the following reads are simple memory-mapped slices.
+"""
+from hashlib import sha1
+from logging import getLogger
+from os import replace, utime
+from pathlib import Path
+from tempfile import mkstemp
+
+from numpy import dtype, empty, memmap, NaN
+
+lg = getLogger(__name__)
+
+CACHE_DTYPE = 'float32'
+CHUNK_SIZE = 65536  # in samples
+CACHE_SIZE = 2 * 1024 ** 3  # in bytes
+
+
+class CachedReader:
+    """Read the data in chunks, and keep the decoded chunks on disk.
+
+    Parameters
+    ----------
+    reader : instance of one of the classes in wonambi.ioeeg
+        class used to read the data (already initialized, after return_hdr)
+    n_chan : int
+        number of channels in the dataset
+    n_samples : int
+        number of samples in the dataset
+    cache_dir : str or Path
+        directory where to store the decoded chunks
+    cache_size : int
+        maximum size of the cache directory (in bytes). The least recently used
+        chunks are deleted when the cache is larger than this size.
+
+    Attributes
+    ----------
+    chunk_dir : Path
+        directory containing the chunks of this dataset. Its name depends on
+        the path, size and modification time of the files of the dataset, so
+        the chunks are not used anymore if the dataset changes.
+    total_size : int
+        size of the cache directory (in bytes), as known by this reader (None
+        if the cache directory was not listed yet)
+
+    Notes
+    -----
+    All the other attributes and methods (f.e. return_markers) are those of
+    the reader.
+
+    Data are stored in single precision (float32), so data read from the cache
+    might differ from the data read directly from the files at that precision.
+    """
+    def __init__(self, reader, n_chan, n_samples, cache_dir,
+                 cache_size=CACHE_SIZE):
+        self.reader = reader
+        self.n_chan = n_chan
+        self.n_samples = n_samples
+        self.cache_dir = Path(cache_dir)
+        self.cache_size = cache_size
+        self.chunk_dir = self.cache_dir / _cache_key(reader, n_chan, n_samples)
+        self.total_size = None
+
+    def __getattr__(self, name):
+        if name == 'reader':
+            raise AttributeError(name)
+        return getattr(self.reader, name)
+
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
+        """Read the data from the cache (and fill up the cache if necessary).
+
+        Parameters
+        ----------
+        chan : list of int
+            index (indices) of the channels to read
+        begsam : int
+            index of the first sample
+        endsam : int
+            index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
+
+        Returns
+        -------
+        numpy.ndarray
+            A 2d matrix, with dimension chan X samples.
+        """
+        dat = empty((len(chan), endsam - begsam), dtype=dtype)
+        dat.fill(NaN)
+
+        begpos = max(begsam, 0)
+        endpos = min(endsam, self.n_samples)
+        if begpos >= endpos:
+            return dat
+
+        for i_chunk in range(begpos // CHUNK_SIZE,
+                             (endpos - 1) // CHUNK_SIZE + 1):
+            chunk_beg = i_chunk * CHUNK_SIZE
+            x = self._read_chunk(i_chunk)
+
+            beg = max(begpos, chunk_beg)
+            end = min(endpos, chunk_beg + x.shape[1])
+            dat[:, beg - begsam:end - begsam] = x[chan,
+                                                  beg - chunk_beg:
+                                                  end - chunk_beg]
+
+        return dat
+
+    def return_dat_many(self, chan, begsam, endsam, dtype='float64'):
+        """Read the data from the cache, for multiple intervals.
+
+        Parameters
+        ----------
+        chan : list of int
+            index (indices) of the channels to read
+        begsam : list of int
+            index of the first sample of each interval
+        endsam : list of int
+            index of the last sample of each interval
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
+
+        Returns
+        -------
+        list of numpy.ndarray
+            for each interval, a 2d matrix with dimension chan X samples.
+
+        Notes
+        -----
+        This method should be defined here, otherwise the method of the reader
+        would be used, and the data would not be read from the cache.
+        """
+        return [self.return_dat(chan, one_begsam, one_endsam, dtype)
+                for one_begsam, one_endsam in zip(begsam, endsam)]
+
+    def _read_chunk(self, i_chunk):
+        """Read one chunk from the cache, or decode it with the reader.
+
+        Parameters
+        ----------
+        i_chunk : int
+            index of the chunk
+
+        Returns
+        -------
+        numpy.ndarray
+            A 2d matrix, with dimension all channels X samples in the chunk.
+        """
+        chunk_file = self.chunk_dir / f'{i_chunk:06d}.dat'
+
+        try:
+            utime(chunk_file)  # mark as recently used
+            n_smp = (chunk_file.stat().st_size //
+                     (dtype(CACHE_DTYPE).itemsize * self.n_chan))
+            return memmap(str(chunk_file), CACHE_DTYPE, mode='r',
+                          shape=(self.n_chan, n_smp))
+        except FileNotFoundError:  # not in the cache (or just removed)
+            pass
+
+        chunk_beg = i_chunk * CHUNK_SIZE
+        chunk_end = min(chunk_beg + CHUNK_SIZE, self.n_samples)
+        lg.debug(f'Decoding chunk {i_chunk} ({chunk_beg}-{chunk_end})')
+        x = self.reader.return_dat(list(range(self.n_chan)), chunk_beg,
+                                   chunk_end).astype(CACHE_DTYPE)
+
+        self.chunk_dir.mkdir(parents=True, exist_ok=True)
+        # unique name, if another thread or process writes the same chunk
+        fd, tmp_file = mkstemp(suffix='.tmp', dir=str(self.chunk_dir))
+        with open(fd, 'wb') as f:
+            x.tofile(f)
+        replace(tmp_file, str(chunk_file))
+        self._limit_size(x.nbytes)
+
+        return x
+
+    def _limit_size(self, new_size):
+        """Delete the least recently used chunks until the cache is smaller
+        than cache_size.
+
+        Parameters
+        ----------
+        new_size : int
+            size of the chunk which was just written (in bytes)
+
+        Notes
+        -----
+        The size of the cache directory is computed only once, and then it is
+        updated after each write. The chunks on disk are listed again only when
+        the cache might be larger than cache_size.
+        """
+        if self.total_size is not None:
+            self.total_size += new_size
+            if self.total_size <= self.cache_size:
+                return
+
+        chunks = []
+        for chunk_file in self.cache_dir.glob('*/*.dat'):
+            try:
+                st = chunk_file.stat()
+            except FileNotFoundError:  # deleted by another process
+                continue
+            chunks.append((st.st_mtime, st.st_size, chunk_file))
+
+        total = sum(x[1] for x in chunks)
+        for _, size, chunk_file in sorted(chunks):
+            if total <= self.cache_size:
+                break
+            lg.debug(f'Removing {chunk_file} from cache')
+            try:
+                chunk_file.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self.total_size = total
+
+
+def _cache_key(reader, n_chan, n_samples):
+    """Name of the directory with the chunks of one dataset.
+
+    Parameters
+    ----------
+    reader : instance of one of the classes in wonambi.ioeeg
+        class used to read the data
+    n_chan : int
+        number of channels in the dataset
+    n_samples : int
+        number of samples in the dataset
+
+    Returns
+    -------
+    str
+        hash of the path, size and modification time of the files in the
+        dataset (and of the format of the chunks).
+    """
+    filename = Path(reader.filename).resolve()
+    if filename.is_dir():
+        all_files = sorted(x for x in filename.iterdir() if x.is_file())
+    else:
+        all_files = [filename, ]
+
+    key = [type(reader).__name__, str(filename),
+           str(getattr(reader, 'session', '')), str(n_chan), str(n_samples),
+           CACHE_DTYPE, str(CHUNK_SIZE)]
+    for one_file in all_files:
+        st = one_file.stat()
+        key.extend([one_file.name, str(st.st_size), str(st.st_mtime_ns)])
+
+    return sha1('\n'.join(key).encode()).hexdigest()[:16]
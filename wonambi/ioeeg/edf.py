@@ -10,18 +10,18 @@ from fractions import Fraction
 
 from numpy import (abs,
                    asarray,
+                   dtype,
                    empty,
-                   fromfile,
                    iinfo,
+                   memmap,
                    ones,
                    max,
                    NaN,
-                   newaxis,
                    repeat,
                    )
 from scipy.signal import resample_poly
 
-from .utils import decode, _select_blocks, DEFAULT_DATETIME
+from .utils import decode, DEFAULT_DATETIME
 
 lg = getLogger(__name__)
 
@@ -176,10 +176,11 @@ class Edf:
 
         return subj_id, start_time, s_freq, chan_name, n_samples, self.hdr
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
         """Read data from an EDF file.
 
-        Reads channel by channel, and adjusts the values by calibration.
+        Maps the data records to memory, reads only the records and channels
+        of interest, and adjusts the values by calibration.
 
         Parameters
         ----------
@@ -189,6 +190,8 @@ class Edf:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -196,59 +199,102 @@ class Edf:
             A 2d matrix, where the first dimension is the channels and the
             second dimension are the samples.
         """
+        return self._read_dat(self._memmap_records(), chan, begsam, endsam,
+                              dtype)
+
+    def return_dat_many(self, chan, begsam, endsam, dtype='float64'):
+        """Read data from an EDF file, for multiple intervals.
+
+        The data records are mapped to memory only once for all the intervals.
+
+        Parameters
+        ----------
+        chan : list of int
+            index (indices) of the channels to read
+        begsam : list of int
+            index of the first sample of each interval
+        endsam : list of int
+            index of the last sample of each interval
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
+
+        Returns
+        -------
+        list of numpy.ndarray
+            for each interval, a 2d matrix, where the first dimension is the
+            channels and the second dimension are the samples.
+        """
+        records = self._memmap_records()
+        return [self._read_dat(records, chan, one_begsam, one_endsam, dtype)
+                for one_begsam, one_endsam in zip(begsam, endsam)]
+
+    def _read_dat(self, records, chan, begsam, endsam, dtype='float64'):
+        """Read and calibrate the data from the data records."""
         assert begsam < endsam
 
-        dat = empty((len(chan), endsam - begsam))
+        dat = empty((len(chan), endsam - begsam), dtype=dtype)
         dat.fill(NaN)
 
-        with self.filename.open('rb') as f:
+        n_samples = self.max_smp * self.hdr['n_records']
+        begpos = max((begsam, 0))
+        endpos = min((endsam, n_samples))
 
-            for i_dat, blk, i_blk in _select_blocks(self.blocks, begsam, endsam):
-                dat_in_rec = self._read_record(f, blk, chan)
-                dat[:, i_dat[0]:i_dat[1]] = dat_in_rec[:, i_blk[0]:i_blk[1]]
+        if begpos < endpos:
+            begrec = begpos // self.max_smp
+            endrec = (endpos - 1) // self.max_smp + 1
+            offset = begrec * self.max_smp
 
-        # calibration
-        dat = ((dat.astype('float64') - self.dig_min[chan, newaxis]) *
-               self.gain[chan, newaxis] + self.phys_min[chan, newaxis])
+            for i_dat, i_ch in enumerate(chan):
+                x = self._upsample(records[_field(i_ch)][begrec:endrec])
+                x = x.reshape(-1)[begpos - offset:endpos - offset]
 
-        return dat
+                # calibration (in double precision, one channel at the time)
+                dat[i_dat, begpos - begsam:endpos - begsam] = (
+                    (x - self.dig_min[i_ch]) * self.gain[i_ch] +
+                    self.phys_min[i_ch])
 
-    def _read_record(self, f, blk, chans):
-        """Read raw data from a single EDF channel.
+        return dat
 
-        Parameters
-        ----------
-        i_chan : int
-            index of the channel to read
-        begsam : int
-            index of the first sample
-        endsam : int
-            index of the last sample
+    def _memmap_records(self):
+        """Map the data records to memory as a structured array.
 
         Returns
         -------
-        numpy.ndarray
-            A vector with the data as written on file, in 16-bit precision
+        numpy.memmap
+            vector with one element per data record, where each field contains
+            the samples of one signal in that record (as written on file).
         """
-        dat_in_rec = empty((len(chans), self.max_smp))
+        rec_dtype = dtype([(_field(i_ch), '<i2', (n_smp, ))
+                           for i_ch, n_smp in
+                           enumerate(self.hdr['n_samples_per_record'])])
 
-        i_ch_in_dat = 0
-        for i_ch in chans:
-            offset, n_smp_per_chan = self._offset(blk, i_ch)
+        return memmap(str(self.filename), dtype=rec_dtype, mode='r',
+                      offset=self.hdr['header_n_bytes'],
+                      shape=(self.hdr['n_records'], ))
 
-            f.seek(offset)
-            x = fromfile(f, count=n_smp_per_chan, dtype=EDF_FORMAT)
+    def _upsample(self, x):
+        """Upsample the samples of one signal to the highest sampling frequency.
 
-            ratio = self.max_smp / n_smp_per_chan            
-            if ratio.is_integer():
-                dat_in_rec[i_ch_in_dat, :] = repeat(x, int(ratio))                
-            else:
-                fract = round(Fraction(ratio), 2)
-                up, down = fract.numerator, fract.denominator
-                dat_in_rec[i_ch_in_dat, :] = resample_poly(x, up, down)
-            i_ch_in_dat += 1                
+        Parameters
+        ----------
+        x : numpy.ndarray
+            2d matrix (records X samples in record) with the data as written
+            on file, in 16-bit precision
 
-        return dat_in_rec
+        Returns
+        -------
+        numpy.ndarray
+            2d matrix (records X max samples in record)
+        """
+        ratio = self.max_smp / x.shape[1]
+        if ratio == 1:
+            return x
+        elif ratio.is_integer():
+            return repeat(x, int(ratio), axis=1)
+        else:
+            fract = round(Fraction(ratio), 2)
+            up, down = fract.numerator, fract.denominator
+            return resample_poly(x, up, down, axis=1)
 
     def _offset(self, blk, i_ch):
         ch_in_rec = sum(self.hdr['n_samples_per_record'][:i_ch])
@@ -377,6 +423,11 @@ def write_edf(data, filename, subj_id='X X X X', physical_max=1000,
             f.write(pack('<' + 'h' * length_record, *x))
 
 
+def _field(i_ch):
+    """Name of the field containing one signal in the structured record."""
+    return 's' + str(i_ch)
+
+
 def _read_tal(rawbytes):
     """Read TAL (Time-stamped Annotations Lists) using regex
 
@@ -1,10 +1,12 @@
 from datetime import datetime
-from numpy import c_, NaN, empty, memmap, float64
+from numpy import NaN, empty, memmap, float64
 from pathlib import Path
 from scipy.io import loadmat
 
 from .utils import (read_hdf5_str,
                     read_hdf5_chan_name,
+                    read_mat5_memmap,
+                    read_mat5_value,
                     DEFAULT_DATETIME,
                     )
 from ..utils import MissingDependency
@@ -33,18 +35,40 @@ class EEGLAB:
             number of samples in the dataset
         orig : dict
             additional information taken directly from the header
+
+        Notes
+        -----
+        The data are not loaded into memory, if possible: they are
+        memory-mapped (from the .fdt file, or from the .set file if it was
+        saved without compression) or, for hdf5 files, read from the file
+        (which is kept open until close() is called) when necessary.
+
+        For MAT-files saved without compression, only the header is read (see
+        read_mat5_value), otherwise the file is loaded into memory once.
         """
         self.fdtfile = None
+        self.h5_file = None
+        self.EEG = None
 
         try:
-            self.EEG = loadmat(str(self.filename), struct_as_record=False,
-                               squeeze_me=True)['EEG']
+            hdr = _read_mat5_hdr(self.filename)
+            if hdr is None:
+                self.EEG = loadmat(str(self.filename), struct_as_record=False,
+                                   squeeze_me=True)['EEG']
             self.hdf5 = False
 
         except NotImplementedError:
             self.hdf5 = True
 
-        if not self.hdf5:
+        if not self.hdf5 and hdr is not None:
+            (self.s_freq, chan_name, n_samples, subj_id, start_time,
+             datfile) = hdr
+            if datfile:
+                self.fdtfile = datfile
+            else:
+                self.data = read_mat5_memmap(self.filename, ['EEG', 'data'])
+
+        elif not self.hdf5:
             self.s_freq = self.EEG.srate
             chan_name = [chan.labels for chan in self.EEG.chanlocs]
             n_samples = self.EEG.pnts
@@ -61,27 +85,30 @@ class EEGLAB:
             if isinstance(self.EEG.datfile, str):
                 self.fdtfile = self.EEG.datfile
             else:
-                self.data = self.EEG.data
+                self.data = read_mat5_memmap(self.filename, ['EEG', 'data'])
+                if self.data is None:
+                    self.data = self.EEG.data
+                self.EEG.data = None  # keep only one copy
 
         else:
 
-            with File(self.filename) as f:
-                EEG = f['EEG']
-                self.s_freq = EEG['srate'].value.item()
-                chan_name = read_hdf5_chan_name(f, EEG['chanlocs']['labels'])
-                n_samples = int(EEG['pnts'].value.item())
-
-                subj_id = read_hdf5_str(EEG['subject'])
-                try:
-                    start_time = datetime(*EEG['etc']['T0'])
-                except ValueError:
-                    start_time = DEFAULT_DATETIME
-
-                datfile = read_hdf5_str(EEG['datfile'])
-                if datfile == '':
-                    self.data = EEG['data'].value.T  # for some reason, you need to transpose this
-                else:
-                    self.fdtfile = datfile
+            f = self.h5_file = File(self.filename, 'r')
+            EEG = f['EEG']
+            self.s_freq = EEG['srate'][()].item()
+            chan_name = read_hdf5_chan_name(f, EEG['chanlocs']['labels'])
+            n_samples = int(EEG['pnts'][()].item())
+
+            subj_id = read_hdf5_str(EEG['subject'])
+            try:
+                start_time = datetime(*EEG['etc']['T0'])
+            except ValueError:
+                start_time = DEFAULT_DATETIME
+
+            datfile = read_hdf5_str(EEG['datfile'])
+            if datfile == '':
+                self.data = EEG['data']  # samples X chan, read when necessary
+            else:
+                self.fdtfile = datfile
 
         if self.fdtfile is not None:
             memshape = (len(chan_name), int(n_samples))
@@ -97,39 +124,56 @@ class EEGLAB:
 
         return subj_id, start_time, self.s_freq, chan_name, n_samples, {}
 
-    def return_dat(self, chan, begsam, endsam):
-        n_samples = self.data.shape[1]
-
-        dat = self.data[:, max((begsam, 0)):min((endsam, n_samples))].astype(float64)
+    def return_dat(self, chan, begsam, endsam, dtype=float64):
+        if isinstance(chan, int):
+            chan = [chan, ]
 
-        if begsam < 0:
+        dat = empty((len(chan), endsam - begsam), dtype=dtype)
+        dat.fill(NaN)
 
-            pad = empty((dat.shape[0], 0 - begsam))
-            pad.fill(NaN)
-            dat = c_[pad, dat]
+        transposed = self.hdf5 and self.fdtfile is None
+        n_samples = self.data.shape[0 if transposed else 1]
 
-        if endsam >= n_samples:
+        begpos = max(begsam, 0)
+        endpos = min(endsam, n_samples)
+        if begpos >= endpos:
+            return dat
 
-            pad = empty((dat.shape[0], endsam - n_samples))
-            pad.fill(NaN)
-            dat = c_[dat, pad]
+        if transposed:  # for some reason, you need to transpose this
+            x = self.data[begpos:endpos, :][:, chan].T
+        else:
+            x = self.data[chan, begpos:endpos]
 
-        return dat[chan, :]
+        dat[:, begpos - begsam:endpos - begsam] = x
+        return dat
 
     def return_markers(self):
         markers = []
 
         if self.hdf5:
-            from h5py import File
-            with File(self.filename) as f:
-                for evt, latency in zip(f['EEG']['event']['type'], f['EEG']['event']['latency']):
-                    mrk_t = (f[latency[0]][0, 0] - 1) / self.s_freq
-
-                    markers.append({
-                        'name': str(f[evt[0]][0, 0]),
-                        'start': mrk_t,
-                        'end': mrk_t,
-                        })
+            f = self.h5_file
+            for evt, latency in zip(f['EEG']['event']['type'], f['EEG']['event']['latency']):
+                mrk_t = (f[latency[0]][0, 0] - 1) / self.s_freq
+
+                markers.append({
+                    'name': str(f[evt[0]][0, 0]),
+                    'start': mrk_t,
+                    'end': mrk_t,
+                    })
+
+        elif self.EEG is None:
+            events = read_mat5_value(self.filename, ['EEG', 'event'])
+            if not isinstance(events, list):  # no events
+                events = []
+
+            for event in events:
+                mrk_t = (_mat5_item(event['latency']) - 1) / self.s_freq
+                markers.append({
+                    'name': str(_mat5_item(event['type'])),
+                    'start': mrk_t,
+                    'end': mrk_t,
+                })
+
         else:
 
             for event in self.EEG.event:
@@ -140,3 +184,60 @@ class EEGLAB:
                 })
 
         return markers
+
+    def close(self):
+        """Close the hdf5 file, if it was kept open."""
+        if getattr(self, 'h5_file', None) is not None:
+            self.h5_file.close()
+            self.h5_file = None
+
+    def __del__(self):
+        self.close()
+
+
+def _read_mat5_hdr(filename):
+    """Read the header of an EEGLAB file without loading the file.
+
+    Returns
+    -------
+    tuple or None
+        sampling frequency, channel names, number of samples, subject code,
+        start time and name of the .fdt file ('' if the data are in the .set
+        file), or None if the header cannot be read in this way (f.e. if the
+        file is compressed).
+    """
+    s_freq = read_mat5_value(filename, ['EEG', 'srate'])
+    n_samples = read_mat5_value(filename, ['EEG', 'pnts'])
+    chanlocs = read_mat5_value(filename, ['EEG', 'chanlocs'])
+    if (getattr(s_freq, 'size', 0) != 1 or getattr(n_samples, 'size', 0) != 1
+            or not isinstance(chanlocs, list)):
+        return None
+    chan_name = [chan.get('labels') for chan in chanlocs]
+    if not all(isinstance(x, str) for x in chan_name):
+        return None
+
+    datfile = read_mat5_value(filename, ['EEG', 'datfile'])
+    if not isinstance(datfile, str):
+        datfile = ''
+    if datfile == '' and read_mat5_memmap(filename, ['EEG', 'data']) is None:
+        return None
+
+    subj_id = read_mat5_value(filename, ['EEG', 'subject'])
+    if not isinstance(subj_id, str):
+        subj_id = ''
+
+    T0 = read_mat5_value(filename, ['EEG', 'etc', 'T0'])
+    try:
+        start_time = datetime(*(int(x) for x in T0.flat))
+    except (AttributeError, TypeError, ValueError):
+        start_time = DEFAULT_DATETIME
+
+    return (s_freq.item(), chan_name, int(n_samples.item()), subj_id,
+            start_time, datfile)
+
+
+def _mat5_item(value):
+    """Convert a value read from a MAT-file (v5) to a scalar, if possible."""
+    if getattr(value, 'size', 0) == 1:
+        return value.item()
+    return value
@@ -1,9 +1,9 @@
 from datetime import datetime
 from logging import getLogger
-from numpy import around, empty
+from numpy import around, empty, NaN
 from scipy.io import loadmat, savemat
 
-from .utils import read_hdf5_chan_name
+from .utils import read_hdf5_chan_name, read_mat5_memmap, read_mat5_value
 from ..utils import MissingDependency
 
 try:
@@ -14,6 +14,7 @@ except ImportError as err:
 
 lg = getLogger(__name__)
 VAR = 'data'
+TRL = 0  # only the first trial is read
 
 
 class FieldTrip:
@@ -24,9 +25,20 @@ class FieldTrip:
     filename : path to file
         the name of the filename or directory
 
+    Attributes
+    ----------
+    data : numpy.ndarray or h5py.Dataset
+        data of the first trial (chan X samples), memory-mapped if possible.
+        For hdf5 files, it's the dataset in the file (samples X chan), which
+        is read only when necessary.
+    h5_file : h5py.File
+        the hdf5 file, which is kept open until close() is called (None for
+        other files)
     """
     def __init__(self, filename):
         self.filename = filename
+        self.data = None
+        self.h5_file = None
 
     def return_hdr(self):
         """Return the header for further use.
@@ -52,6 +64,10 @@ class FieldTrip:
         'data'
 
         h5py is necessary for this function
+
+        If the file was saved without compression, only the header is read and
+        the data are memory-mapped (see read_mat5_value and read_mat5_memmap),
+        otherwise the file is loaded into memory once.
         """
         # fieldtrip does not have this information
         orig = dict()
@@ -59,33 +75,42 @@ class FieldTrip:
         start_time = datetime.fromordinal(1)  # fake
 
         try:
-            ft_data = loadmat(self.filename, struct_as_record=True,
-                              squeeze_me=True)
-            if VAR not in ft_data:
-                raise KeyError('Save the FieldTrip variable as ''{}'''
-                               ''.format(VAR))
-            ft_data = ft_data[VAR]
+            s_freq, chan_name = _read_mat5_hdr(self.filename)
+            self.data = read_mat5_memmap(self.filename, [VAR, 'trial', TRL])
+
+            if s_freq is None or self.data is None:
+                ft_data = loadmat(self.filename, struct_as_record=True,
+                                  squeeze_me=True)
+                if VAR not in ft_data:
+                    raise KeyError('Save the FieldTrip variable as ''{}'''
+                                   ''.format(VAR))
+                ft_data = ft_data[VAR]
 
-            s_freq = ft_data['fsample'].astype('float64').item()
-            n_samples = ft_data['trial'].item().shape[1]
-            chan_name = list(ft_data['label'].item())
+                s_freq = ft_data['fsample'].astype('float64').item()
+                chan_name = list(ft_data['label'].item())
+                if self.data is None:
+                    self.data = ft_data['trial'].item(TRL)
 
-        except NotImplementedError:
+            n_samples = self.data.shape[1]
 
-            with File(self.filename) as f:
+        except NotImplementedError:
 
-                if VAR not in f.keys():
-                    raise KeyError('Save the FieldTrip variable as ''{}'''
-                                   ''.format(VAR))
+            f = File(self.filename, 'r')
+            if VAR not in f.keys():
+                f.close()
+                raise KeyError('Save the FieldTrip variable as ''{}'''
+                               ''.format(VAR))
 
-                s_freq = int(f[VAR]['fsample'].value.squeeze())
-                chan_name = read_hdf5_chan_name(f, f[VAR]['label'])
+            s_freq = int(f[VAR]['fsample'][()].squeeze())
+            chan_name = read_hdf5_chan_name(f, f[VAR]['label'])
 
-                n_samples = int(around(f[f[VAR]['trial'][0].item()].shape[0]))
+            self.h5_file = f
+            self.data = f[f[VAR]['trial'][TRL].item()]
+            n_samples = int(around(self.data.shape[0]))
 
         return subj_id, start_time, s_freq, chan_name, n_samples, orig
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -96,6 +121,8 @@ class FieldTrip:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -103,21 +130,29 @@ class FieldTrip:
             A 2d matrix, with dimension chan X samples
 
         """
-        TRL = 0
-        try:
-            ft_data = loadmat(self.filename, struct_as_record=True,
-                              squeeze_me=True)
-            ft_data = ft_data[VAR]
+        if isinstance(chan, int):
+            chan = [chan, ]
 
-            data = ft_data['trial'].item(TRL)
+        dat = empty((len(chan), endsam - begsam), dtype=dtype)
+        dat.fill(NaN)
 
-        except NotImplementedError:
-            from h5py import File
+        if self.h5_file is None:
+            n_samples = self.data.shape[1]
+        else:
+            n_samples = self.data.shape[0]
 
-            with File(self.filename) as f:
-                data = f[f[VAR]['trial'][TRL].item()].value.T
+        begpos = max(begsam, 0)
+        endpos = min(endsam, n_samples)
+        if begpos >= endpos:
+            return dat
 
-        return data[chan, begsam:endsam]
+        if self.h5_file is None:
+            x = self.data[chan, begpos:endpos]
+        else:  # hdf5 is transposed, and all the channels are next to each other
+            x = self.data[begpos:endpos, :][:, chan].T
+
+        dat[:, begpos - begsam:endpos - begsam] = x
+        return dat
 
     def return_markers(self):
         """Return all the markers (also called triggers or events).
@@ -135,6 +170,39 @@ class FieldTrip:
         """
         return []
 
+    def close(self):
+        """Close the hdf5 file, if it was kept open."""
+        if getattr(self, 'h5_file', None) is not None:
+            self.h5_file.close()
+            self.h5_file = None
+
+    def __del__(self):
+        self.close()
+
+
+def _read_mat5_hdr(filename):
+    """Read the sampling frequency and the channel labels without loading the
+    file.
+
+    Returns
+    -------
+    s_freq : float or None
+        sampling frequency (None if the header cannot be read in this way)
+    chan_name : list of str or None
+        list of all the channels
+    """
+    s_freq = read_mat5_value(filename, [VAR, 'fsample'])
+    chan_name = read_mat5_value(filename, [VAR, 'label'])
+
+    if isinstance(chan_name, str):  # only one channel
+        chan_name = [chan_name, ]
+    if (s_freq is None or getattr(s_freq, 'size', 0) != 1 or
+            chan_name is None or
+            not all(isinstance(x, str) for x in chan_name)):
+        return None, None
+
+    return float(s_freq.item()), chan_name
+
 
 def write_fieldtrip(data, filename):
     """Export data to FieldTrip.
@@ -17,29 +17,43 @@ _read_EXT where EXT is one of the extensions.
 """
 from binascii import hexlify
 from datetime import timedelta, datetime
+from functools import lru_cache
 from logging import getLogger
 from math import ceil
 from os.path import join
 from pathlib import Path
 from re import sub
 from struct import unpack
-from numpy import (array,
+from numpy import (arange,
                    asarray,
+                   bincount,
                    concatenate,
                    dtype,
                    empty,
                    expand_dims,
+                   frombuffer,
                    fromfile,
+                   full,
                    int32,
+                   int64,
+                   maximum,
+                   minimum,
                    NaN,
                    ones,
+                   repeat,
+                   searchsorted,
+                   uint8,
                    unpackbits,
                    where,
+                   zeros,
                    )
 
 lg = getLogger(__name__)
 
 BITS_IN_BYTE = 8
+# number of bits set to 1 in each byte
+POPCOUNT = unpackbits(arange(256, dtype=uint8)[:, None],
+                      axis=1).sum(axis=1).astype(uint8)
 # http://support.microsoft.com/kb/167296
 # How To Convert a UNIX time_t to a Win32 FILETIME or SYSTEMTIME
 EPOCH_AS_FILETIME = 116444736000000000  # January 1, 1970 as MS file time
@@ -414,17 +428,14 @@ def _read_ent(ent_file):
     return allnote
 
 
-def _read_packet(f, pos, n_smp, n_allchan, abs_delta):
+def _read_packet(buf, n_smp, n_allchan, abs_delta, chan=None):
     """
-    Read a packet of compressed data
+    Decode a packet of compressed data
 
     Parameters
     ----------
-    f : instance of opened file
-        erd file
-    pos : int
-        index of the start of the packet in the file (in bytes from beginning
-        of the file)
+    buf : bytes
+        content of the erd file, starting at the beginning of the packet
     n_smp : int
         number of samples to read
     n_allchan : int
@@ -433,63 +444,263 @@ def _read_packet(f, pos, n_smp, n_allchan, abs_delta):
         if the delta has this value, it means that you should read the absolute
         value at the end of packet. If schema is 7, the length is 1; if schema
         is 8 or 9, the length is 2.
+    chan : list of int, optional
+        indices of the channels to decode (default: all the channels)
 
     Returns
     -------
     ndarray
-        data read in the packet up to n_smp.
+        data read in the packet up to n_smp, only for the channels in chan.
 
     Notes
     -----
+    The packet is decoded in two steps. First, we find where each sample
+    starts (see _find_smp_pos). Then, the deltas and the absolute values of the
+    channels of interest are read with numpy indexing, and the deltas are
+    summed between absolute values. Only the bytes which are read are
+    converted to larger integers.
+
     TODO: shorted chan. If I remember correctly, deltamask includes all the
     channels, but the absolute values are only used for not-shorted channels
 
     TODO: implement schema 7, which is slightly different, but I don't remember
     where exactly.
     """
+    abs_bytes = abs_delta
     if len(abs_delta) == 1:  # schema 7
         abs_delta = unpack('b', abs_delta)[0]
     else:  # schema 8, 9
         abs_delta = unpack('h', abs_delta)[0]
 
+    if chan is None:
+        chan = arange(n_allchan)
+    chan = asarray(chan, dtype=int)
+
+    u8 = frombuffer(buf, dtype='uint8')
     l_deltamask = int(ceil(n_allchan / BITS_IN_BYTE))
-    dat = empty((n_allchan, n_smp), dtype=int32)
-    f.seek(pos)
+    smp_pos = _find_smp_pos(u8, n_smp, n_allchan, abs_bytes)
+
+    byte_deltamask = u8[smp_pos[:, None] + 1 + arange(l_deltamask)]
+    wide = unpackbits(byte_deltamask, axis=1,
+                      bitorder='little')[:, :n_allchan].astype(bool)
+    n_bytes = wide + 1
+    delta_pos = (smp_pos[:, None] + 1 + l_deltamask +
+                 n_bytes.cumsum(axis=1) - n_bytes)
+
+    # absolute values are stored after the deltas, in channel order
+    all_abs = zeros(wide.shape, dtype=bool)
+    all_abs[wide] = _read_int16(u8, delta_pos[wide]) == abs_delta
+    abs_pos = (smp_pos + 1 + l_deltamask + n_bytes.sum(axis=1))[:, None]
+    abs_pos = abs_pos + (all_abs.cumsum(axis=1) - all_abs) * 4
+
+    delta_pos = delta_pos[:, chan]
+    wide = wide[:, chan]
+    is_abs = all_abs[:, chan]
+    abs_pos = abs_pos[:, chan][is_abs]
+
+    delta = u8[delta_pos].view('int8').astype(int64)
+    delta[wide] = _read_int16(u8, delta_pos[wide])
+    abs_val = (u8[abs_pos].astype('uint32') |
+               (u8[abs_pos + 1].astype('uint32') << 8) |
+               (u8[abs_pos + 2].astype('uint32') << 16) |
+               (u8[abs_pos + 3].astype('uint32') << 24))
+    delta[is_abs] = abs_val.view('int32')
+
+    delta = delta.T
+    is_abs = is_abs.T
+
+    # sum the deltas, restarting from each absolute value
+    last_abs = maximum.accumulate(where(is_abs, arange(n_smp), -1), axis=1)
+    relval = where(is_abs, 0, delta).cumsum(axis=1)
+    row = arange(len(chan))[:, None]
+    dat = where(last_abs >= 0,
+                delta[row, last_abs] + relval - relval[row, last_abs],
+                relval)
+
+    return dat.astype(int32)
+
+
+def _find_smp_pos(u8, n_smp, n_allchan, abs_bytes):
+    """Find where each sample starts in a packet of compressed data.
+
+    Parameters
+    ----------
+    u8 : ndarray of uint8
+        content of the packet
+    n_smp : int
+        number of samples to find
+    n_allchan : int
+        number of channels
+    abs_bytes : bytes
+        value of the 16-bit delta which indicates an absolute value
 
-    for i_smp in range(n_smp):
-        eventbite = f.read(1)
+    Returns
+    -------
+    ndarray of int64
+        position (in bytes) of the eventbite of each sample
+
+    Notes
+    -----
+    The length of a sample depends on its own content (the delta mask and the
+    number of absolute values), so the position of each sample depends on the
+    previous one. Instead of looping over the samples, we compute the length of
+    the sample that would start at any byte which could be an eventbite, and
+    then we follow the chain of samples from the beginning of the packet,
+    doubling the number of positions at each step.
+    """
+    l_deltamask = int(ceil(n_allchan / BITS_IN_BYTE))
+    last_mask = (1 << (n_allchan - (l_deltamask - 1) * BITS_IN_BYTE)) - 1
+    max_smp_len = 1 + l_deltamask + n_allchan * 6  # 16-bit delta + abs value
+    u8 = u8[:n_smp * max_smp_len]
+    n_span = len(u8)
+    last = max(n_span - 1, 0)
+
+    # any byte with 0 or 1 could be the eventbite of a sample
+    cand = where(u8 <= 1)[0]
+
+    # the number of 16-bit deltas is the number of bits in the delta mask
+    n_bits = zeros(n_span + 1, dtype=int32)
+    POPCOUNT.take(u8).cumsum(dtype=int32, out=n_bits[1:])
+    last_byte = u8[minimum(cand + l_deltamask, last)] & last_mask
+    n_wide = (n_bits[minimum(cand + l_deltamask, n_span)] -
+              n_bits[minimum(cand + 1, n_span)] + POPCOUNT[last_byte])
+    delta_beg = cand + 1 + l_deltamask
+    smp_end = delta_beg + n_allchan + n_wide
+
+    # each 16-bit delta equal to abs_bytes adds an absolute value (4 bytes)
+    if len(abs_bytes) == 2 and n_span > 1:
+        marker = where((u8[:-1] == abs_bytes[0]) &
+                       (u8[1:] == abs_bytes[1]))[0]
+        n_abs = _count_abs(u8, n_bits, cand, smp_end, marker, l_deltamask,
+                           last_mask)
+        smp_end += n_abs * 4
+
+    # index of the candidate where the next sample starts (n_cand if none)
+    n_cand = len(cand)
+    i_next = searchsorted(cand, smp_end)
+    is_cand = i_next < n_cand
+    is_cand[is_cand] = cand[i_next[is_cand]] == smp_end[is_cand]
+    next_cand = full(n_cand + 1, n_cand, dtype=int32)
+    next_cand[:-1][is_cand] = i_next[is_cand]
+
+    # the first sample is at the beginning of the packet
+    if n_cand and cand[0] == 0:
+        smp_cand = zeros(1, dtype=int32)
+    else:
+        smp_cand = full(1, n_cand, dtype=int32)
+    jump = next_cand
+    while len(smp_cand) < n_smp:
+        smp_cand = concatenate((smp_cand, jump[smp_cand]))
+        jump = jump[jump]
+    smp_cand = smp_cand[:n_smp]
+
+    invalid = smp_cand == n_cand
+    if invalid.any():
+        i_smp = int(invalid.argmax())
+        if i_smp == 0:
+            pos = 0
+        else:
+            pos = smp_end[smp_cand[i_smp - 1]]
+        raise Exception('at pos ' + str(i_smp) +
+                        ', eventbite (should be x00 or x01): ' +
+                        str(u8[pos:pos + 1].tobytes()))
+
+    return cand[smp_cand]
 
-        try:
-            assert eventbite in (b'\x00', b'\x01')
-        except:
-            raise Exception('at pos ' + str(i_smp) +
-                            ', eventbite (should be x00 or x01): ' +
-                            str(eventbite))
 
-        byte_deltamask = unpack('<' + 'B' * l_deltamask, f.read(l_deltamask))
-        deltamask = unpackbits(array(byte_deltamask[::-1], dtype ='uint8'))
-        deltamask = deltamask[:-n_allchan-1:-1]
+def _count_abs(u8, n_bits, cand, smp_end, marker, l_deltamask, last_mask):
+    """Count the 16-bit deltas which indicate an absolute value.
 
-        n_bytes = int(deltamask.sum()) + deltamask.shape[0]
+    Parameters
+    ----------
+    u8 : ndarray of uint8
+        content of the packet
+    n_bits : ndarray of int
+        number of bits set to 1 in the bytes before each position
+    cand : ndarray of int
+        position of the samples (any byte which could be an eventbite)
+    smp_end : ndarray of int
+        position of the end of the deltas of each sample
+    marker : ndarray of int
+        sorted positions where the two bytes are equal to the absolute delta
+    l_deltamask : int
+        number of bytes in the delta mask
+    last_mask : int
+        bits of the last byte of the delta mask which refer to channels
+
+    Returns
+    -------
+    ndarray of int
+        number of absolute values in each sample
 
-        deltamask = deltamask.astype('bool')
-        # numpy has a weird way of handling string/bytes.
-        # We create a byte representation, because then tostring() works fine
-        delta_dtype = empty(n_allchan, dtype='a1')
-        delta_dtype[deltamask] = 'h'
-        delta_dtype[~deltamask] = 'b'
-        relval = array(unpack('<' + delta_dtype.tostring().decode(),
-                              f.read(n_bytes)))
+    Notes
+    -----
+    Only the markers between the deltas of a sample are checked. Each byte of
+    the delta mask refers to 8 channels, which take 8 bytes plus one for each
+    16-bit delta, so we find the byte of the delta mask with a binary search
+    and then the channel in that byte (see _wide_offsets).
+    """
+    n_span = len(u8)
+    mask_beg = cand + 1
+    delta_beg = mask_beg + l_deltamask
+
+    # pairs of sample and marker between the deltas of that sample
+    lo = searchsorted(marker, delta_beg)
+    n_pair = searchsorted(marker, smp_end - 1) - lo
+    pair_cand = repeat(arange(len(cand)), n_pair)
+    i_marker = arange(len(pair_cand)) - repeat(n_pair.cumsum() - n_pair - lo,
+                                               n_pair)
+    offset = marker[i_marker] - delta_beg[pair_cand]  # from the first delta
+    mask_beg = mask_beg[pair_cand]
+
+    def _byte_offset(i_byte):
+        """position of the first delta of the channels in that byte"""
+        return (i_byte * BITS_IN_BYTE +
+                n_bits[minimum(mask_beg + i_byte, n_span)] -
+                n_bits[minimum(mask_beg, n_span)])
+
+    i_byte = zeros(len(pair_cand), dtype=int64)
+    step = 1 << (l_deltamask - 1).bit_length()
+    while step > 1:
+        step //= 2
+        after = minimum(i_byte + step, l_deltamask - 1)
+        i_byte = where(_byte_offset(after) <= offset, after, i_byte)
+
+    byte = u8[minimum(mask_beg + i_byte, n_span - 1)]
+    byte[i_byte == l_deltamask - 1] &= last_mask
+    offset = minimum(offset - _byte_offset(i_byte), 2 * BITS_IN_BYTE - 1)
+    is_abs = _wide_offsets()[byte, offset]
+
+    return bincount(pair_cand[is_abs], minlength=len(cand))
+
+
+@lru_cache(maxsize=1)
+def _wide_offsets():
+    """For each byte of the delta mask, find where the 16-bit deltas start.
 
-        read_abs = (delta_dtype == b'h') & (relval == abs_delta)
+    Returns
+    -------
+    ndarray of bool
+        256 X 16 matrix, which is True if a 16-bit delta starts at that
+        position (in bytes), for the 8 channels with that byte as delta mask
+    """
+    bits = unpackbits(arange(256, dtype=uint8)[:, None], axis=1,
+                      bitorder='little').astype(int)
+    offsets = arange(BITS_IN_BYTE) + bits.cumsum(axis=1) - bits
+    wide_offsets = zeros((256, 2 * BITS_IN_BYTE), dtype=bool)
+    row, col = bits.nonzero()
+    wide_offsets[row, offsets[row, col]] = True
+    return wide_offsets
 
-        dat[~read_abs, i_smp] = dat[~read_abs, i_smp - 1] + relval[~read_abs]
-        dat[read_abs, i_smp] = fromfile(f, 'i', count=read_abs.sum())
 
-    return dat
+def _read_int16(u8, pos):
+    """Read little-endian 16-bit integers, only at the positions of interest.
+    """
+    return (u8[pos].astype('uint16') |
+            (u8[pos + 1].astype('uint16') << BITS_IN_BYTE)).view('int16')
 
 
-def _read_erd(erd_file, begsam, endsam):
+def _read_erd(erd_file, begsam, endsam, chan=None, hdr=None, etc=None):
     """Read the raw data and return a matrix, converted to microvolts.
 
     Parameters
@@ -500,6 +711,12 @@ def _read_erd(erd_file, begsam, endsam):
         index of the first sample to read
     endsam : int
         index of the last sample (excluded, per python convention)
+    chan : list of int, optional
+        indices of the channels to read (default: all the channels)
+    hdr : dict, optional
+        header of the .erd file, if it was already read
+    etc : ndarray, optional
+        table of content of the .erd file (.etc), if it was already read
 
     Returns
     -------
@@ -539,14 +756,13 @@ def _read_erd(erd_file, begsam, endsam):
     they are never used/recorded. So, we need to keep track both of all the
     channels (including the non-shorted) and of the actual channels only.
 
-    When we save the data as memory-mapped, we only save the real channels.
-    However, the data in the output have both shorted and non-shorted channels.
-    Shorted channels have NaN's only.
-
     About the actual implementation, we always follow the python convention
     that the first sample is included and the last sample is not.
+
+    All the packets of interest are read from disk at once.
     """
-    hdr = _read_hdr_file(erd_file)
+    if hdr is None:
+        hdr = _read_hdr_file(erd_file)
     n_allchan = hdr['num_channels']
     shorted = hdr['shorted']  # does this exist for Schema 7 at all?
     n_shorted = sum(shorted)
@@ -560,12 +776,16 @@ def _read_erd(erd_file, begsam, endsam):
     if hdr['file_schema'] in (8, 9):
         abs_delta = b'\xff\xff'
 
+    if chan is None:
+        chan = list(range(n_allchan))
+
     n_smp = endsam - begsam
-    data = empty((n_allchan, n_smp))
+    data = empty((len(chan), n_smp))
     data.fill(NaN)
 
     # it includes the sample in both cases
-    etc = _read_etc(erd_file.with_suffix('.etc'))
+    if etc is None:
+        etc = _read_etc(erd_file.with_suffix('.etc'))
     all_beg = etc['samplestamp']
     all_end = etc['samplestamp'] + etc['sample_span'] - 1
 
@@ -576,35 +796,35 @@ def _read_erd(erd_file, begsam, endsam):
         return data
 
     with erd_file.open('rb') as f:
-        for rec in range(begrec, endrec + 1):
-
-            # [begpos_rec, endpos_rec]
-            begpos_rec = begsam - all_beg[rec]
-            endpos_rec = endsam - all_beg[rec]
+        f.seek(etc['offset'][begrec])
+        if endrec + 1 < len(etc):
+            buf = f.read(etc['offset'][endrec + 1] - etc['offset'][begrec])
+        else:
+            buf = f.read()
 
-            begpos_rec = max(begpos_rec, 0)
-            endpos_rec = min(endpos_rec, all_end[rec] - all_beg[rec] + 1)
+    for rec in range(begrec, endrec + 1):
 
-            # [d1, d2)
-            d1 = begpos_rec + all_beg[rec] - begsam
-            d2 = endpos_rec + all_beg[rec] - begsam
+        # [begpos_rec, endpos_rec]
+        begpos_rec = begsam - all_beg[rec]
+        endpos_rec = endsam - all_beg[rec]
 
-            dat = _read_packet(f, etc['offset'][rec], endpos_rec, n_allchan,
-                               abs_delta)
-            data[:, d1:d2] = dat[:, begpos_rec:endpos_rec]
+        begpos_rec = max(begpos_rec, 0)
+        endpos_rec = min(endpos_rec, all_end[rec] - all_beg[rec] + 1)
 
+        # [d1, d2)
+        d1 = begpos_rec + all_beg[rec] - begsam
+        d2 = endpos_rec + all_beg[rec] - begsam
 
-    # fill up the output data, put NaN for shorted channels
-    if n_shorted > 0:
-        full_channels = where(asarray([x == 0 for x in shorted]))[0]
-        output = empty((n_allchan, n_smp))
-        output.fill(NaN)
-        output[full_channels, :] = data
-    else:
-        output = data
+        pos = etc['offset'][rec] - etc['offset'][begrec]
+        if rec < endrec:
+            packet = buf[pos:etc['offset'][rec + 1] - etc['offset'][begrec]]
+        else:
+            packet = buf[pos:]
+        dat = _read_packet(packet, endpos_rec, n_allchan, abs_delta, chan)
+        data[:, d1:d2] = dat[:, begpos_rec:endpos_rec]
 
     factor = _calculate_conversion(hdr)
-    return expand_dims(factor, 1) * output
+    return expand_dims(factor[chan], 1) * data
 
 
 def _read_etc(etc_file):
@@ -841,6 +1061,7 @@ class Ktlx():
         self.filename = ktlx_dir
         self._filename = None  # Path of dir and filename stem
         self._hdr = self._read_hdr_dir()
+        self._erd = {}  # header and table of content of each erd file
 
     def _read_hdr_dir(self):
         """Read the header for basic information.
@@ -922,7 +1143,7 @@ class Ktlx():
         dat = empty((len(chan), endsam - begsam))
         dat.fill(NaN)
 
-        stc, all_stamp = _read_stc(self._filename.with_suffix('.stc'))
+        all_stamp = self._hdr['stamps']
 
         all_erd = all_stamp['segment_name'].astype('U')  # convert to str
         all_beg = all_stamp['start_stamp']
@@ -947,13 +1168,34 @@ class Ktlx():
             erd_file = (Path(self.filename) / all_erd[rec]).with_suffix('.erd')
 
             try:
-                dat_rec = _read_erd(erd_file, begpos_rec, endpos_rec)
-                dat[:, d1:d2] = dat_rec[chan, :]
+                hdr, etc = self._read_erd_toc(erd_file)
+                dat[:, d1:d2] = _read_erd(erd_file, begpos_rec, endpos_rec,
+                                          chan, hdr, etc)
             except (FileNotFoundError, PermissionError):
                 lg.warning('{} does not exist'.format(erd_file))
 
         return dat
 
+    def _read_erd_toc(self, erd_file):
+        """Read header and table of content of one erd file, only once.
+
+        Parameters
+        ----------
+        erd_file : Path
+            one of the .erd files
+
+        Returns
+        -------
+        dict
+            header of the .erd file
+        ndarray
+            table of content of the .erd file (from .etc)
+        """
+        if erd_file not in self._erd:
+            self._erd[erd_file] = (_read_hdr_file(erd_file),
+                                   _read_etc(erd_file.with_suffix('.etc')))
+        return self._erd[erd_file]
+
     def return_hdr(self):
         """Return the header for further use.
 
@@ -3,9 +3,11 @@ from datetime import datetime, date, timedelta
 from logging import getLogger
 from struct import unpack
 
-from numpy import array, dtype, empty, fromfile, iinfo, memmap, NaN, pad, where
+from numpy import array, dtype, fromfile, iinfo, where
 from numpy.lib.recfunctions import append_fields
 
+from .utils import read_memmap
+
 N_ZONES = 15
 MAX_SAMPLE = 128
 MAX_CAN_VIEW = 128
@@ -70,7 +72,7 @@ class Micromed:
 
         return subj_id, start_time, self._header['s_freq'], chan_name, self._n_smp, self._header
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -81,6 +83,8 @@ class Micromed:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -91,33 +95,14 @@ class Micromed:
         if type(chan) == int:  # if single value is provided it needs to be transformed to list to generate a 2d matrix
             chan = [chan, ]
 
-        if (begsam >= self._n_smp) or (endsam < 0):
-            dat = empty((len(chan), endsam - begsam))
-            dat.fill(NaN)
-            return dat
-
-        if begsam < 0:
-            begpad = -1 * begsam
-            begsam = 0
-        else:
-            begpad = 0
-
-        if endsam > self._n_smp:
-            endpad = endsam - self._n_smp
-            endsam = self._n_smp
-        else:
-            endpad = 0
-
-        dshape = (self._n_chan, endsam - begsam)
-        sig_dtype = 'u' + str(self._n_bytes)
-        offset = self._bodata + begsam * self._n_bytes * self._n_chan
-        dat = memmap(str(self.filename), dtype=sig_dtype, order='F', mode='r',
-                     shape=dshape, offset=offset).astype('float')
-
-        dat = pad(dat[chan, :], ((0, 0), (begpad, endpad)), mode='constant',
-                  constant_values=NaN)
-
-        return (dat - self._offset[chan, None]) * self._factors[chan, None]
+        dat = read_memmap(self.filename, chan, begsam, endsam,
+                          (self._n_chan, self._n_smp),
+                          'u' + str(self._n_bytes), offset=self._bodata,
+                          order='F', dtype_out=dtype)
+
+        dat -= self._offset[chan, None]
+        dat *= self._factors[chan, None]
+        return dat
 
     def return_markers(self):
         """Return all the markers (also called triggers or events).
@@ -2,7 +2,7 @@ from os.path import getsize, join
 from xml.etree.ElementTree import parse
 from datetime import datetime, timedelta, timezone
 
-from numpy import NaN, pad, reshape, zeros
+from numpy import empty, frombuffer, memmap, NaN, uint8, zeros
 
 TIMEZONE = timezone.utc
 # 24bit precision
@@ -96,7 +96,7 @@ class Moberg:
 
         return subj_id, start_time, s_freq, chan_name, n_samples, orig
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -107,36 +107,35 @@ class Moberg:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
         numpy.ndarray
             A 2d matrix, with dimension chan X samples
+
+        Notes
+        -----
+        The file is memory-mapped, so only the bytes of the selected channels
+        and samples are read and decoded.
         """
-        if begsam < 0:
-            begpad = -1 * begsam
-            begsam = 0
-        else:
-            begpad = 0
-
-        if endsam > self.n_smp:
-            endpad = endsam - self.n_smp
-            endsam = self.n_smp
-        else:
-            endpad = 0
-
-        first_sam = DATA_PRECISION * self.n_chan * begsam
-        toread_sam = DATA_PRECISION * self.n_chan * (endsam - begsam)
-
-        with open(join(self.filename, EEG_FILE), 'rb') as f:
-            f.seek(first_sam)
-            x = f.read(toread_sam)
-
-        dat = _read_dat(x)
-        dat = reshape(dat, (self.n_chan, -1), 'F')
-        dat = self.convertion(dat[chan, :])
-        dat = pad(dat, ((0, 0), (begpad, endpad)),
-                  mode='constant', constant_values=NaN)
+        if isinstance(chan, int):
+            chan = [chan, ]
+
+        dat = empty((len(chan), endsam - begsam), dtype=dtype)
+        dat.fill(NaN)
+
+        begpos = max(begsam, 0)
+        endpos = min(endsam, self.n_smp)
+        if begpos >= endpos:
+            return dat
+
+        x = memmap(join(self.filename, EEG_FILE), dtype=uint8, mode='r',
+                   shape=(self.n_smp, self.n_chan, DATA_PRECISION))
+        x = x[begpos:endpos, chan, :]
+        dat[:, begpos - begsam:endpos - begsam] = self.convertion(
+            _read_dat(x).T)
 
         return dat
 
@@ -165,24 +164,25 @@ def _read_dat(x):
 
     Parameters
     ----------
-    x : bytes
-        bytes (length should be divisible by 3)
+    x : bytes or numpy.ndarray
+        bytes (length should be divisible by 3) or array of uint8, whose last
+        dimension has length 3
 
     Returns
     -------
-    numpy vector
-        vector with the signed 24bit values
+    numpy.ndarray
+        signed 24bit values (as int32), with the same dimensions as x except
+        for the last one (a vector, if x is bytes)
 
     Notes
     -----
-    It's pretty slow but it's pretty a PITA to read 24bit as far as I can tell.
+    Each value is copied into the three most significant bytes of a
+    little-endian int32, then shifted back by 8 bits, which also extends the
+    sign.
     """
-    n_smp = int(len(x) / DATA_PRECISION)
-    dat = zeros(n_smp)
-
-    for i in range(n_smp):
-        i0 = i * DATA_PRECISION
-        i1 = i0 + DATA_PRECISION
-        dat[i] = int.from_bytes(x[i0:i1], byteorder='little', signed=True)
+    if isinstance(x, bytes):
+        x = frombuffer(x, dtype=uint8).reshape(-1, DATA_PRECISION)
 
-    return dat
+    dat = zeros(x.shape[:-1] + (4, ), dtype=uint8)
+    dat[..., 1:] = x
+    return dat.view('<i4')[..., 0] >> 8
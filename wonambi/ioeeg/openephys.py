@@ -5,7 +5,9 @@ TODO
 It assumes that the lenght of a block (i.e. record) is 1024 data points but this
 might change in the future.
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import repeat
 from logging import getLogger
 import locale
 from struct import unpack, calcsize
@@ -13,7 +15,8 @@ from math import ceil
 from re import search, match
 from xml.etree import ElementTree
 
-from numpy import array, empty, NaN, fromfile, unique, where, arange, hstack, vstack, concatenate
+from numpy import (array, dtype, empty, memmap, NaN, fromfile, unique, where,
+                   arange, hstack, vstack, concatenate)
 
 lg = getLogger(__name__)
 
@@ -28,6 +31,17 @@ BEG_BLK_SIZE = calcsize(BEG_BLK)
 DAT_FMT_SIZE = calcsize(DAT_FMT)
 BLK_SIZE = BEG_BLK_SIZE + DAT_FMT_SIZE + calcsize(END_BLK)
 
+# one block (record) on disk, the same as BEG_BLK + DAT_FMT + END_BLK
+BLK_DTYPE = dtype([
+    ('timestamp', '<i8'),
+    ('n_samples', '<u2'),
+    ('rec_num', '<u2'),
+    ('data', '>i2', (BLK_LENGTH, )),
+    ('marker', 'u1', (10, )),
+    ])
+
+MAX_THREADS = 8  # number of channel files to read at the same time
+
 EVENT_TYPES = {
     3: 'TTL Event',
     5: 'Network Event',
@@ -52,8 +66,10 @@ class OpenEphys:
     ----------
     channels : list of dict
         list of filenames referring to channels which are actually on disk
-    blocks : 1D array
-        length of each block, in samples (currently 1024)
+    blocks_dat : 2D array
+        first and last sample (not included) of each block
+    blocks_rec : 1D array
+        index of each block in the channel files
     gain : 1D array
         gain to convert digital to microvolts (one value per channel)
     """
@@ -132,12 +148,14 @@ class OpenEphys:
         n_samples = self.segments[-1]['end']
 
         self.blocks_dat, self.blocks_offset = _prepare_blocks(self.segments)
+        self.blocks_rec = ((self.blocks_offset - BEG_BLK_SIZE - HDR_LENGTH) //
+                           BLK_SIZE)
 
         orig = {}
 
         return subj_id, start_time, self.s_freq, chan_name, n_samples, orig
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype='float64'):
         """Read the data for some/all of the channels
 
         Parameters
@@ -148,34 +166,43 @@ class OpenEphys:
             start sample to read
         endsam : int
             end sample to read (exclusive)
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
         2D array
             chan X samples recordings
+
+        Notes
+        -----
+        Each channel file is memory-mapped as an array of blocks (see
+        BLK_DTYPE), and the blocks of interest are read at once. The channel
+        files are read in parallel (up to MAX_THREADS at the same time).
         """
         data_length = endsam - begsam
-        dat = empty((len(chan), data_length))
+        dat = empty((len(chan), data_length), dtype=dtype)
         dat.fill(NaN)
 
         all_blocks = _select_blocks(self.blocks_dat, begsam, endsam)
-        for i_chan, sel_chan in enumerate(chan):
-            with self.channels[sel_chan].open('rb') as f:
-                for i_block in all_blocks:
-                    i_dat = self.blocks_dat[i_block, :] - begsam
-                    i_disk = self.blocks_offset[i_block].item()
-
-                    # read only data (no timestamp or record marker)
-                    f.seek(i_disk)
-                    x = array(unpack(DAT_FMT, f.read(DAT_FMT_SIZE)))
-                    beg_dat = max(i_dat[0], 0)
-                    end_dat = min(i_dat[1], data_length)
-                    beg_x = max(0, - i_dat[0])
-                    segment_length = min(i_dat[1], data_length) - i_dat[0]
-                    end_x = min(len(x), segment_length)
-                    dat[i_chan, beg_dat:end_dat] = x[beg_x:end_x]
-
-        return dat * self.gain[chan, None]
+        if len(all_blocks) == 0 or len(chan) == 0:
+            return dat
+
+        # position of each sample of the blocks in the output
+        i_dat = self.blocks_dat[all_blocks, :1] - begsam + arange(BLK_LENGTH)
+        in_interval = (i_dat >= 0) & (i_dat < data_length)
+        i_dat = i_dat[in_interval]
+
+        channel_files = [self.channels[one_chan] for one_chan in chan]
+        with ThreadPoolExecutor(min(MAX_THREADS, len(chan))) as executor:
+            all_x = executor.map(_read_blocks, channel_files,
+                                 repeat(self.blocks_rec[all_blocks]),
+                                 repeat(in_interval))
+
+            for i_chan, x in enumerate(all_x):
+                dat[i_chan, i_dat] = x * self.gain[chan[i_chan]]
+
+        return dat
 
     def return_markers(self):
         """Read the markers from the .events file
@@ -435,6 +462,30 @@ def _prepare_blocks(segments):
     return blocks_dat, blocks_offset
 
 
+def _read_blocks(channel_file, blocks_rec, in_interval):
+    """Read the data of some blocks of one channel file.
+
+    Parameters
+    ----------
+    channel_file : Path
+        path to the .continuous file
+    blocks_rec : 1D array
+        index of the blocks to read
+    in_interval : 2D array of bool
+        blocks X samples in each block, samples to keep
+
+    Returns
+    -------
+    1D array
+        values of the samples to keep (int16, in native byte order)
+    """
+    n_blocks = (channel_file.stat().st_size - HDR_LENGTH) // BLK_SIZE
+    blocks = memmap(str(channel_file), dtype=BLK_DTYPE, mode='r',
+                    offset=HDR_LENGTH, shape=(n_blocks, ))
+    x = blocks['data'][blocks_rec]
+    return x[in_interval].astype('int16')
+
+
 def _select_blocks(blocks_dat, begsam, endsam):
     all_blocks = ((blocks_dat[:, 1] - begsam) > 0) & ((endsam - blocks_dat[:, 0]) > 0)
     return where(all_blocks)[0]
@@ -1,15 +1,22 @@
 """Class to import straight text records.
 """
+from hashlib import sha1
 from logging import getLogger
-from numpy import empty, float64, floor
-from os import listdir
+from numpy import (array, concatenate, empty, flatnonzero, float64,
+                   frombuffer, fromstring, int64, load, NaN, save, uint8)
+from os import listdir, replace
 from os.path import splitext
 from pathlib import Path
+from tempfile import mkstemp
 
 from .utils import DEFAULT_DATETIME
 
 lg = getLogger(__name__)
 
+INDEX_STEP = 4096  # store the position of one line every INDEX_STEP lines
+INDEX_SUFFIX = '.idx'  # extension of the index files in index_dir
+READ_SIZE = 16 * 1024 ** 2  # in bytes, when reading the files to index them
+
 
 class Text:
     """Class to read text format records. The record consists of a directory 
@@ -22,16 +29,26 @@ class Text:
     ----------
     rec_dir : path to record directory
         the folder containing the record
+    index_dir : path to directory, optional
+        directory where to store the index of the lines of each channel file,
+        so that the files are indexed only once (by default, the index is only
+        kept in memory)
         
     Notes
     -----
     Text is a very slow format for reading data. It is best to use this class
     to import the record, then to export is as a Wonambi (.won) file, and use
     that for reading.
+
+    The first time a channel is read, the position of every INDEX_STEP-th line
+    is stored (see _index_lines), so that the following reads only parse the
+    lines of interest. Nothing is written into the record directory.
     """
-    def __init__(self, rec_dir):
+    def __init__(self, rec_dir, index_dir=None):
         lg.info('Reading ' + str(rec_dir))
         self.filename = rec_dir
+        self.index_dir = index_dir
+        self.index = {}
         self.hdr = self.return_hdr()
         
         # range data are absent
@@ -83,11 +100,9 @@ class Text:
             line0 = f.readline()
             hdr['s_freq'] = int(
                     line0[line0.index('Rate:') + 5:line0.index('Hz')])
-            
-            for i, _ in enumerate(f):
-                pass
-            hdr['n_samples'] = i
-        
+
+        hdr['n_samples'] = self._index(0)[0]
+
         output = (hdr['subj_id'], hdr['start_time'], hdr['s_freq'], 
                   hdr['chan_name'], hdr['n_samples'], hdr)
         
@@ -110,27 +125,19 @@ class Text:
         numpy.ndarray
             A 2d matrix, with dimension chan X samples.
         """
-        #n_sam = self.hdr[4]
-        interval = endsam - begsam
-        dat = empty((len(chan), interval))
-        
-        #beg_block = floor((begsam / n_sam) * n_block)
-        #end_block = floor((endsam / n_sam) * n_block)
-                
-        for i, chan in enumerate(chan):
-            k = 0
-            
-            with open(self.chan_files[chan], 'rt') as f:
-                f.readline()
-                
-                for j, datum in enumerate(f):
-                    
-                    if begsam <= j + 1 < endsam:
-                        dat[i, k] = float64(datum)
-                        k += 1
-                        if k == interval:
-                            break
-        
+        dat = empty((len(chan), endsam - begsam))
+        dat.fill(NaN)
+
+        for i, one_chan in enumerate(chan):
+            n_samples, offsets = self._index(one_chan)
+            begpos = max(begsam, 0)
+            endpos = min(endsam, n_samples)
+            if begpos >= endpos:
+                continue
+
+            dat[i, begpos - begsam:endpos - begsam] = _read_lines(
+                self.chan_files[one_chan], offsets, begpos, endpos)
+
         # calibration
         phys_range = self.phys_max - self.phys_min
         dig_range = self.dig_max - self.dig_min
@@ -144,6 +151,170 @@ class Text:
         """
         return []
 
+    def _index(self, chan):
+        """Index of the lines of one channel file (see _index_lines).
+
+        Parameters
+        ----------
+        chan : int
+            index of the channel
+
+        Returns
+        -------
+        int
+            number of samples in the channel file
+        ndarray of int
+            byte position of every INDEX_STEP-th sample
+        """
+        if chan not in self.index:
+            chan_file = self.chan_files[chan]
+            if self.index_dir is None:
+                index_file = None
+            else:
+                index_file = _index_file(self.index_dir, chan_file)
+            self.index[chan] = _index_lines(chan_file, index_file)
+        return self.index[chan]
+
+
+def _index_file(index_dir, chan_file):
+    """Name of the file with the index of one channel file.
+
+    Parameters
+    ----------
+    index_dir : path to directory
+        directory with the index files
+    chan_file : Path
+        channel file
+
+    Returns
+    -------
+    Path
+        index file, whose name is the hash of the path of the channel file
+    """
+    key = sha1(str(chan_file.resolve()).encode()).hexdigest()[:16]
+    return Path(index_dir) / (key + INDEX_SUFFIX)
+
+
+def _index_lines(chan_file, index_file=None):
+    """Find the position of the lines in the file, and store them in
+    index_file (if given), so that the file is indexed only once.
+
+    Parameters
+    ----------
+    chan_file : Path
+        channel file (the first line is the header, then one sample per line)
+    index_file : Path, optional
+        file where the index is stored (if None, the index is not stored)
+
+    Returns
+    -------
+    int
+        number of samples in the channel file
+    ndarray of int
+        byte position of every INDEX_STEP-th sample
+
+    Notes
+    -----
+    The index file contains the size and modification time of the channel file
+    (so that it's not used if the file changes), INDEX_STEP, the number of
+    samples and then the positions, as int64.
+    """
+    st = chan_file.stat()
+
+    if index_file is not None and index_file.exists():
+        try:
+            with index_file.open('rb') as f:
+                index = load(f)
+            if (index[0] == st.st_size and index[1] == st.st_mtime_ns and
+                    index[2] == INDEX_STEP):
+                return int(index[3]), index[4:]
+        except (OSError, ValueError):
+            pass
+
+    lg.debug(f'Indexing lines of {chan_file}')
+    offsets = []
+    n_samples = 0
+    with chan_file.open('rb') as f:
+        f.readline()
+        pos = f.tell()
+        starts = array([pos], dtype=int64)  # position of the first sample
+
+        while True:
+            offsets.append(starts[(-n_samples) % INDEX_STEP::INDEX_STEP])
+            n_samples += len(starts)
+            if len(starts):
+                last_start = starts[-1]
+
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            starts = flatnonzero(frombuffer(chunk, dtype=uint8) ==
+                                 ord('\n')) + pos + 1
+            pos += len(chunk)
+
+    offsets = concatenate(offsets)
+    if last_start == pos:  # no sample after the last newline
+        n_samples -= 1
+        offsets = offsets[offsets < pos]
+
+    if index_file is not None:
+        index = concatenate(([st.st_size, st.st_mtime_ns, INDEX_STEP,
+                              n_samples], offsets)).astype(int64)
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            # unique name, if another process writes the same index
+            fd, tmp_file = mkstemp(suffix='.tmp', dir=str(index_file.parent))
+            with open(fd, 'wb') as f:
+                save(f, index)
+            replace(tmp_file, str(index_file))
+        except OSError as err:
+            lg.warning(f'Could not store index of {chan_file} ({err})')
+
+    return n_samples, offsets
+
+
+def _read_lines(chan_file, offsets, begpos, endpos):
+    """Read the values of consecutive samples.
+
+    Parameters
+    ----------
+    chan_file : Path
+        channel file
+    offsets : ndarray of int
+        byte position of every INDEX_STEP-th sample
+    begpos : int
+        first sample to read
+    endpos : int
+        last sample to read (not included)
+
+    Returns
+    -------
+    ndarray
+        values of the samples
+    """
+    i_block = begpos // INDEX_STEP
+    end_block = (endpos - 1) // INDEX_STEP + 1
+
+    with chan_file.open('rb') as f:
+        f.seek(offsets[i_block])
+        if end_block < len(offsets):
+            x = f.read(offsets[end_block] - offsets[i_block])
+        else:
+            x = f.read()
+
+    # position of the start of each line in x
+    starts = concatenate(([0], flatnonzero(frombuffer(x, dtype=uint8) ==
+                                           ord('\n')) + 1))
+    beg = starts[begpos - i_block * INDEX_STEP]
+    end_line = endpos - i_block * INDEX_STEP
+    end = starts[end_line] if end_line < len(starts) else len(x)
+
+    dat = fromstring(x[beg:end], sep=' ')
+    if len(dat) != endpos - begpos:
+        raise ValueError(f'Could not read samples {begpos}-{endpos} from '
+                         f'{chan_file} (maybe not one value per line)')
+    return dat
+
     
 #==============================================================================
 # def split_file(filepath, lines_per_file=100):
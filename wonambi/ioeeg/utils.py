@@ -1,12 +1,36 @@
 from datetime import datetime
+from os import SEEK_END
+from struct import unpack
+
 from numpy import (append,
                    cumsum,
+                   dtype,
+                   empty,
+                   frombuffer,
+                   memmap,
+                   NaN,
+                   prod,
                    where,
                    )
 
 
 DEFAULT_DATETIME = datetime(2000, 1, 1)
 
+# MAT-file (v5) data types and array classes
+MAT5_HEADER = 128
+MAT5_VERSION = 0x0100
+MAT5_MATRIX = 14
+MAT5_DTYPES = {1: 'i1', 2: 'u1', 3: 'i2', 4: 'u2', 5: 'i4', 6: 'u4', 7: 'f4',
+               9: 'f8', 12: 'i8', 13: 'u8'}
+MAT5_CELL = 1
+MAT5_STRUCT = 2
+MAT5_CHAR = 4
+MAT5_CHAR_CODECS = {16: {'<': 'utf-8', '>': 'utf-8'},
+                    17: {'<': 'utf-16-le', '>': 'utf-16-be'},
+                    18: {'<': 'utf-32-le', '>': 'utf-32-be'}}
+MAT5_NUMERIC = range(6, 16)  # double, single and integers
+MAT5_COMPLEX = 0x0800
+
 
 def decode(s):
     return s.decode('utf-8', errors='replace')
@@ -59,18 +83,373 @@ def _select_blocks(blocks, begsam, endsam):
         yield (beg_in_dat, end_in_dat), blk, (beg_in_blk, end_in_blk)
 
 
+def read_memmap(filename, chan, begsam, endsam, shape, datatype, offset=0,
+                order='F', dtype_out='float64'):
+    """Read some channels from a binary file with all the samples of all the
+    channels, using a memory map.
+
+    Parameters
+    ----------
+    filename : str or Path
+        binary file
+    chan : list of int
+        index (indices) of the channels to read
+    begsam : int
+        index of the first sample
+    endsam : int
+        index of the last sample (not included)
+    shape : tuple of int
+        number of channels and number of samples in the file
+    datatype : str or numpy.dtype
+        data type of the values on disk (f.e. '<i2')
+    offset : int
+        position of the first value in the file (in bytes)
+    order : str
+        'F' if the file is multiplexed (all the channels of the first sample,
+        then all the channels of the second sample, etc.) or 'C' if the file
+        contains all the samples of the first channel, then all the samples of
+        the second channel, etc.
+    dtype_out : str or numpy.dtype
+        data type of the output
+
+    Returns
+    -------
+    numpy.ndarray
+        A 2d matrix, with dimension chan X samples (NaN outside the data)
+
+    Notes
+    -----
+    Only the values of the selected channels are converted to dtype_out, so
+    that reading a few channels of a large file is fast and uses little memory.
+    For multiplexed files, only the samples of interest are mapped.
+    """
+    n_chan, n_samples = shape
+    dat = empty((len(chan), endsam - begsam), dtype=dtype_out)
+    dat.fill(NaN)
+
+    begpos = max(begsam, 0)
+    endpos = min(endsam, n_samples)
+    if begpos >= endpos:
+        return dat
+
+    if order == 'F':
+        x = memmap(str(filename), dtype=datatype, mode='r',
+                   shape=(endpos - begpos, n_chan),
+                   offset=offset + begpos * n_chan * dtype(datatype).itemsize)
+        x = x[:, chan].T
+    else:
+        x = memmap(str(filename), dtype=datatype, mode='r',
+                   shape=(n_chan, n_samples), offset=offset)
+        x = x[chan, begpos:endpos]
+
+    dat[:, begpos - begsam:endpos - begsam] = x
+    return dat
+
+
+def read_mat5_memmap(filename, path):
+    """Memory-map a numeric array in a MAT-file (v5), without loading the
+    file.
+
+    Parameters
+    ----------
+    filename : str or Path
+        MAT-file (saved with '-v6' or '-v7', f.e. with scipy.io.savemat)
+    path : list of str or int
+        name of the variable, followed by the name of the fields (for structs)
+        or the index of the element (for cell arrays) to reach the array. For
+        example, ['data', 'trial', 0] for data.trial{1}.
+
+    Returns
+    -------
+    numpy.memmap or None
+        the array (read-only, with the same dimensions as in MATLAB) or None if
+        the array cannot be memory-mapped (f.e. if the variable is compressed
+        or the array is complex).
+
+    Notes
+    -----
+    Only the first element of struct arrays is used.
+    """
+    with open(str(filename), 'rb') as f:
+        found = _find_mat5_matrix(f, path)
+        if found is None:
+            return None
+        matrix, endian = found
+        array_info = _read_mat5_numeric(f, matrix, endian)
+        if array_info is None:
+            return None
+        datatype, dims, data_pos = array_info
+
+    return memmap(str(filename), dtype=datatype, mode='r', offset=data_pos,
+                  shape=tuple(dims), order='F')
+
+
+def read_mat5_value(filename, path):
+    """Read a small value in a MAT-file (v5), without loading the file.
+
+    Parameters
+    ----------
+    filename : str or Path
+        MAT-file (saved with '-v6' or '-v7', f.e. with scipy.io.savemat)
+    path : list of str or int
+        name of the variable, followed by the name of the fields (for structs)
+        or the index of the element (for cell arrays), as in read_mat5_memmap.
+
+    Returns
+    -------
+    numpy.ndarray or str or list or None
+        numeric arrays are returned as ndarray (with the same dimensions as in
+        MATLAB), char arrays as str, cell arrays as list of their elements and
+        struct arrays as list of dict (in column-major order). It returns None
+        if the value cannot be read (f.e. if the variable is compressed or it
+        contains other types). In struct arrays, the fields which cannot be
+        read are None.
+
+    Notes
+    -----
+    Use it for the metadata (f.e. the sampling frequency or the channel labels)
+    and use read_mat5_memmap for the data.
+    """
+    with open(str(filename), 'rb') as f:
+        found = _find_mat5_matrix(f, path)
+        if found is None:
+            return None
+        matrix, endian = found
+        return _read_mat5_value(f, matrix, endian)
+
+
 def read_hdf5_chan_name(f, hdf5_labels):
     # some hdf5 magic
     # https://groups.google.com/forum/#!msg/h5py/FT7nbKnU24s/NZaaoLal9ngJ
     chan_name = []
-    for l in hdf5_labels.value.flat:
+    for l in hdf5_labels[()].flat:
         chan_name.append(read_hdf5_str(f[l]))
     return chan_name
 
 
 def read_hdf5_str(value):
-    datfile = ''.join([chr(x) for x in value.value])
+    datfile = ''.join([chr(x) for x in value[()].flat])
     if datfile == '\x00\x00':
         return ''
     else:
         return datfile
+
+
+def _read_mat5_tag(f, pos, endian):
+    """Read the tag of one data element in a MAT-file (v5).
+
+    Returns
+    -------
+    int
+        data type
+    int
+        number of bytes of the data
+    int
+        position of the data
+    int
+        position of the next data element (the data are padded to 8 bytes)
+    """
+    f.seek(pos)
+    mtype, n_bytes = unpack(endian + 'II', f.read(8))
+    if mtype >> 16:  # small data element (tag and data in 8 bytes)
+        return mtype & 0xffff, mtype >> 16, pos + 4, pos + 8
+    return mtype, n_bytes, pos + 8, pos + 8 + (n_bytes + 7) // 8 * 8
+
+
+def _read_mat5_matrix(f, pos, endian):
+    """Read the beginning of an array in a MAT-file (v5).
+
+    Returns
+    -------
+    int
+        array class
+    tuple of int
+        dimensions
+    str
+        name of the array (empty for fields and cells)
+    int
+        position of the content of the array
+    bool
+        whether the array is complex
+    """
+    _, _, data_pos, pos = _read_mat5_tag(f, pos, endian)
+    f.seek(data_pos)
+    flags = unpack(endian + 'I', f.read(4))[0]
+
+    _, n_bytes, data_pos, pos = _read_mat5_tag(f, pos, endian)
+    f.seek(data_pos)
+    dims = unpack(endian + str(n_bytes // 4) + 'i', f.read(n_bytes))
+
+    _, n_bytes, data_pos, pos = _read_mat5_tag(f, pos, endian)
+    f.seek(data_pos)
+    name = f.read(n_bytes).decode('latin-1')
+
+    return flags & 0xff, dims, name, pos, bool(flags & MAT5_COMPLEX)
+
+
+def _find_mat5_matrix(f, path):
+    """Find an array in a MAT-file (v5).
+
+    Parameters
+    ----------
+    f : file
+        MAT-file opened in binary mode
+    path : list of str or int
+        as in read_mat5_memmap
+
+    Returns
+    -------
+    tuple or None
+        the array (as returned by _read_mat5_matrix) and the endianness of the
+        file, or None if the array cannot be found
+    """
+    header = f.read(MAT5_HEADER)
+    if len(header) < MAT5_HEADER or header[126:128] not in (b'IM', b'MI'):
+        return None
+    endian = '<' if header[126:128] == b'IM' else '>'
+    if unpack(endian + 'H', header[124:126])[0] != MAT5_VERSION:  # f.e. hdf5
+        return None
+    file_size = f.seek(0, SEEK_END)
+
+    # variables at the top level (compressed variables are skipped)
+    pos = MAT5_HEADER
+    while pos + 8 <= file_size:
+        mtype, n_bytes, data_pos, _ = _read_mat5_tag(f, pos, endian)
+        pos = data_pos + n_bytes
+        if mtype != MAT5_MATRIX or n_bytes == 0:
+            continue
+        matrix = _read_mat5_matrix(f, data_pos, endian)
+        if matrix[2] == path[0]:
+            break
+    else:
+        return None
+
+    for key in path[1:]:
+        mclass, dims, _, pos, _ = matrix
+        if isinstance(key, str) and mclass == MAT5_STRUCT:
+            fields, pos = _read_mat5_fields(f, pos, endian)
+            if key not in fields:
+                return None
+            i_elem = fields.index(key)
+
+        elif isinstance(key, int) and mclass == MAT5_CELL:
+            if key >= prod(dims):
+                return None
+            i_elem = key
+
+        else:
+            return None
+
+        for _ in range(i_elem):
+            pos = _read_mat5_tag(f, pos, endian)[3]
+        mtype, n_bytes, data_pos, _ = _read_mat5_tag(f, pos, endian)
+        if mtype != MAT5_MATRIX or n_bytes == 0:
+            return None
+        matrix = _read_mat5_matrix(f, data_pos, endian)
+
+    return matrix, endian
+
+
+def _read_mat5_fields(f, pos, endian):
+    """Read the names of the fields of a struct in a MAT-file (v5).
+
+    Returns
+    -------
+    list of str
+        names of the fields
+    int
+        position of the first field of the first element
+    """
+    _, _, data_pos, pos = _read_mat5_tag(f, pos, endian)
+    f.seek(data_pos)
+    name_len = unpack(endian + 'i', f.read(4))[0]
+    _, n_bytes, data_pos, pos = _read_mat5_tag(f, pos, endian)
+    f.seek(data_pos)
+    names = f.read(n_bytes)
+    fields = [names[i:i + name_len].split(b'\0')[0].decode()
+              for i in range(0, n_bytes, name_len)]
+    return fields, pos
+
+
+def _read_mat5_numeric(f, matrix, endian):
+    """Find the values of a numeric array in a MAT-file (v5).
+
+    Returns
+    -------
+    tuple or None
+        data type, dimensions and position of the values, or None if the array
+        is not a real numeric array
+    """
+    mclass, dims, _, pos, is_complex = matrix
+    if mclass not in MAT5_NUMERIC or is_complex:
+        return None
+    mtype, n_bytes, data_pos, _ = _read_mat5_tag(f, pos, endian)
+    if mtype not in MAT5_DTYPES:
+        return None
+    datatype = dtype(endian + MAT5_DTYPES[mtype])
+    if n_bytes != prod(dims) * datatype.itemsize or n_bytes == 0:
+        return None
+    return datatype, dims, data_pos
+
+
+def _read_mat5_value(f, matrix, endian):
+    """Read a numeric, char, cell or struct array in a MAT-file (v5) into
+    memory.
+
+    Returns
+    -------
+    numpy.ndarray or str or list or None
+        see read_mat5_value
+    """
+    mclass, dims, _, pos, _ = matrix
+
+    if mclass == MAT5_CELL:
+        values = []
+        for _ in range(prod(dims)):
+            mtype, n_bytes, data_pos, pos = _read_mat5_tag(f, pos, endian)
+            if mtype != MAT5_MATRIX or n_bytes == 0:
+                return None
+            one_value = _read_mat5_value(
+                f, _read_mat5_matrix(f, data_pos, endian), endian)
+            if one_value is None:
+                return None
+            values.append(one_value)
+        return values
+
+    if mclass == MAT5_STRUCT:
+        fields, pos = _read_mat5_fields(f, pos, endian)
+        values = []
+        for _ in range(prod(dims)):
+            one_value = {}
+            for field in fields:
+                mtype, n_bytes, data_pos, pos = _read_mat5_tag(f, pos, endian)
+                one_value[field] = None
+                if mtype == MAT5_MATRIX and n_bytes > 0:
+                    one_value[field] = _read_mat5_value(
+                        f, _read_mat5_matrix(f, data_pos, endian), endian)
+            values.append(one_value)
+        return values
+
+    if mclass == MAT5_CHAR:
+        if dims[0] > 1:  # only one line of text
+            return None
+        mtype, n_bytes, data_pos, _ = _read_mat5_tag(f, pos, endian)
+        f.seek(data_pos)
+        raw = f.read(n_bytes)
+        if mtype in MAT5_CHAR_CODECS:
+            return raw.decode(MAT5_CHAR_CODECS[mtype][endian])
+        if mtype in MAT5_DTYPES:  # one character per value
+            codes = frombuffer(raw, dtype=endian + MAT5_DTYPES[mtype])
+            return ''.join(chr(x) for x in codes)
+        return None
+
+    if mclass in MAT5_NUMERIC and prod(dims) == 0:
+        return empty(dims)
+
+    array_info = _read_mat5_numeric(f, matrix, endian)
+    if array_info is None:
+        return None
+    datatype, dims, data_pos = array_info
+    f.seek(data_pos)
+    values = frombuffer(f.read(prod(dims) * datatype.itemsize), dtype=datatype)
+    return values.reshape(dims, order='F')
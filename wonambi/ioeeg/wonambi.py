@@ -47,7 +47,7 @@ class Wonambi:
         return (orig['subj_id'], start_time, orig['s_freq'], orig['chan_name'],
                 orig['n_samples'], orig)
 
-    def return_dat(self, chan, begsam, endsam):
+    def return_dat(self, chan, begsam, endsam, dtype=float64):
         """Return the data as 2D numpy.ndarray.
 
         Parameters
@@ -58,6 +58,8 @@ class Wonambi:
             index of the first sample
         endsam : int
             index of the last sample
+        dtype : str or numpy.dtype
+            data type of the output (f.e. 'float32', to use half the memory)
 
         Returns
         -------
@@ -85,17 +87,17 @@ class Wonambi:
                       shape=self.memshape, order='F')
 
         n_smp = self.memshape[1]
-        dat = data[chan, max((begsam, 0)):min((endsam, n_smp))].astype(float64)
+        dat = data[chan, max((begsam, 0)):min((endsam, n_smp))].astype(dtype)
 
         if begsam < 0:
 
-            pad = empty((dat.shape[0], 0 - begsam))
+            pad = empty((dat.shape[0], 0 - begsam), dtype=dtype)
             pad.fill(NaN)
             dat = c_[pad, dat]
 
         if endsam >= n_smp:
 
-            pad = empty((dat.shape[0], endsam - n_smp))
+            pad = empty((dat.shape[0], endsam - n_smp), dtype=dtype)
             pad.fill(NaN)
             dat = c_[dat, pad]
 
@@ -1,22 +1,27 @@
 """Module to filter the data.
 """
+from functools import lru_cache
 from logging import getLogger
 
 from itertools import product
 
-from numpy import arange, empty, ix_, expand_dims, squeeze
+from numpy import arange, asarray, empty, ix_, expand_dims, squeeze
 from scipy.signal import (iirfilter,
                           iirnotch,
-                          filtfilt,
                           get_window,
                           fftconvolve,
+                          sosfiltfilt,
+                          tf2sos,
                           )
 
 lg = getLogger(__name__)
 
+FILTER_CACHE = 64  # number of filter designs to keep in memory
+
 
 def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
-            ftype='butter', Rs=None, notchfreq=50, notchquality=25):
+            ftype='butter', Rs=None, notchfreq=50, notchquality=25,
+            dtype=None):
     """Design filter and apply it.
 
     Parameters
@@ -37,6 +42,10 @@ def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
         (only for notch) frequency to apply notch filter to (+ harmonics)
     notchquality : int
         (only for notch) Quality factor (see scipy.signal.iirnotch)
+    dtype : str or numpy.dtype, optional
+        data type of the filtered data. If None, it's the same as the data type
+        of the input data (so that single-precision data remain in single
+        precision).
 
     Returns
     -------
@@ -67,6 +76,7 @@ def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
             raise ValueError('cutoff has to be less than Nyquist '
                              'frequency')
         btype = 'bandpass'
+        freq = (low_cut, high_cut)
         Wn = (low_cut / nyquist,
               high_cut / nyquist)
 
@@ -75,6 +85,7 @@ def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
             raise ValueError('cutoff has to be less than Nyquist '
                              'frequency')
         btype = 'highpass'
+        freq = low_cut
         Wn = low_cut / nyquist
 
     elif high_cut is not None:
@@ -82,6 +93,7 @@ def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
             raise ValueError('cutoff has to be less than Nyquist '
                              'frequency')
         btype = 'lowpass'
+        freq = high_cut
         Wn = high_cut / nyquist
 
     if btype is None and ftype != 'notch':
@@ -91,19 +103,31 @@ def filter_(data, axis='time', low_cut=None, high_cut=None, order=4,
         Rs = 40
 
     if ftype == 'notch':
-        b_a = [iirnotch(w0 / nyquist, notchquality) for w0 in arange(notchfreq, nyquist, notchfreq)]
+        # one filter per harmonic, so that the padding stays short
+        all_sos = [design_filter('notch', 2, w0, data.s_freq,
+                                 quality=notchquality)
+                   for w0 in arange(notchfreq, nyquist, notchfreq)]
 
     else:
         lg.debug('order {0: 2}, Wn {1}, btype {2}, ftype {3}'
                  ''.format(order, str(Wn), btype, ftype))
-        b_a = [iirfilter(order, Wn, btype=btype, ftype=ftype, rs=Rs), ]
+        all_sos = [design_filter(ftype, order, freq, data.s_freq,
+                                 btype=btype, rs=Rs), ]
 
     fdata = data._copy()
-    for i in range(data.number_of('trial')):
-        x = data.data[i]
-        for b, a in b_a:
-            x = filtfilt(b, a, x, axis=data.index_of(axis))
-        fdata.data[i] = x
+    if data.dense:
+        # filter all the trials at once (trial is the first dimension)
+        x = data.data
+        for sos in all_sos:
+            x = sosfiltfilt(sos, x, axis=data.index_of(axis) + 1)
+        fdata.data = x.astype(dtype or data.data.dtype, copy=False)
+
+    else:
+        for i in range(data.number_of('trial')):
+            x = data.data[i]
+            for sos in all_sos:
+                x = sosfiltfilt(sos, x, axis=data.index_of(axis))
+            fdata.data[i] = x.astype(dtype or data.data[i].dtype, copy=False)
 
     return fdata
 
@@ -174,3 +198,59 @@ def convolve(data, window, axis='time', length=1):
         fdata.data[0] = dat
 
     return fdata
+
+
+def design_filter(ftype, order, freq, s_freq, btype='bandpass', rs=None,
+                  quality=None):
+    """Design an IIR filter as second-order sections (designs are cached).
+
+    Parameters
+    ----------
+    ftype : str
+        'butter', 'cheby1', 'cheby2', 'ellip', 'bessel', or 'notch'
+    order : int
+        filter order (ignored for notch)
+    freq : float or tuple of float
+        cutoff frequency (or frequencies, for bandpass), in Hz. For notch, the
+        frequency to remove.
+    s_freq : float
+        sampling frequency
+    btype : str
+        'bandpass', 'lowpass', 'highpass', or 'bandstop' (ignored for notch)
+    rs : float, optional
+        minimum attenuation in the stop band (in dB, for cheby2 and ellip)
+    quality : float, optional
+        (only for notch) quality factor (see scipy.signal.iirnotch)
+
+    Returns
+    -------
+    ndarray
+        n_sections X 6 matrix, to use with sosfiltfilt
+
+    Notes
+    -----
+    Designs are kept in memory for the last FILTER_CACHE combinations of
+    parameters, so that repeated calls (f.e. one per channel or one per
+    trial) don't need to design the same filter again. The output is a copy
+    of the cached design (sosfilt does not accept read-only arrays).
+    """
+    freq = tuple(float(f) for f in asarray(freq).ravel())
+    if len(freq) == 1:
+        freq = freq[0]
+    return _design_sos(ftype, int(order), freq, float(s_freq), btype, rs,
+                       quality).copy()
+
+
+@lru_cache(maxsize=FILTER_CACHE)
+def _design_sos(ftype, order, freq, s_freq, btype, rs, quality):
+    """Cached version of design_filter (all the arguments are hashable)."""
+    nyquist = s_freq / 2
+    if ftype == 'notch':
+        sos = tf2sos(*iirnotch(freq / nyquist, quality))
+    else:
+        Wn = asarray(freq) / nyquist
+        sos = iirfilter(order, Wn, btype=btype, ftype=ftype, rs=rs,
+                        output='sos')
+
+    sos.flags.writeable = False
+    return sos
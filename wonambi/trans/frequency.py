@@ -1,29 +1,39 @@
 """Module to compute frequency representation.
 """
 from copy import deepcopy
+from functools import lru_cache
 from logging import getLogger
-from functools import partial
-from multiprocessing import Pool
 
-from numpy import (arange, array, asarray, copy, empty, exp, log, max, mean,
-                   median, moveaxis, pi, real, reshape, sqrt, swapaxes, zeros)
+from numpy import (arange, array, asarray, complex64, copy, empty, exp,
+                   float32, iscomplexobj, log, max, mean, median, pi, real,
+                   result_type, sqrt, swapaxes, zeros)
 from numpy.linalg import norm
 import numpy.fft as np_fft
 from scipy import fftpack
-from scipy.signal import windows, get_window, fftconvolve
+from scipy.signal import windows, get_window
 from scipy.signal import detrend as detrend_func
 
 from .extern.dpss import dpss_windows  # this will be in scipy v1.1
 from ..datatype import ChanFreq, ChanTimeFreq, ChanTime
 from .select import _create_subepochs
+from ..utils import MissingDependency
+from ..utils.pool import get_shared, shared_pool, SharedArray
+
+try:
+    from scipy.fft import fft as sp_fft, rfft as sp_rfft  # scipy >= 1.4
+except ImportError as err:
+    sp_fft = sp_rfft = MissingDependency(err)
 
 lg = getLogger(__name__)
 
+TAPER_CACHE = 64  # number of sets of tapers to keep in memory
+MORLET_BATCH = 2 ** 22  # max number of values in one batch of inverse FFT
+
 
 def frequency(data, output='spectraldensity', scaling='power', sides='one',
               taper=None, halfbandwidth=3, NW=None, duration=None,
               overlap=0.5, step=None, detrend='linear', n_fft=None,
-              log_trans=False, centend='mean'):
+              log_trans=False, centend='mean', dtype=None, workers=None):
     """Compute the
     power spectral density (PSD, output='spectraldensity', scaling='power'), or
     energy spectral density (ESD, output='spectraldensity', scaling='energy') or
@@ -74,6 +84,13 @@ def frequency(data, output='spectraldensity', scaling='power', sides='one',
     centend : str
         (only if duration is not None). Central tendency measure to use, either
         mean (arithmetic) or median.
+    dtype : str or numpy.dtype, optional
+        precision of the output ('float32' or 'float64', the complex output
+        uses the corresponding complex type). If None, it's the same as the
+        precision of the input data.
+    workers : int, optional
+        if specified, the FFT is computed by scipy.fft with this number of
+        workers (-1 means all the CPUs), otherwise by numpy.fft
 
     Returns
     -------
@@ -100,6 +117,9 @@ def frequency(data, output='spectraldensity', scaling='power', sides='one',
 
     Use of log or median for Welch's method is included based on
     recommendations from Izhikevich et al., bioRxiv, 2018.
+
+    The FFT is always computed in double precision, dtype only affects the
+    values which are returned.
     """
     if output not in ('spectraldensity', 'complex', 'csd'):
         raise TypeError(f'output can be "spectraldensity", "complex" or "csd",'
@@ -115,6 +135,7 @@ def frequency(data, output='spectraldensity', scaling='power', sides='one',
     if output == 'csd' and data.number_of('chan') != 2:
         raise ValueError('CSD can only be computed between two channels')
 
+    nperseg = nstep = None
     if duration is not None:
         nperseg = int(duration * data.s_freq)
         if step is not None:
@@ -132,33 +153,24 @@ def frequency(data, output='spectraldensity', scaling='power', sides='one',
         freq.axis['taper'] = empty(data.number_of('trial'), dtype='O')
     freq.data = empty(data.number_of('trial'), dtype='O')
 
+    if data.dense and output != 'csd':
+        # compute all the trials at once (trial is the first dimension)
+        f, Sxx = _frequency_one(data.data, data.s_freq, output, scaling, sides,
+                                taper, halfbandwidth, NW, duration, nperseg,
+                                nstep, detrend, n_fft, log_trans, centend,
+                                dtype, workers)
+        freq.axis['freq'].fill(f)
+        if output == 'complex':
+            freq.axis['taper'].fill(arange(Sxx.shape[-1]))
+        freq.data = Sxx
+
+        return freq
+
     for i in range(data.number_of('trial')):
-        x = data(trial=i)
-        if duration is not None:
-            x = _create_subepochs(x, nperseg, nstep)
-
-        f, Sxx = _fft(x,
-                      s_freq=data.s_freq,
-                      detrend=detrend,
-                      taper=taper,
-                      output=output,
-                      sides=sides,
-                      scaling=scaling,
-                      halfbandwidth=halfbandwidth,
-                      NW=NW,
-                      n_fft=n_fft)
-
-        if log_trans:
-            Sxx = log(Sxx)
-
-        if duration is not None:
-            if centend == 'mean':
-                Sxx = Sxx.mean(axis=-2)
-            elif centend == 'median':
-                Sxx = median(Sxx, axis=-2)
-            else:
-                raise ValueError('Invalid central tendency measure. '
-                                 'Use mean or median.')
+        f, Sxx = _frequency_one(data(trial=i, copy=False), data.s_freq, output,
+                                scaling, sides, taper, halfbandwidth, NW,
+                                duration, nperseg, nstep, detrend, n_fft,
+                                log_trans, centend, dtype, workers)
 
         freq.axis['freq'][i] = f
         if output == 'complex':
@@ -171,7 +183,7 @@ def frequency(data, output='spectraldensity', scaling='power', sides='one',
     return freq
 
 
-def timefrequency(data, method='morlet', **options):
+def timefrequency(data, method='morlet', n_jobs=None, dtype=None, **options):
     """Compute the power spectrum over time.
 
     Parameters
@@ -184,6 +196,14 @@ def timefrequency(data, method='morlet', **options):
         'spectrogram' (corresponds to 'spectraldensity' in frequency()),
         'stft' (short-time fourier transform, corresponds to 'complex' in
         frequency())
+    n_jobs : int, optional
+        (only for 'morlet') number of processes which compute the channels in
+        parallel. If None, it uses all the CPUs. If 1, it does not start any
+        process.
+    dtype : str or numpy.dtype, optional
+        precision of the output ('float32' or 'float64', the complex output
+        uses the corresponding complex type). If None, it's the same as the
+        precision of the input data.
     options : dict
         options depend on the method used, see below.
 
@@ -210,6 +230,12 @@ def timefrequency(data, method='morlet', **options):
     It uses sampling frequency as specified in s_freq, it does not
     recompute the sampling frequency based on the time axis.
 
+    For method 'morlet', the convolution is computed in the frequency domain:
+    the FFT of each channel is computed only once and multiplied by the FFT of
+    all the wavelets. The channels are computed by a pool of processes, which
+    is the same for all the trials and which reads the data from shared
+    memory.
+
     For method 'morlet', the following options should be specified:
         foi : ndarray or list or tuple
             vector with frequency of interest
@@ -237,6 +263,8 @@ def timefrequency(data, method='morlet', **options):
             duration of the window to compute the power spectrum, in s
         overlap : int
             amount of overlap (0 -> no overlap, 1 -> full overlap)
+        workers : int
+            number of workers for scipy.fft (if None, it uses numpy.fft)
     """
     implemented_methods = ('morlet',
                            'spectrogram',  # this is output spectraldensity
@@ -266,6 +294,7 @@ def timefrequency(data, method='morlet', **options):
                            'scaling': 'power',
                            'halfbandwidth': 2,
                            'NW': None,
+                           'workers': None,
                            }
 
     default_options.update(options)
@@ -290,27 +319,22 @@ def timefrequency(data, method='morlet', **options):
 
         wavelets = _create_morlet(deepcopy(options), data.s_freq)
 
-        for i in range(data.number_of('trial')):
+        all_x = [data(trial=i, copy=False)
+                 for i in range(data.number_of('trial'))]
+        x_dtype = result_type(*all_x)
+        tf_dtype = _output_dtype(x_dtype if dtype is None else dtype, True)
+
+        if n_jobs == 1:
+            all_tf = (_morlet_transform(x, wavelets, tf_dtype) for x in all_x)
+        else:
+            all_tf = _morlet_transform_pool(all_x, wavelets, x_dtype,
+                                            tf_dtype, n_jobs)
+
+        for i, tf in enumerate(all_tf):
             lg.info('Processing trial # {0: 6}'.format(i))
             timefreq.axis['freq'][i] = array(options['foi'])
             timefreq.axis['time'][i] = data.axis['time'][i]
-
-            timefreq.data[i] = empty((data.number_of('chan')[i],
-                                      data.number_of('time')[i],
-                                      len(options['foi'])),
-                                     dtype='complex')
-
-            data_i = data(trial=i)
-            args = []
-            for i_chan in range(data.number_of('chan')[i]):
-                for wavelet in wavelets:
-                    args.append((i_chan, wavelet))
-
-            with Pool() as p:
-                result = p.starmap(partial(_convolve, dat=data_i), args)
-
-            tf = reshape(array(result), (data.number_of('chan')[i], len(wavelets), -1))
-            timefreq.data[i] = moveaxis(tf, 2, 1)
+            timefreq.data[i] = tf
 
     elif method in ('spectrogram', 'stft'):  # TODO: add timeskip
         nperseg = int(options['duration'] * data.s_freq)
@@ -326,7 +350,7 @@ def timefrequency(data, method='morlet', **options):
 
         for i in range(data.number_of('trial')):
             t = _create_subepochs(data.time[i], nperseg, nstep).mean(axis=1)
-            x = _create_subepochs(data(trial=i), nperseg, nstep)
+            x = _create_subepochs(data(trial=i, copy=False), nperseg, nstep)
 
             f, Sxx = _fft(x,
                           s_freq=data.s_freq,
@@ -336,7 +360,11 @@ def timefrequency(data, method='morlet', **options):
                           sides=options['sides'],
                           scaling=options['scaling'],
                           halfbandwidth=options['halfbandwidth'],
-                          NW=options['NW'])
+                          NW=options['NW'],
+                          workers=options['workers'])
+
+            if dtype is not None:
+                Sxx = Sxx.astype(_output_dtype(dtype, iscomplexobj(Sxx)))
 
             timefreq.axis['time'][i] = t
             timefreq.axis['freq'][i] = f
@@ -541,8 +569,56 @@ def morlet(freq, s_freq, ratio=5, sigma_f=None, dur_in_sd=4, dur_in_s=None,
     return w
 
 
+def _frequency_one(x, s_freq, output, scaling, sides, taper, halfbandwidth,
+                   NW, duration, nperseg, nstep, detrend, n_fft, log_trans,
+                   centend, dtype=None, workers=None):
+    """Compute the spectrum of one trial (or of all the trials, if x has trial
+    as first dimension). See frequency for the parameters."""
+    if dtype is None:
+        dtype = x.dtype
+
+    if duration is not None:
+        x = _create_subepochs(x, nperseg, nstep)
+
+    f, Sxx = _fft(x,
+                  s_freq=s_freq,
+                  detrend=detrend,
+                  taper=taper,
+                  output=output,
+                  sides=sides,
+                  scaling=scaling,
+                  halfbandwidth=halfbandwidth,
+                  NW=NW,
+                  n_fft=n_fft,
+                  workers=workers)
+
+    if log_trans:
+        Sxx = log(Sxx)
+
+    if duration is not None:
+        if centend == 'mean':
+            Sxx = Sxx.mean(axis=-2)
+        elif centend == 'median':
+            Sxx = median(Sxx, axis=-2)
+        else:
+            raise ValueError('Invalid central tendency measure. '
+                             'Use mean or median.')
+
+    return f, Sxx.astype(_output_dtype(dtype, iscomplexobj(Sxx)), copy=False)
+
+
+def _output_dtype(dtype, is_complex):
+    """Data type of the output, with the same precision as dtype (at least
+    single precision), but complex if the output is complex."""
+    if is_complex:
+        return result_type(dtype, complex64)
+    else:
+        return result_type(dtype, float32)
+
+
 def _fft(x, s_freq, detrend='linear', taper=None, output='spectraldensity',
-         sides='one', scaling='power', halfbandwidth=4, NW=None, n_fft=None):
+         sides='one', scaling='power', halfbandwidth=4, NW=None, n_fft=None,
+         workers=None):
     """
     Core function taking care of computing the power spectrum / power spectral
     density or the complex representation.
@@ -578,6 +654,9 @@ def _fft(x, s_freq, detrend='linear', taper=None, output='spectraldensity',
         Length of FFT, in samples. If less than input axis, input is cropped.
         If longer than input axis, input is padded with zeros. If None, FFT
         length set to axis length.
+    workers : int, optional
+        if specified, the FFT is computed by scipy.fft with this number of
+        workers (-1 means all the CPUs), otherwise by numpy.fft
 
     Returns
     -------
@@ -621,6 +700,11 @@ def _fft(x, s_freq, detrend='linear', taper=None, output='spectraldensity',
     taper (even for the boxcar or hann taper). This is useful for multitaper
     analysis (DPSS), where it doesn't make sense to average complex results.
 
+    The tapers and the frequency vector are cached (see _tapers and
+    _fft_freqs), because they only depend on the number of samples and on the
+    parameters, not on the data. The tapers are read-only, while the frequency
+    vector is copied, because it ends up in the axis of the output.
+
     .. _wikipedia:
         https://en.wikipedia.org/wiki/Spectral_density
 
@@ -639,40 +723,25 @@ def _fft(x, s_freq, detrend='linear', taper=None, output='spectraldensity',
     if n_fft is None:
         n_fft = n_smp
 
-    if sides == 'one':
-        freqs = np_fft.rfftfreq(n_fft, 1 / s_freq)
-    elif sides == 'two':
-        freqs = fftpack.fftfreq(n_fft, 1 / s_freq)
+    freqs = _fft_freqs(n_fft, s_freq, sides).copy()
 
     if taper is None:
         taper = 'boxcar'
 
-    if taper == 'dpss':
-        if NW is None:
-            NW = halfbandwidth * n_smp / s_freq
-        tapers, eig = dpss_windows(n_smp, NW, 2 * NW - 1)
-        if scaling == 'chronux':
-            tapers *= sqrt(s_freq)
-
-    else:
-        if taper == 'hann':
-            tapers = windows.hann(n_smp, sym=False)[None, :]
-        else:
-            # TODO: it'd be nice to use sym=False if possible, but the difference is very small
-            tapers = get_window(taper, n_smp)[None, :]
-
-        if scaling == 'energy':
-            rms = sqrt(mean(tapers ** 2))
-            tapers /= rms * sqrt(n_smp)
-        elif scaling != 'chronux':
-            # idk how chronux treats other windows apart from dpss
-            tapers /= norm(tapers)
+    if taper == 'dpss' and NW is None:
+        NW = halfbandwidth * n_smp / s_freq
+    tapers = _tapers(taper, n_smp, s_freq, scaling, NW)
 
     if detrend is not None:
         x = detrend_func(x, axis=axis, type=detrend)
     tapered = tapers * x[..., None, :]
 
-    if sides == 'one':
+    if workers is not None:
+        if sides == 'one':
+            result = sp_rfft(tapered, n=n_fft, workers=workers)
+        elif sides == 'two':
+            result = sp_fft(tapered, n=n_fft, workers=workers)
+    elif sides == 'one':
         result = np_fft.rfft(tapered, n=n_fft)
     elif sides == 'two':
         result = fftpack.fft(tapered, n=n_fft)
@@ -720,6 +789,205 @@ def _fft(x, s_freq, detrend='linear', taper=None, output='spectraldensity',
     return freqs, result
 
 
-def _convolve(i_chan, wavelet, dat):
-    tf = fftconvolve(dat[i_chan, :], wavelet, 'same')
+@lru_cache(maxsize=TAPER_CACHE)
+def _tapers(taper, n_smp, s_freq, scaling, NW=None):
+    """Compute the tapers for the FFT (cached, so don't modify the output).
+
+    Parameters
+    ----------
+    taper : str
+        Taper to use, commonly used tapers are 'boxcar', 'hann', 'dpss'
+    n_smp : int
+        number of samples
+    s_freq : int
+        sampling frequency
+    scaling : str
+        'power', 'energy', 'fieldtrip', 'chronux'
+    NW : float
+        (only if taper='dpss') Normalized half bandwidth. The number of DPSS
+        tapers is 2 * NW - 1.
+
+    Returns
+    -------
+    ndarray
+        n_tapers X n_smp matrix (read-only)
+    """
+    if taper == 'dpss':
+        tapers, eig = dpss_windows(n_smp, NW, 2 * NW - 1)
+        if scaling == 'chronux':
+            tapers *= sqrt(s_freq)
+
+    else:
+        if taper == 'hann':
+            tapers = windows.hann(n_smp, sym=False)[None, :]
+        else:
+            # TODO: it'd be nice to use sym=False if possible, but the difference is very small
+            tapers = get_window(taper, n_smp)[None, :]
+
+        if scaling == 'energy':
+            rms = sqrt(mean(tapers ** 2))
+            tapers /= rms * sqrt(n_smp)
+        elif scaling != 'chronux':
+            # idk how chronux treats other windows apart from dpss
+            tapers /= norm(tapers)
+
+    tapers.flags.writeable = False
+    return tapers
+
+
+@lru_cache(maxsize=TAPER_CACHE)
+def _fft_freqs(n_fft, s_freq, sides):
+    """Frequency vector of the FFT (cached, so don't modify the output)."""
+    if sides == 'one':
+        freqs = np_fft.rfftfreq(n_fft, 1 / s_freq)
+    elif sides == 'two':
+        freqs = fftpack.fftfreq(n_fft, 1 / s_freq)
+
+    freqs.flags.writeable = False
+    return freqs
+
+
+def _wavelet_spectra(wavelets, n_smp):
+    """Compute the FFT of the wavelets, with enough zero-padding for a linear
+    convolution with n_smp samples.
+
+    Parameters
+    ----------
+    wavelets : list of ndarray
+        complex wavelets (they can have different lengths)
+    n_smp : int
+        number of samples of the signal
+
+    Returns
+    -------
+    ndarray
+        n_wavelets X n_fft matrix with the FFT of each wavelet
+    list of int
+        for each wavelet, the first sample of the full convolution which
+        corresponds to the first sample of the signal (as fftconvolve, 'same')
+    """
+    n_fft = fftpack.next_fast_len(n_smp + max([len(w) for w in wavelets]) - 1)
+
+    spectra = empty((len(wavelets), n_fft), dtype='complex')
+    for i, w in enumerate(wavelets):
+        spectra[i] = np_fft.fft(w, n_fft)
+    offsets = [(len(w) - 1) // 2 for w in wavelets]
+
+    return spectra, offsets
+
+
+def _convolve_wavelets(x, spectra, offsets, out):
+    """Convolve one channel with all the wavelets.
+
+    Parameters
+    ----------
+    x : 1d ndarray
+        data of one channel
+    spectra : ndarray
+        n_wavelets X n_fft matrix with the FFT of each wavelet
+    offsets : list of int
+        first sample of the convolution for each wavelet
+    out : ndarray
+        time X n_wavelets matrix, where the output is stored
+
+    Notes
+    -----
+    The inverse FFT is computed for multiple wavelets at once, but the number
+    of wavelets in each batch is limited by MORLET_BATCH (in number of
+    values), to limit the memory usage.
+    """
+    n_smp = x.shape[0]
+    n_fft = spectra.shape[1]
+    x_fft = np_fft.fft(x, n_fft)
+
+    batch = max((MORLET_BATCH // n_fft, 1))
+    for i0 in range(0, spectra.shape[0], batch):
+        tf = np_fft.ifft(spectra[i0:i0 + batch] * x_fft, axis=1)
+        for i, one_tf in enumerate(tf, start=i0):
+            out[:, i] = one_tf[offsets[i]:offsets[i] + n_smp]
+
+
+def _morlet_transform(x, wavelets, dtype):
+    """Compute the wavelet transform of one trial, in this process.
+
+    Parameters
+    ----------
+    x : ndarray
+        chan X time matrix
+    wavelets : list of ndarray
+        complex wavelets
+    dtype : numpy.dtype
+        complex data type of the output
+
+    Returns
+    -------
+    ndarray
+        chan X time X freq matrix
+    """
+    spectra, offsets = _wavelet_spectra(wavelets, x.shape[1])
+    tf = empty((x.shape[0], x.shape[1], len(wavelets)), dtype=dtype)
+    for i_chan in range(x.shape[0]):
+        _convolve_wavelets(x[i_chan], spectra, offsets, tf[i_chan])
     return tf
+
+
+def _morlet_transform_pool(all_x, wavelets, x_dtype, tf_dtype, n_jobs):
+    """Compute the wavelet transform of each trial, using a pool of processes.
+
+    Parameters
+    ----------
+    all_x : list of ndarray
+        for each trial, chan X time matrix
+    wavelets : list of ndarray
+        complex wavelets
+    x_dtype : numpy.dtype
+        real data type of the input
+    tf_dtype : numpy.dtype
+        complex data type of the output
+    n_jobs : int
+        number of processes (if None, all the CPUs)
+
+    Yields
+    ------
+    ndarray
+        for each trial, chan X time X freq matrix
+
+    Notes
+    -----
+    The input and output of the largest trial are allocated only once in shared
+    memory, so that the data are not sent to each process (only the index of
+    the channel is). The processes only compute the FFT of the wavelets when the
+    number of samples changes.
+    """
+    n_max = int(max([x.size for x in all_x]))
+    shared_x = SharedArray(n_max, x_dtype)
+    shared_tf = SharedArray(n_max * len(wavelets), tf_dtype)
+
+    with shared_pool(n_jobs, wavelets=wavelets, x=shared_x,
+                     tf=shared_tf) as p:
+        for x in all_x:
+            n_chan, n_smp = x.shape
+            shared_x.array(x.shape)[:] = x
+
+            p.map(_morlet_one_chan,
+                  [(n_chan, n_smp, i_chan) for i_chan in range(n_chan)])
+
+            yield shared_tf.array((n_chan, n_smp, len(wavelets))).copy()
+
+
+def _morlet_one_chan(args):
+    """Compute the wavelet transform of one channel, reading and writing the
+    data in shared memory."""
+    n_chan, n_smp, i_chan = args
+    shared = get_shared()
+    wavelets = shared['wavelets']
+
+    if shared.get('n_smp') != n_smp:
+        shared['spectra'] = _wavelet_spectra(wavelets, n_smp)
+        shared['n_smp'] = n_smp
+    spectra, offsets = shared['spectra']
+
+    x = shared['x'].array((n_chan, n_smp))
+    tf = shared['tf'].array((n_chan, n_smp, len(wavelets)))
+
+    _convolve_wavelets(x[i_chan], spectra, offsets, tf[i_chan])
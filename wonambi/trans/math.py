@@ -165,9 +165,6 @@ def math(data, operator=None, operator_name=None, axis=None):
 
     output = data._copy()
 
-    if axis is not None:
-        idx_axis = data.index_of(axis)
-
     first_op = True
     for op in operations:
         #lg.info('running operator: ' + op['name'])
@@ -176,31 +173,34 @@ def math(data, operator=None, operator_name=None, axis=None):
         if func == mode:
             func = lambda x, axis: mode(x, axis=axis)[0]
 
-        for i in range(output.number_of('trial')):
-
-            # don't copy original data, but use data if it's the first operation
-            if first_op:
-                x = data(trial=i)
+        idx_axis = None
+        if op['on_axis']:
+            try:
+                idx_axis = output.index_of(axis)
+            except ValueError:
+                raise ValueError('The axis ' + axis + ' does not '
+                                 'exist in [' +
+                                 ', '.join(list(output.axis.keys())) + ']')
+
+        if data.dense:
+            # run on all the trials at once (trial is the first dimension)
+            x = data.data if first_op else output.data
+            if idx_axis is None:
+                output.data = _run_operator(func, op, x, None)
             else:
-                x = output(trial=i)
-
-            if op['on_axis']:
-                lg.debug('running ' + op['name'] + ' on ' + str(idx_axis))
+                output.data = _run_operator(func, op, x, idx_axis + 1)
 
-                try:
-                    if func == diff:
-                        lg.debug('Diff has one-point of zero padding')
-                        x = _pad_one_axis_one_value(x, idx_axis)
-                    output.data[i] = func(x, axis=idx_axis)
+        else:
+            for i in range(output.number_of('trial')):
 
-                except IndexError:
-                    raise ValueError('The axis ' + axis + ' does not '
-                                     'exist in [' +
-                                     ', '.join(list(data.axis.keys())) + ']')
+                # don't copy original data, but use data if it's the first
+                # operation
+                if first_op:
+                    x = data(trial=i, copy=False)
+                else:
+                    x = output(trial=i, copy=False)
 
-            else:
-                lg.debug('running ' + op['name'] + ' on each datapoint')
-                output.data[i] = func(x)
+                output.data[i] = _run_operator(func, op, x, idx_axis)
 
         first_op = False
 
@@ -209,6 +209,21 @@ def math(data, operator=None, operator_name=None, axis=None):
 
     return output
 
+
+def _run_operator(func, op, x, idx_axis):
+    """Run one operator on the data of one trial (or of all the trials)."""
+    if op['on_axis']:
+        lg.debug('running ' + op['name'] + ' on ' + str(idx_axis))
+        if func == diff:
+            lg.debug('Diff has one-point of zero padding')
+            x = _pad_one_axis_one_value(x, idx_axis)
+        return func(x, axis=idx_axis)
+
+    else:
+        lg.debug('running ' + op['name'] + ' on each datapoint')
+        return func(x)
+
+
 def get_descriptives(data):
     """Get mean, SD, and mean and SD of log values.
 
@@ -16,7 +16,7 @@ lg = getLogger(__name__)
 
 
 def montage(data, ref_chan=None, ref_to_avg=False, bipolar=None,
-            method='average'):
+            method='average', dtype=None):
     """Apply linear transformation to the channels.
 
     Parameters
@@ -35,6 +35,10 @@ def montage(data, ref_chan=None, ref_to_avg=False, bipolar=None,
         average across the channels selected as reference (it can be all) and
         subtract it from each channel. 'regression' keeps the residuals after
         regressing out the mean across channels.
+    dtype : str or numpy.dtype, optional
+        data type of the output data. If None, it's the same as the data type
+        of the input data (so that single-precision data remain in single
+        precision).
 
     Returns
     -------
@@ -78,21 +82,24 @@ def montage(data, ref_chan=None, ref_to_avg=False, bipolar=None,
                 if ref_to_avg:
                     ref_chan = data.axis['chan'][i]
 
-                ref_data = data(trial=i, chan=ref_chan)
+                ref_data = data(trial=i, chan=ref_chan, copy=False)
                 if method == 'average':
-                    mdata.data[i] = (data(trial=i) - mean(ref_data, axis=idx_chan))
+                    mdata.data[i] = (data(trial=i, copy=False) - mean(ref_data, axis=idx_chan))
                 elif method == 'regression':
-                    mdata.data[i] = compute_average_regress(data(trial=i), idx_chan)
+                    mdata.data[i] = compute_average_regress(data(trial=i, copy=False), idx_chan)
 
             elif bipolar:
 
                 if not data.index_of('chan') == 0:
                     raise ValueError('For matrix multiplication to work, '
                                      'the first dimension should be chan')
-                mdata.data[i] = dot(trans, data(trial=i))
+                mdata.data[i] = dot(trans, data(trial=i, copy=False))
                 mdata.axis['chan'][i] = asarray(chan.return_label(),
                                                 dtype='U')
 
+            mdata.data[i] = mdata.data[i].astype(dtype or data.data[i].dtype,
+                                                 copy=False)
+
     else:
         mdata = data
 
@@ -1,6 +1,7 @@
 """Package containing additional functions and classes, such as:
     - exceptions
     - simulate (functions to create fake data, channels for testing purposes)
+    - pool (pool of processes which share large arrays)
 
 """
 from .exceptions import UnrecognizedFormat, MissingDependency
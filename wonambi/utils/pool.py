@@ -0,0 +1,81 @@
+"""Pool of processes which share large arrays, so that the data are not sent
+to each process.
+"""
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawArray
+
+from numpy import dtype as np_dtype, frombuffer, prod
+
+_SHARED = {}  # values passed to shared_pool, in each process
+
+
+class SharedArray:
+    """Array in shared memory, which can be passed to the processes of a pool
+    (see shared_pool).
+
+    Parameters
+    ----------
+    size : int
+        maximum number of values in the array
+    dtype : numpy.dtype or str
+        data type of the values
+    """
+    def __init__(self, size, dtype):
+        self.size = int(size)
+        self.dtype = np_dtype(dtype)
+        self.raw = RawArray('b', max(self.size * self.dtype.itemsize, 1))
+
+    def array(self, shape):
+        """Return the first values in shared memory as ndarray (without copying
+        them).
+
+        Parameters
+        ----------
+        shape : tuple of int
+            shape of the output (it cannot have more than size values)
+
+        Returns
+        -------
+        ndarray
+            values in shared memory (changes are visible to all the processes)
+        """
+        return frombuffer(self.raw, self.dtype,
+                          count=int(prod(shape))).reshape(shape)
+
+
+def shared_pool(n_jobs, **values):
+    """Create a pool of processes, which receive the values only once.
+
+    Parameters
+    ----------
+    n_jobs : int
+        number of processes (if None, all the CPUs)
+    **values
+        values to pass to each process (f.e. instances of SharedArray, which
+        are not copied, or the options of the analysis)
+
+    Returns
+    -------
+    instance of multiprocessing.Pool
+        pool of processes, where the functions can access the values with
+        get_shared()
+    """
+    return Pool(n_jobs, initializer=_init_shared, initargs=(values, ))
+
+
+def get_shared():
+    """Return the values passed to shared_pool, in the current process.
+
+    Returns
+    -------
+    dict
+        values passed to shared_pool. Functions can also keep values in it,
+        which are reused by the next tasks run in the same process.
+    """
+    return _SHARED
+
+
+def _init_shared(values):
+    """Store the values in each process."""
+    _SHARED.clear()
+    _SHARED.update(values)
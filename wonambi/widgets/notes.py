@@ -20,7 +20,7 @@ from numpy import asarray, floor
 from os.path import basename, splitext
 from pathlib import Path
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon, QColor
 from PyQt5.QtWidgets import (QAbstractItemView,
                              QAction,
@@ -63,6 +63,7 @@ from .modal_widgets import DateTimeDialog
 lg = getLogger(__name__)
 
 MAX_FREQUENCY_OF_INTEREST = 50
+ANNOT_AUTOSAVE = 5  # in s, interval between writes of the annotation file
 
 STAGE_SHORTCUT = ['1', '2', '3', '5', '9', '8', '0', '', '', '7']
 QUALIFIERS = ['Good', 'Poor']
@@ -180,6 +181,9 @@ class Notes(QTabWidget):
         self.config = ConfigNotes(self.update_settings)
 
         self.annot = None
+        self.timer_autosave = QTimer()
+        self.timer_autosave.timeout.connect(self.flush_annot)
+        self.timer_autosave.start(ANNOT_AUTOSAVE * 1000)
 
         self.idx_marker = None
 
@@ -518,11 +522,10 @@ class Notes(QTabWidget):
         new : bool
             if the xml_file should be a new file or an existing one
         """
+        self.flush_annot()
         if new:
             create_empty_annotations(xml_file, self.parent.info.dataset)
-            self.annot = Annotations(xml_file)
-        else:
-            self.annot = Annotations(xml_file)
+        self.annot = Annotations(xml_file, autosave=ANNOT_AUTOSAVE)
 
         self.enable_events()
 
@@ -1653,11 +1656,17 @@ class Notes(QTabWidget):
         if self.annot.export_sleep_stats(fn, lights_off, lights_on) is None:
             self.parent.statusBar().showMessage('No epochs scored as sleep.')
 
+    def flush_annot(self):
+        """Write the pending changes to the annotation file."""
+        if self.annot is not None:
+            self.annot.flush()
+
     def reset(self):
         """Remove all annotations from window."""
         self.idx_annotations.setText('Load Annotation File...')
         self.idx_rater.setText('')
 
+        self.flush_annot()
         self.annot = None
         self.dataset_markers = None
 
@@ -0,0 +1,251 @@
+"""Pages of data kept in memory while scrolling through the recordings, and
+their reduction to the pixels on the screen.
+
+This module does not depend on Qt, so that it can be used (and tested) without
+the graphical interface.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+
+from numpy import arange, empty, fmax, fmin, repeat, stack
+
+lg = getLogger(__name__)
+
+PAGE_CACHE_SIZE = 1024 ** 3  # in bytes, pages (after montage and filtering)
+
+
+class PageCache:
+    """Keep the last pages in memory, and read the next pages in the
+    background.
+
+    Parameters
+    ----------
+    cache_size : int
+        maximum size of the pages kept in memory (in bytes)
+
+    Attributes
+    ----------
+    pages : OrderedDict of Future
+        pages which were read or are being read in the background, with
+        (window_start, window_length) as key (from least to most recently
+        used)
+    settings : tuple
+        settings which were used to create the pages (pages read with other
+        settings are not used anymore)
+    last_start : float
+        start time of the last page which was requested, to know the direction
+        of scrolling
+    prefetch : instance of ThreadPoolExecutor
+        the thread which reads the pages in the background
+
+    Notes
+    -----
+    The function which reads the pages is run in a background thread, so it
+    should not access Qt widgets (pass their values as arguments instead) and
+    the reader of the dataset should be protected by a lock (see Dataset.lock).
+
+    The pages which are being read in the background are assumed to be as
+    large as the current page. The current page is always kept, even if it's
+    larger than cache_size, but then the other pages are not read in advance.
+    """
+    def __init__(self, cache_size=PAGE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.pages = OrderedDict()
+        self.settings = None
+        self.last_start = None
+        self.prefetch = ThreadPoolExecutor(max_workers=1)
+
+    def read(self, read_page, settings, window_start, window_length,
+             duration):
+        """Return one page, and read the pages around it in the background.
+
+        Parameters
+        ----------
+        read_page : function
+            function which reads one page, with window_start and window_length
+            as arguments
+        settings : tuple
+            settings which change the data of the pages (if they change, all
+            the pages are read again)
+        window_start : float
+            start time of the page
+        window_length : float
+            duration of the page
+        duration : float
+            duration of the recordings (no page is read after the end)
+
+        Returns
+        -------
+        any
+            the output of read_page (it waits, if the page is being read in
+            the background)
+        """
+        if settings != self.settings:
+            self.clear()
+            self.settings = settings
+
+        key = (window_start, window_length)
+        page = self.pages.get(key)
+        if page is None or page.cancelled():
+            page = Future()
+            page.set_result(read_page(window_start, window_length))
+            self.pages[key] = page
+
+        self.pages.move_to_end(key)
+        output = page.result()
+        page_size = _nbytes(output)
+
+        step = window_length
+        if self.last_start is not None and (
+                0 < abs(window_start - self.last_start) <= window_length):
+            step = window_start - self.last_start
+        self.last_start = window_start
+
+        self._limit_pages(page_size)
+        for next_start in (window_start + step, window_start - step):
+            if self._size(page_size) + page_size <= self.cache_size:
+                self.prefetch_page(read_page, next_start, window_length,
+                                   duration)
+
+        return output
+
+    def prefetch_page(self, read_page, window_start, window_length, duration):
+        """Read one page in the background, if it's not in memory already.
+
+        Parameters
+        ----------
+        read_page : function
+            function which reads one page, with window_start and window_length
+            as arguments
+        window_start : float
+            start time of the page
+        window_length : float
+            duration of the page
+        duration : float
+            duration of the recordings (no page is read after the end)
+        """
+        key = (window_start, window_length)
+        if window_start < 0 or window_start >= duration or key in self.pages:
+            return
+
+        lg.debug(f'Prefetching page at {window_start}')
+        self.pages[key] = self.prefetch.submit(read_page, window_start,
+                                               window_length)
+
+    def clear(self):
+        """Remove all the pages from memory, and don't read the pages which
+        were requested in the background."""
+        for page in self.pages.values():
+            page.cancel()  # a page which is being read is only discarded
+        self.pages.clear()
+        self.settings = None
+        self.last_start = None
+
+    def _size(self, page_size):
+        """Size of the pages in memory (in bytes), where the pages which are
+        being read are as large as page_size."""
+        size = 0
+        for page in self.pages.values():
+            if not page.done():
+                size += page_size
+            elif not page.cancelled() and page.exception() is None:
+                size += _nbytes(page.result())
+        return size
+
+    def _limit_pages(self, page_size):
+        """Remove the least recently used pages, but not the current one."""
+        while len(self.pages) > 1 and self._size(page_size) > self.cache_size:
+            _, page = self.pages.popitem(last=False)
+            page.cancel()
+
+
+def _nbytes(page):
+    """Size of one page in memory.
+
+    Parameters
+    ----------
+    page : instance of Data or ndarray
+        one page (only the arrays are counted)
+
+    Returns
+    -------
+    int
+        size of the data and of the axes, in bytes
+    """
+    if not hasattr(page, 'axis'):
+        return getattr(page, 'nbytes', 0)
+
+    size = sum(x.nbytes for x in page.data)
+    for values in page.axis.values():
+        size += sum(x.nbytes for x in values)
+    return size
+
+
+def decimate_minmax(x, y, n_bins):
+    """Reduce a line to the min and max values in each bin.
+
+    Parameters
+    ----------
+    x : ndarray
+        x-coordinates (one per sample, sorted)
+    y : ndarray
+        y-coordinates (the last dimension is time, so one or more lines can be
+        reduced at once)
+    n_bins : int
+        number of bins (usually one per pixel)
+
+    Returns
+    -------
+    ndarray
+        x-coordinates (start of each bin, twice)
+    ndarray
+        y-coordinates (min and max value of each bin), with the same
+        dimensions as y, except for the last one
+
+    Notes
+    -----
+    Unlike taking one sample every few, the peaks are always drawn. NaN are
+    ignored, unless all the values in the bin are NaN.
+    """
+    n_smp = y.shape[-1]
+    n_bins = max(min(int(n_bins), n_smp), 1)
+    edges = (arange(n_bins) * n_smp) // n_bins
+    y_min = fmin.reduceat(y, edges, axis=-1)
+    y_max = fmax.reduceat(y, edges, axis=-1)
+    y_out = stack((y_min, y_max), axis=-1).reshape(y.shape[:-1] + (-1, ))
+    return repeat(x[edges], 2), y_out
+
+
+def _create_envelope(data, n_pixels):
+    """Reduce the data to the min and max values in each pixel.
+
+    Parameters
+    ----------
+    data : instance of ChanTime
+        data ready to be plotted (only the first trial is used)
+    n_pixels : int
+        width of the traces on the screen, in pixels
+
+    Returns
+    -------
+    instance of ChanTime
+        data with two values (min and max) for each pixel, or the data itself
+        if there are fewer than two samples per pixel.
+
+    Notes
+    -----
+    All the channels are reduced at once. Unlike taking one sample every few,
+    short peaks (f.e. spikes) remain visible however long the window is.
+    """
+    if n_pixels <= 0 or data.number_of('time')[0] <= 2 * n_pixels:
+        return data
+
+    output = data._copy(axis=False)
+    output.axis['chan'] = data.axis['chan']
+    output.axis['time'] = empty(1, dtype='O')
+    output.data = empty(1, dtype='O')
+    output.axis['time'][0], output.data[0] = decimate_minmax(
+        data.axis['time'][0], data.data[0], n_pixels)
+
+    return output
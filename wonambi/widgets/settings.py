@@ -55,7 +55,7 @@ DEFAULTS['traces'] = {'n_time_labels': 3,
                       'y_distance': 50,
                       'y_scale': 1,
                       'label_ratio': 0.05,
-                      'max_s_freq': 30000,
+                      'filter_pad': 2,  # in seconds
                       'window_start': 0,
                       'window_length': 30,
                       'window_step': 5,
@@ -69,6 +69,7 @@ DEFAULTS['settings'] = {'max_dataset_history': 20,
                         'y_scale_presets': [.1, .2, .5, 1, 2, 5, 10],
                         'window_length_presets': [1., 5., 10., 20., 30., 60.],
                         'recording_dir': '/home/gio/recordings',
+                        'max_s_freq': 30000,
                         }
 DEFAULTS['video'] = {}
 
@@ -315,9 +316,18 @@ class ConfigUtils(Config):
                            self.index['window_length_presets'])
         box1.setLayout(form_layout)
 
+        box2 = QGroupBox('Analysis')
+        self.index['max_s_freq'] = FormInt()
+
+        form_layout = QFormLayout()
+        form_layout.addRow('Maximum Sampling Frequency',
+                           self.index['max_s_freq'])
+        box2.setLayout(form_layout)
+
         main_layout = QVBoxLayout()
         main_layout.addWidget(box0)
         main_layout.addWidget(box1)
+        main_layout.addWidget(box2)
         main_layout.addStretch(1)
 
         self.setLayout(main_layout)
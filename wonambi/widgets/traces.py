@@ -32,7 +32,9 @@ from PyQt5.QtWidgets import (QAction,
                              )
 
 from .. import ChanTime
+from ..dataset import _convert_time_to_sample
 from ..trans import montage, filter_, _select_channels
+from .pages import PageCache, _create_envelope
 from .settings import Config
 from .utils import (convert_name_to_color,
                     ICON,
@@ -74,7 +76,7 @@ class ConfigTraces(Config):
         self.index['y_scale'] = FormFloat()
         self.index['label_ratio'] = FormFloat()
         self.index['n_time_labels'] = FormInt()
-        self.index['max_s_freq'] = FormInt()
+        self.index['filter_pad'] = FormFloat()
 
         form_layout = QFormLayout()
         box0.setLayout(form_layout)
@@ -86,8 +88,8 @@ class ConfigTraces(Config):
                            self.index['label_ratio'])
         form_layout.addRow('Number of time labels',
                            self.index['n_time_labels'])
-        form_layout.addRow('Maximum Sampling Frequency',
-                           self.index['max_s_freq'])
+        form_layout.addRow('Data around the window for filtering (s)',
+                           self.index['filter_pad'])
 
         box1 = QGroupBox('Grid')
 
@@ -140,6 +142,8 @@ class Traces(QGraphicsView):
         position of the vertical scrollbar
     data : instance of ChanTime
         filtered and reref'ed data
+    pages : instance of PageCache
+        pages which were read or are being read in the background
 
     chan : list of str
         list of channels (labels and channel group)
@@ -176,6 +180,7 @@ class Traces(QGraphicsView):
 
         self.y_scrollbar_value = 0
         self.data = None
+        self.pages = PageCache()
         self.chan = []
         self.chan_pos = []  # used later to find out which channel we're using
         self.chan_scale = []
@@ -327,34 +332,34 @@ class Traces(QGraphicsView):
         self.action = actions
 
     def read_data(self):
-        """Read the data to plot."""
-        window_start = self.parent.value('window_start')
-        window_end = window_start + self.parent.value('window_length')
-        dataset = self.parent.info.dataset
-        groups = self.parent.channels.groups
-
-        chan_to_read = []
-        for one_grp in groups:
-            chan_to_read.extend(one_grp['chan_to_plot'] + one_grp['ref_chan'])
+        """Read the data to plot.
 
-        if not chan_to_read:
+        Notes
+        -----
+        The pages are kept in memory (up to PAGE_CACHE_SIZE bytes), as long as
+        the channel groups and filters don't change. After reading the current
+        page, the next and the previous page (in the direction of scrolling)
+        are read in a background thread, if they fit in memory.
+        """
+        groups = self.parent.channels.groups
+        if not any(one_grp['chan_to_plot'] + one_grp['ref_chan']
+                   for one_grp in groups):
             return
 
-        lg.debug(f'Reading data from dataset: begtime={window_start:10.3f}, endtime={window_end:10.3f}, {len(chan_to_read)} channels')
-        data = dataset.read_data(chan=chan_to_read,
-                                 begtime=window_start,
-                                 endtime=window_end)
-
-        max_s_freq = self.parent.value('max_s_freq')
-        if data.s_freq > max_s_freq:
-            q = int(data.s_freq / max_s_freq)
-            lg.debug('Decimate (no low-pass filter) at ' + str(q))
+        dataset = self.parent.info.dataset
+        filter_pad = self.parent.value('filter_pad')
+        duration = dataset.header['n_samples'] / dataset.header['s_freq']
 
-            data.data[0] = data.data[0][:, slice(None, None, q)]
-            data.axis['time'][0] = data.axis['time'][0][slice(None, None, q)]
-            data.s_freq = int(data.s_freq / q)
+        # the values of the widgets are read here, not in the background
+        def read_page(window_start, window_length):
+            return _read_page(dataset, groups, window_start,
+                              window_start + window_length, filter_pad)
 
-        self.data = _create_data_to_plot(data, self.parent.channels.groups)
+        self.data = self.pages.read(read_page,
+                                    _page_settings(groups, filter_pad),
+                                    self.parent.value('window_start'),
+                                    self.parent.value('window_length'),
+                                    duration)
 
     def display(self):
         """Display the recordings."""
@@ -459,12 +464,22 @@ class Traces(QGraphicsView):
             text.setPos(pos)
 
     def add_traces(self):
-        """Add traces based on self.data."""
+        """Add traces based on self.data.
+
+        Notes
+        -----
+        Only the min and max values in each pixel are drawn (see
+        _create_envelope).
+        """
         y_distance = self.parent.value('y_distance')
         self.chan = []
         self.chan_pos = []
         self.chan_scale = []
 
+        n_pixels = int(self.viewport().width() /
+                       (1 + self.parent.value('label_ratio')))
+        envelope = _create_envelope(self.data, n_pixels)
+
         row = 0
         for one_grp in self.parent.channels.groups:
             for one_chan in one_grp['chan_to_plot']:
@@ -473,11 +488,10 @@ class Traces(QGraphicsView):
                 chan_name = one_chan + ' (' + one_grp['name'] + ')'
 
                 # trace
-                dat = (self.data(trial=0, chan=chan_name) *
+                dat = (envelope(trial=0, chan=chan_name) *
                        self.parent.value('y_scale'))
                 dat *= -1  # flip data, upside down (because y grows downward)
-                path = self.scene.addPath(Path(self.data.axis['time'][0],
-                                               dat))
+                path = self.scene.addPath(Path(envelope.axis['time'][0], dat))
                 path.setPen(QPen(QColor(one_grp['color']), LINE_WIDTH))
 
                 # adjust position
@@ -1159,6 +1173,7 @@ class Traces(QGraphicsView):
     def reset(self):
         self.y_scrollbar_value = 0
         self.data = None
+        self.pages.clear()
         self.chan = []
         self.chan_pos = []
         self.chan_scale = []
@@ -1175,6 +1190,93 @@ class Traces(QGraphicsView):
         self.time_pos = []
 
 
+def _read_page(dataset, chan_groups, window_start, window_end, pad=0):
+    """Read the data of one page, ready to be plotted.
+
+    Parameters
+    ----------
+    dataset : instance of Dataset
+        dataset to read the data from
+    chan_groups : list of dict
+        information about channels to plot, to use as reference and about
+        filtering etc.
+    window_start : float
+        start time of the page
+    window_end : float
+        end time of the page
+    pad : float
+        duration of the data (in s) to read before and after the page, if the
+        data are filtered
+
+    Returns
+    -------
+    instance of ChanTime
+        data ready to be plotted.
+
+    Notes
+    -----
+    The filters are applied to the page with the padding, which is then
+    removed, so that the edge artifacts of the filters are not visible at the
+    beginning and at the end of each page. Each page is filtered on its own:
+    adjacent pages do not share the filter state or the padded data.
+
+    The data are not downsampled, so that the min and max values drawn for
+    each pixel (see _create_envelope) are those of the original samples.
+    """
+    chan_to_read = []
+    for one_grp in chan_groups:
+        chan_to_read.extend(one_grp['chan_to_plot'] + one_grp['ref_chan'])
+
+    begsam = _convert_time_to_sample(window_start, dataset)
+    endsam = _convert_time_to_sample(window_end, dataset)
+
+    padsam = 0
+    if any(one_grp[x] is not None for one_grp in chan_groups
+           for x in ('hp', 'lp', 'notch')):
+        padsam = int(pad * dataset.header['s_freq'])
+    pad_beg = max(min(padsam, begsam), 0)
+    pad_end = max(min(padsam, dataset.header['n_samples'] - endsam), 0)
+
+    lg.debug(f'Reading data from dataset: begtime={window_start:10.3f}, endtime={window_end:10.3f}, {len(chan_to_read)} channels')
+    data = dataset.read_data(chan=chan_to_read,
+                             begsam=begsam - pad_beg,
+                             endsam=endsam + pad_end)
+
+    output = _create_data_to_plot(data, chan_groups)
+
+    if pad_beg or pad_end:
+        time = output.axis['time'][0]
+        in_page = ((time >= begsam / dataset.header['s_freq']) &
+                   (time < endsam / dataset.header['s_freq']))
+        output.axis['time'][0] = time[in_page]
+        output.data[0] = output.data[0][:, in_page]
+
+    return output
+
+
+def _page_settings(chan_groups, pad):
+    """Settings which change the data of the pages.
+
+    Parameters
+    ----------
+    chan_groups : list of dict
+        information about channels to plot, to use as reference and about
+        filtering etc.
+    pad : float
+        duration of the data (in s) to read before and after the page
+
+    Returns
+    -------
+    tuple
+        the settings (pages read with different settings cannot be reused)
+    """
+    return (pad, ) + tuple(
+        (one_grp['name'], tuple(one_grp['chan_to_plot']),
+         tuple(one_grp['ref_chan']), one_grp['hp'], one_grp['lp'],
+         one_grp['notch'], one_grp['demean'], one_grp['scale'])
+        for one_grp in chan_groups)
+
+
 def _create_data_to_plot(data, chan_groups):
     """Create data after montage and filtering.
 
@@ -3,15 +3,16 @@
 from ast import literal_eval
 from logging import getLogger
 from math import ceil, floor
-from numpy import arange, NaN
+from numpy import arange, asarray, float64, frombuffer, NaN
 from os.path import dirname, join, realpath
 
-from PyQt5.QtCore import QRectF, QSettings, Qt
+from PyQt5.QtCore import QPointF, QRectF, QSettings, Qt
 from PyQt5.QtGui import (QBrush,
                          QPen,
                          QColor,
                          QPainterPath,
                          QPainter,
+                         QPolygonF,
                          )
 from PyQt5.QtSvg import QSvgGenerator
 from PyQt5.QtWidgets import (QCheckBox,
@@ -83,13 +84,33 @@ class Path(QPainterPath):
         x-coordinates
     y : ndarray or list
         y-coordinates
+
+    Notes
+    -----
+    The points are written directly into the memory of a QPolygonF, so that Qt
+    is not called once per point. Long lines should be reduced before (see
+    widgets.pages._create_envelope).
     """
     def __init__(self, x, y):
         super().__init__()
 
-        self.moveTo(x[0], y[0])
-        for i_x, i_y in zip(x, y):
-            self.lineTo(i_x, i_y)
+        x = asarray(x, dtype=float64)
+        y = asarray(y, dtype=float64)
+
+        if len(x) > 0:
+            self.addPolygon(_polygon(x, y))
+
+
+def _polygon(x, y):
+    """Create a QPolygonF with the points, without looping over them."""
+    polygon = QPolygonF()
+    polygon.fill(QPointF(), len(x))
+    buffer = polygon.data()
+    buffer.setsize(2 * len(x) * float64().itemsize)
+    points = frombuffer(buffer, dtype=float64).reshape(-1, 2)
+    points[:, 0] = x
+    points[:, 1] = y
+    return polygon
 
 
 class RectMarker(QGraphicsRectItem):